@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class _WarmConnection:
+    def __init__(self, ws, reqid, handshake_time):
+        self.ws = ws
+        self.reqid = reqid
+        self.handshake_time = handshake_time
+        self.created = time.monotonic()
+
+
+class AsrConnectionManager:
+    """
+    ASR websocket连接管理
+
+    火山引擎的流式识别协议一个连接只承载一次识别请求（X-Api-Request-Id在握手时确定），
+    所以这里的复用方式是按凭证预先握手好若干备用连接：识别开始时直接拿一个已完成TLS握手的连接，
+    用完即关，后台再补一个。建连失败按指数退避重试。
+    """
+    def __init__(self, warm_size=2, max_idle=20.0, max_retries=3,
+                 backoff_base=0.2, backoff_max=5.0, connect_timeout=5.0):
+        self.warm_size = warm_size
+        self.max_idle = max_idle  # 备用连接闲置超过该时间就丢弃，避免拿到被服务端关掉的连接
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.spares = {}  # key -> deque[_WarmConnection]
+        self.refill_tasks = {}  # key -> Task
+        self.connectors = {}  # key -> connect(reqid)
+
+        # 指标
+        self.acquired = 0
+        self.warm_hits = 0
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.handshake_total = 0.0
+        self.handshake_max = 0.0
+        self.discarded = 0
+
+    async def _handshake(self, connect):
+        """建立一个新连接，失败按指数退避重试"""
+        delay = self.backoff_base
+        for attempt in range(self.max_retries + 1):
+            reqid = str(uuid.uuid4())
+            start = time.perf_counter()
+            try:
+                ws = await asyncio.wait_for(connect(reqid), self.connect_timeout)
+            except Exception as e:
+                self.handshake_failures += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.warning("ASR连接失败(%s)，%.1f秒后重试", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+                continue
+            elapsed = time.perf_counter() - start
+            self.handshakes += 1
+            self.handshake_total += elapsed
+            self.handshake_max = max(self.handshake_max, elapsed)
+            return _WarmConnection(ws, reqid, elapsed)
+
+    def _pop_spare(self, key):
+        spares = self.spares.get(key)
+        now = time.monotonic()
+        while spares:
+            conn = spares.popleft()
+            if conn.ws.open and now - conn.created < self.max_idle:
+                return conn
+            self.discarded += 1
+            asyncio.ensure_future(conn.ws.close())
+        return None
+
+    def _schedule_refill(self, key):
+        task = self.refill_tasks.get(key)
+        if self.warm_size > 0 and (task is None or task.done()):
+            self.refill_tasks[key] = asyncio.ensure_future(self._refill(key))
+
+    async def _refill(self, key):
+        spares = self.spares.setdefault(key, deque())
+        while len(spares) < self.warm_size:
+            try:
+                spares.append(await self._handshake(self.connectors[key]))
+            except Exception as e:
+                logger.warning("ASR备用连接建立失败: %s", e)
+                return
+
+    async def acquire(self, key, connect):
+        """
+        获取一个可用连接，返回 (ws, reqid)
+        key: 凭证标识（url + 各个key），connect(reqid): 建立新连接的协程函数
+        """
+        self.connectors[key] = connect
+        self.acquired += 1
+        conn = self._pop_spare(key)
+        if conn is not None:
+            self.warm_hits += 1
+        else:
+            conn = await self._handshake(connect)
+        self._schedule_refill(key)
+        return conn.ws, conn.reqid
+
+    async def release(self, ws):
+        """识别结束后关闭连接（协议不支持在同一连接上发起下一次请求）"""
+        if ws is not None and not ws.closed:
+            await ws.close()
+
+    async def warm_up(self, key, connect):
+        self.connectors[key] = connect
+        self._schedule_refill(key)
+        await self.refill_tasks[key]
+        return len(self.spares.get(key, ()))
+
+    async def close(self):
+        for task in self.refill_tasks.values():
+            task.cancel()
+        for spares in self.spares.values():
+            while spares:
+                await spares.popleft().ws.close()
+
+    def stats(self):
+        return {
+            "acquired": self.acquired,
+            "warm_hits": self.warm_hits,
+            "reuse_ratio": self.warm_hits / self.acquired if self.acquired else 0.0,
+            "handshakes": self.handshakes,
+            "handshake_failures": self.handshake_failures,
+            "avg_handshake_ms": self.handshake_total / self.handshakes * 1000 if self.handshakes else 0.0,
+            "max_handshake_ms": self.handshake_max * 1000,
+            "spares": sum(len(s) for s in self.spares.values()),
+            "discarded": self.discarded,
+        }
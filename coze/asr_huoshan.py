@@ -1,7 +1,7 @@
 import asyncio
-import datetime
 import gzip
 import json
+import logging
 import time
 import uuid
 import wave
@@ -11,33 +11,21 @@ import websockets
 from dotenv import load_dotenv
 import os
 import ssl
+from contextlib import asynccontextmanager
 
-PROTOCOL_VERSION = 0b0001
-DEFAULT_HEADER_SIZE = 0b0001
+from protocol_codec import (
+    PROTOCOL_VERSION, DEFAULT_HEADER_SIZE,
+    FULL_CLIENT_REQUEST, AUDIO_ONLY_REQUEST, FULL_SERVER_RESPONSE, SERVER_ACK, SERVER_ERROR_RESPONSE,
+    NO_SEQUENCE, POS_SEQUENCE, NEG_SEQUENCE, NEG_WITH_SEQUENCE, NEG_SEQUENCE_1,
+    NO_SERIALIZATION, JSON, NO_COMPRESSION, GZIP,
+    pack_header, decode_frame, CompressionPolicy,
+)
 
-# Message Type:
-FULL_CLIENT_REQUEST = 0b0001
-AUDIO_ONLY_REQUEST = 0b0010
-FULL_SERVER_RESPONSE = 0b1001
-SERVER_ACK = 0b1011
-SERVER_ERROR_RESPONSE = 0b1111
-
-# Message Type Specific Flags
-NO_SEQUENCE = 0b0000  # no check sequence
-POS_SEQUENCE = 0b0001
-NEG_SEQUENCE = 0b0010
-NEG_WITH_SEQUENCE = 0b0011
-NEG_SEQUENCE_1 = 0b0011
-
-# Message Serialization
-NO_SERIALIZATION = 0b0000
-JSON = 0b0001
+load_dotenv()  # 加载.env文件中的环境变量
 
-# Message Compression
-NO_COMPRESSION = 0b0000
-GZIP = 0b0001
+logger = logging.getLogger(__name__)
 
-load_dotenv()  # 加载.env文件中的环境变量
+_ssl_context = None  # 所有连接共用一个SSL上下文
 
 def generate_header(
         message_type=FULL_CLIENT_REQUEST,
@@ -46,84 +34,35 @@ def generate_header(
         compression_type=GZIP,
         reserved_data=0x00
 ):
-    """
-    protocol_version(4 bits), header_size(4 bits),
-    message_type(4 bits), message_type_specific_flags(4 bits)
-    serialization_method(4 bits) message_compression(4 bits)
-    reserved （8bits) 保留字段
-    """
-    header = bytearray()
-    header_size = 1
-    header.append((PROTOCOL_VERSION << 4) | header_size)
-    header.append((message_type << 4) | message_type_specific_flags)
-    header.append((serial_method << 4) | compression_type)
-    header.append(reserved_data)
-    return header
+    """4字节协议头，见 protocol_codec"""
+    return bytearray(pack_header(message_type, message_type_specific_flags, serial_method,
+                                 compression_type, reserved_data))
 
 
 def generate_before_payload(sequence: int):
-    before_payload = bytearray()
-    before_payload.extend(sequence.to_bytes(4, 'big', signed=True))  # sequence
-    return before_payload
+    return bytearray(sequence.to_bytes(4, 'big', signed=True))  # sequence
 
 
 def parse_response(res):
     """
-    protocol_version(4 bits), header_size(4 bits),
-    message_type(4 bits), message_type_specific_flags(4 bits)
-    serialization_method(4 bits) message_compression(4 bits)
-    reserved （8bits) 保留字段
-    header_extensions 扩展头(大小等于 8 * 4 * (header_size - 1) )
-    payload 类似与http 请求体
+    解析服务端响应，返回
+    {'is_last_package', 'payload_sequence', 'seq', 'code', 'payload_msg', 'payload_size'}
     """
-    protocol_version = res[0] >> 4
-    header_size = res[0] & 0x0f
-    message_type = res[1] >> 4
-    message_type_specific_flags = res[1] & 0x0f
-    serialization_method = res[2] >> 4
-    message_compression = res[2] & 0x0f
-    reserved = res[3]
-    header_extensions = res[4:header_size * 4]
-    payload = res[header_size * 4:]
+    frame = decode_frame(res)
     result = {
-        'is_last_package': False,
+        'is_last_package': frame.is_last,
     }
-    payload_msg = None
-    payload_size = 0
-    if message_type_specific_flags & 0x01:
-        # receive frame with sequence
-        seq = int.from_bytes(payload[:4], "big", signed=True)
-        result['payload_sequence'] = seq
-        payload = payload[4:]
-
-    if message_type_specific_flags & 0x02:
-        # receive last package
-        result['is_last_package'] = True
-
-    if message_type == FULL_SERVER_RESPONSE:
-        payload_size = int.from_bytes(payload[:4], "big", signed=True)
-        payload_msg = payload[4:]
-    elif message_type == SERVER_ACK:
-        seq = int.from_bytes(payload[:4], "big", signed=True)
-        result['seq'] = seq
-        if len(payload) >= 8:
-            payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-            payload_msg = payload[8:]
-    elif message_type == SERVER_ERROR_RESPONSE:
-        code = int.from_bytes(payload[:4], "big", signed=False)
-        result['code'] = code
-        payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-        payload_msg = payload[8:]
-    if payload_msg is None:
+    if frame.sequence is not None:
+        if frame.message_type == SERVER_ACK:
+            result['seq'] = frame.sequence
+        else:
+            result['payload_sequence'] = frame.sequence
+    if frame.code is not None:
+        result['code'] = frame.code
+    if frame.payload is None:
         return result
-    if message_compression == GZIP:
-        payload_msg = gzip.decompress(payload_msg)
-    if serialization_method == JSON:
-        payload_msg = json.loads(str(payload_msg, "utf-8"))
-    elif serialization_method != NO_SERIALIZATION:
-        payload_msg = str(payload_msg, "utf-8")
-    result['payload_msg'] = payload_msg
-    result['payload_size'] = payload_size
+    result['payload_msg'] = frame.decode_payload()
+    result['payload_size'] = frame.payload_size
     return result
 
 
@@ -144,7 +83,7 @@ def judge_wav(ori_date):
 
 
 class AsrWsClient:
-    def __init__(self, audio_path, **kwargs):
+    def __init__(self, audio_path=None, **kwargs):
         """
         :param config: config
         """
@@ -162,6 +101,12 @@ class AsrWsClient:
         self.hot_words = kwargs.get("hot_words", None)
         self.streaming = kwargs.get("streaming", True)
         self.mp3_seg_size = kwargs.get("mp3_seg_size", 1000)
+        self.stream_seg_duration = int(kwargs.get("stream_seg_duration", 200))  # 流式识别每包时长(ms)
+        self.connection_manager = kwargs.get("connection_manager", None)  # AsrConnectionManager，提供预热连接
+        # 音频帧压缩方式: "gzip"/"none"，以及gzip级别
+        self.compression = kwargs.get("compression") or CompressionPolicy.from_names(
+            audio=kwargs.get("audio_compression", "gzip"),
+            audio_level=kwargs.get("audio_compress_level", 1))
         self.req_event = 1
         
 
@@ -196,43 +141,80 @@ class AsrWsClient:
         else:
             yield data[offset: data_len], True
 
-    async def segment_data_processor(self, wav_data: bytes, segment_size: int):
-        reqid = str(uuid.uuid4())
-        seq = 1
-        request_params = self.construct_request(reqid)
-        payload_bytes = str.encode(json.dumps(request_params))
-        payload_bytes = gzip.compress(payload_bytes)
-        full_client_request = bytearray(generate_header(message_type_specific_flags=POS_SEQUENCE))
-        full_client_request.extend(generate_before_payload(sequence=seq))
-        full_client_request.extend((len(payload_bytes)).to_bytes(
-            4, 'big'))  # payload size(4 bytes)
-        req_str = ' '.join(format(byte, '02x') for byte in full_client_request)
-        # print(f"{time.time()}, seq", seq, "req", req_str)
-        full_client_request.extend(payload_bytes)  # payload
+    def build_full_client_request(self, reqid, seq=1):
+        return self.compression.encode_full_client_request(self.construct_request(reqid), sequence=seq)
+
+    def build_audio_only_request(self, chunk, seq, last=False):
+        return self.compression.encode_audio_only_request(chunk, seq, last)
+
+    @staticmethod
+    def build_headers(reqid):
         header = {}
-        # print("reqid", reqid)
         # header["X-Tt-Logid"] = reqid
         header["X-Api-Resource-Id"] = os.getenv("HUOSHAN_RESOURCE_ID")
         header["X-Api-Access-Key"] = os.getenv("HUOSHAN_ACCESS_KEY")
         header["X-Api-App-Key"] = os.getenv("HUOSHAN_APP_KEY")
         header["X-Api-Request-Id"] = reqid
+        return header
+
+    @staticmethod
+    def create_ssl_context():
+        # 创建SSL上下文并禁用证书验证，只创建一次
+        global _ssl_context
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+            _ssl_context.check_hostname = False
+            _ssl_context.verify_mode = ssl.CERT_NONE
+        return _ssl_context
+
+    def connection_key(self):
+        """同一组凭证的连接可以互相替代"""
+        return (self.ws_url, os.getenv("HUOSHAN_RESOURCE_ID"),
+                os.getenv("HUOSHAN_ACCESS_KEY"), os.getenv("HUOSHAN_APP_KEY"))
+
+    def connect(self, reqid):
+        """返回websockets.connect对象，可以await也可以async with"""
+        return websockets.connect(self.ws_url, extra_headers=self.build_headers(reqid),
+                                        max_size=1000000000,
+                                        ssl=self.create_ssl_context() if self.ws_url.startswith("wss") else None)
+
+    @asynccontextmanager
+    async def connection(self):
+        """获取一个识别连接，有连接管理器时使用预热好的连接，返回 (ws, reqid)"""
+        if self.connection_manager is not None:
+            ws, reqid = await self.connection_manager.acquire(self.connection_key(), self.connect)
+        else:
+            reqid = str(uuid.uuid4())
+            ws = await self.connect(reqid)
         try:
-            # 创建SSL上下文并禁用证书验证
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
+            yield ws, reqid
+        finally:
+            if self.connection_manager is not None:
+                await self.connection_manager.release(ws)
+            else:
+                await ws.close()
 
-            async with websockets.connect(self.ws_url, extra_headers=header, max_size=1000000000, ssl=ssl_context) as ws:
+    def open_stream(self):
+        """
+        开始一次流式识别，可以在收到第一个音频包时同步调用。
+        之后用 feed() 推送PCM数据，finish() 等待最终结果。
+        """
+        return AsrStreamSession(self)
+
+    async def segment_data_processor(self, wav_data: bytes, segment_size: int):
+        seq = 1
+        try:
+            async with self.connection() as (ws, reqid):
+                # print("reqid", reqid)
+                full_client_request = self.build_full_client_request(reqid, seq)
                 await ws.send(full_client_request)
                 res = await ws.recv()
                 # print(res)
-                print(ws.response_headers)
+                logger.debug("ASR响应头: %s", ws.response_headers)
                 # res_str = ' '.join(format(byte, '02x') for byte in res)
                 # print(res_str)
                 result = parse_response(res)
-                print("******************")
-                print("sauc result", result)
-                print("******************")
+                logger.debug("sauc result %s", result)
                 # if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
                 #     return result
                 for _, (chunk, last) in enumerate(AsrWsClient.slice_data(wav_data, segment_size), 1):
@@ -241,22 +223,14 @@ class AsrWsClient:
                     if last:
                         seq = -seq
                     start = time.time()
-                    payload_bytes = gzip.compress(chunk)
-                    audio_only_request = bytearray(generate_header(message_type=AUDIO_ONLY_REQUEST, message_type_specific_flags=POS_SEQUENCE))
-                    if last:
-                        audio_only_request = bytearray(generate_header(message_type=AUDIO_ONLY_REQUEST, message_type_specific_flags=NEG_WITH_SEQUENCE))
-                    audio_only_request.extend(generate_before_payload(sequence=seq))
-                    audio_only_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
-                    req_str = ' '.join(format(byte, '02x') for byte in audio_only_request)
-                    # print("seq", seq, "req", req_str)
-                    audio_only_request.extend(payload_bytes)  # payload
+                    audio_only_request = self.build_audio_only_request(chunk, seq, last)
                     await ws.send(audio_only_request)
                     res = await ws.recv()
                     # print(res)
                     # res_str = ' '.join(format(byte, '02x') for byte in res)
                     # print(res_str)
                     result = parse_response(res)
-                    print(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')}, seq", seq, "res", result)
+                    logger.debug("seq %d res %s", seq, result)
                     # if 'payload_msg' in result and result['payload_msg']['code'] != self.success_code:
                     #     return result
                     # if self.streaming:
@@ -264,23 +238,27 @@ class AsrWsClient:
                     #     await asyncio.sleep(sleep_time)
             return result
         except websockets.exceptions.ConnectionClosedError as e:
-            print(f"WebSocket connection closed with status code: {e.code}")
-            print(f"WebSocket connection closed with reason: {e.reason}")
+            logger.error("WebSocket connection closed with status code: %s, reason: %s", e.code, e.reason)
         except websockets.exceptions.WebSocketException as e:
-            print(f"WebSocket connection failed: {e}")
+            logger.error("WebSocket connection failed: %s", e)
             if hasattr(e, "status_code"):
-                print(f"Response status code: {e.status_code}")
+                logger.error("Response status code: %s", e.status_code)
             if hasattr(e, "headers"):
-                print(f"Response headers: {e.headers}")
+                logger.error("Response headers: %s", e.headers)
             if hasattr(e, "response") and hasattr(e.response, "text"):
-                print(f"Response body: {e.response.text}")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
+                logger.error("Response body: %s", e.response.text)
+        except Exception:
+            logger.exception("Unexpected error")
 
-    async def execute(self):
-        async with aiofiles.open(self.audio_path, mode="rb") as _f:
-            data = await _f.read()
-        audio_data = bytes(data)
+    async def execute(self, audio_data=None):
+        """
+        :param audio_data: 内存中的音频数据(bytes/bytearray/memoryview)，为None时从audio_path读取
+        """
+        if audio_data is None:
+            async with aiofiles.open(self.audio_path, mode="rb") as _f:
+                audio_data = await _f.read()
+        # 之后按段切片都是memoryview视图，不再复制音频数据
+        audio_data = memoryview(audio_data)
         if self.format == "mp3":
             segment_size = self.mp3_seg_size
             return await self.segment_data_processor(audio_data, segment_size)
@@ -296,6 +274,96 @@ class AsrWsClient:
             raise Exception("Unsupported format")
 
 
+class AsrStreamSession:
+    """
+    流式识别会话
+
+    收到第一个音频包时创建，后台任务负责建立websocket并发送请求；
+    feed() 是同步方法，攒够 stream_seg_duration 的音频就作为一个audio-only包发出，
+    结束标记到达时服务端已经识别了绝大部分音频，finish() 只需要等最后一包的结果。
+    """
+    def __init__(self, client: AsrWsClient):
+        self.client = client
+        self.reqid = None
+        self.segment_size = int(client.rate * client.bits // 8 * client.channel * client.stream_seg_duration / 1000)
+        self.pending = bytearray()
+        self.queue = asyncio.Queue()  # (chunk, last)
+        self.result = None  # 最近一次识别结果
+        self.final = asyncio.get_running_loop().create_future()
+        self.error = None
+        self.ws = None
+        self.task = asyncio.ensure_future(self._run())
+
+    def feed(self, audio_data: bytes):
+        """推送PCM数据，不阻塞"""
+        self.pending.extend(audio_data)
+        if len(self.pending) >= self.segment_size:
+            self.queue.put_nowait((bytes(self.pending), False))
+            self.pending.clear()
+
+    async def finish(self, timeout=10):
+        """发送最后一包并等待最终识别结果，识别失败时返回None（错误见self.error）"""
+        self.queue.put_nowait((bytes(self.pending), True))
+        self.pending.clear()
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.final), timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self):
+        if not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _run(self):
+        receiver = None
+        try:
+            async with self.client.connection() as (ws, reqid):
+                self.ws = ws
+                self.reqid = reqid
+                await ws.send(self.client.build_full_client_request(self.reqid))
+                result = parse_response(await ws.recv())
+                if 'code' in result:
+                    raise Exception(f"识别请求被拒绝: {result}")
+                receiver = asyncio.ensure_future(self._receive(ws))
+                seq = 1
+                while True:
+                    getter = asyncio.ensure_future(self.queue.get())
+                    await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        # 接收端先结束：服务端出错时这里抛出异常，否则已拿到最终结果
+                        getter.cancel()
+                        receiver.result()
+                        break
+                    chunk, last = getter.result()
+                    seq += 1
+                    await ws.send(self.client.build_audio_only_request(chunk, -seq if last else seq, last))
+                    if last:
+                        break
+                await receiver
+        except Exception as e:
+            self.error = e
+            logger.warning("流式识别出错: %s", e)
+        finally:
+            if receiver is not None and not receiver.done():
+                receiver.cancel()
+            if not self.final.done():
+                self.final.set_result(None if self.error else self.result)
+
+    async def _receive(self, ws):
+        while True:
+            result = parse_response(await ws.recv())
+            if 'code' in result:
+                raise Exception(f"识别出错: {result}")
+            self.result = result
+            if result['is_last_package']:
+                return
+
+
 def execute_one(audio_item, **kwargs):
     assert 'id' in audio_item
     assert 'path' in audio_item
@@ -310,16 +378,17 @@ def execute_one(audio_item, **kwargs):
 
 
 def test_stream():
-    print("测试流式")
+    logger.info("测试流式")
     result = execute_one(
         {
             'id': 1,
             "path": "audio_files/recording_153.37.14.38_29995_20241208_210205.wav"
         }
     )
-    print("********result**********")
-    print(result)
+    logger.info("result: %s", result)
 
 
 if __name__ == '__main__':
+    from log_utils import setup_logging
+    setup_logging()
     test_stream()
@@ -1,21 +1,98 @@
+import logging
 import os
 import wave
 
 import numpy as np
 
+from log_utils import SampledLogger
+
+logger = logging.getLogger(__name__)
+packet_logger = SampledLogger(logger, every=50)
+
+
+def write_wav(filepath, audio_data, sample_rate=16000, channels=1, sample_width=2):
+    """把PCM数据写成WAV文件"""
+    with wave.open(filepath, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(audio_data)
+    return filepath
+
+
+SAMPLE_RATE = 16000
+CHANNELS = 1
+SAMPLE_WIDTH = 2  # 16位音频
+
+# 一句话最长录音时长，超过部分丢弃；结束标记丢失时每个设备占用的内存也有上限
+MAX_UTTERANCE_SECONDS = float(os.getenv("MAX_UTTERANCE_SECONDS", 30))
+# 缓冲池最多保留的空闲缓冲区个数，超过的直接释放
+AUDIO_POOL_MAX_FREE = int(os.getenv("AUDIO_POOL_MAX_FREE", 16))
+
+
+class AudioBufferPool:
+    """
+    固定容量的录音缓冲区池
+
+    每个缓冲区按最长录音时长一次分配好，说话期间不再扩容；一句话处理完后归还，
+    下一句话（任意设备）直接复用，空闲缓冲区最多保留max_free个。
+    """
+    def __init__(self, capacity, max_free=16):
+        self.capacity = capacity
+        self.max_free = max_free
+        self.free_buffers = []
+        self.in_use = 0
+        self.allocated = 0  # 新分配的次数
+        self.reused = 0  # 从池中复用的次数
+
+    def acquire(self) -> bytearray:
+        self.in_use += 1
+        if self.free_buffers:
+            self.reused += 1
+            return self.free_buffers.pop()
+        self.allocated += 1
+        return bytearray(self.capacity)
+
+    def release(self, buffer: bytearray):
+        self.in_use -= 1
+        if len(self.free_buffers) < self.max_free:
+            self.free_buffers.append(buffer)
+
+    def stats(self):
+        return {
+            "capacity_bytes": self.capacity,
+            "in_use": self.in_use,
+            "free": len(self.free_buffers),
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "reserved_bytes": (self.in_use + len(self.free_buffers)) * self.capacity,
+        }
+
+
+AUDIO_BUFFER_POOL = AudioBufferPool(
+    int(MAX_UTTERANCE_SECONDS * SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH), AUDIO_POOL_MAX_FREE)
+
 
 class AudioHandler:
-    def __init__(self):
-        self.audio_buffer:bytearray = bytearray()  # 存储音频数据
-        self.sample_rate = 16000  # 修改为32000Hz，是I2S配置的2倍
-        self.channels = 1
-        self.sample_width = 2  # 16位音频
-        self.total_bytes = 0  # 添加计数器
-        
+    def __init__(self, pool: AudioBufferPool = None, vad=None):
+        self.pool = pool or AUDIO_BUFFER_POOL
+        self.vad = vad  # 可选的 vad.VoiceActivityDetector，收音时检测说话开始/结束
+        self.audio_buffer: bytearray = None  # 收到第一个包时从缓冲池取，空闲的设备不占内存
+        self.sample_rate = SAMPLE_RATE
+        self.channels = CHANNELS
+        self.sample_width = SAMPLE_WIDTH
+        self.total_bytes = 0  # 已写入的字节数
+        self.dropped_bytes = 0  # 超过最长录音时长后丢弃的字节数
+
     def reset_buffer(self):
-        """重置音频缓冲区和计数器"""
-        self.audio_buffer = bytearray()
-        self.total_bytes = 0  # 同时重置计数器
+        """把缓冲区归还给缓冲池并重置计数器，之前通过get_audio_data取得的视图不能再使用"""
+        if self.audio_buffer is not None:
+            self.pool.release(self.audio_buffer)
+            self.audio_buffer = None
+        self.total_bytes = 0
+        self.dropped_bytes = 0
+        if self.vad is not None:
+            self.vad.reset()
 
     def process_audio_data(self, audio_data: bytes) -> bytes:
         """处理音频数据，确保格式正确"""
@@ -27,43 +104,88 @@ class AudioHandler:
         
         return audio_array.tobytes()
         
-    def add_audio_data(self, audio_data: bytes):
-        """添加音频数据到缓冲区"""
-        self.audio_buffer.extend(audio_data)
-        self.total_bytes += len(audio_data)
-        print(f"接收数据块大小: {len(audio_data)} bytes")
-        print(f"累计接收: {self.total_bytes} bytes") # 调试信息
-        
+    def add_audio_data(self, audio_data: bytes) -> int:
+        """添加音频数据到缓冲区，返回实际写入的字节数（达到最长录音时长后返回0）"""
+        if self.audio_buffer is None:
+            self.audio_buffer = self.pool.acquire()
+        size = min(len(audio_data), len(self.audio_buffer) - self.total_bytes)
+        if size < len(audio_data):
+            if self.dropped_bytes == 0:
+                logger.warning("录音超过最长时长 %.0f 秒，后续音频将被丢弃", self.capacity_seconds)
+            self.dropped_bytes += len(audio_data) - size
+            audio_data = memoryview(audio_data)[:size]
+        self.audio_buffer[self.total_bytes:self.total_bytes + size] = audio_data
+        self.total_bytes += size
+        if self.vad is not None and size:
+            self.vad.feed(audio_data)
+        packet_logger.debug("接收数据块大小: %d bytes, 累计接收: %d bytes", len(audio_data), self.total_bytes)
+        return size
+
+    def get_audio_data(self) -> memoryview:
+        """返回已录音数据的只读视图，不复制数据；在reset_buffer之前有效"""
+        if self.audio_buffer is None:
+            return memoryview(b'')
+        return memoryview(self.audio_buffer)[:self.total_bytes].toreadonly()
+
+    def get_speech_data(self) -> memoryview:
+        """去掉前后静音后的录音视图（保留少量前后余量）；没有VAD或没检测到说话时返回全部录音"""
+        audio_data = self.get_audio_data()
+        if self.vad is None:
+            return audio_data
+        start, end = self.vad.speech_range(self.total_bytes)
+        return audio_data[start:end]
+
+    @property
+    def speech_detected(self) -> bool:
+        return self.vad is not None and self.vad.speech_start is not None
+
+    @property
+    def speech_ended(self) -> bool:
+        return self.vad is not None and self.vad.ended
+
+    @property
+    def capacity_seconds(self) -> float:
+        return self.pool.capacity / (self.sample_rate * self.channels * self.sample_width)
+
+    @property
+    def memory_bytes(self) -> int:
+        """当前占用的缓冲区大小"""
+        return 0 if self.audio_buffer is None else len(self.audio_buffer)
+
+    def stats(self):
+        return {
+            "buffered_bytes": self.total_bytes,
+            "memory_bytes": self.memory_bytes,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+    @property
+    def duration(self) -> float:
+        return self.total_bytes / (self.sample_rate * self.channels * self.sample_width)
+
+    @property
+    def speech_duration(self) -> float:
+        """去掉前后静音后的时长"""
+        return len(self.get_speech_data()) / (self.sample_rate * self.channels * self.sample_width)
+
     def save_wav(self, filename: str) -> str:
         """将缓冲区数据保存为WAV文件"""
-        if not self.audio_buffer:
+        if not self.total_bytes:
             return None
             
-        print(f"总数据量: {self.total_bytes} bytes")  # 调试信息
-        print(f"预计时长: {self.total_bytes / (self.sample_rate * self.channels * self.sample_width):.2f} 秒")
+        logger.debug("总数据量: %d bytes, 预计时长: %.2f 秒", self.total_bytes, self.duration)
         
         # 确保目录存在
         os.makedirs("audio_files", exist_ok=True)
         filepath = os.path.join("audio_files", filename)
         
         # 创建WAV文件
-        with wave.open(filepath, 'wb') as wav_file:
-            wav_file.setnchannels(self.channels)
-            wav_file.setsampwidth(self.sample_width)
-            wav_file.setframerate(self.sample_rate)
-
-            # 计算总帧数
-            total_frames = len(self.audio_buffer) // 2  # 16位 = 2字节
-            
-            # 写入音频数据
-            wav_file.writeframes(self.audio_buffer)
+        write_wav(filepath, self.get_audio_data(), self.sample_rate, self.channels, self.sample_width)
 
         # 验证生成的文件
-        with wave.open(filepath, 'rb') as wav_file:
-            print(f"WAV文件信息:")
-            print(f"通道数: {wav_file.getnchannels()}")
-            print(f"采样宽度: {wav_file.getsampwidth()}")
-            print(f"采样率: {wav_file.getframerate()}")
-            print(f"总帧数: {wav_file.getnframes()}")
-            print(f"总时长: {wav_file.getnframes() / wav_file.getframerate():.2f}秒")    
+        if logger.isEnabledFor(logging.DEBUG):
+            with wave.open(filepath, 'rb') as wav_file:
+                logger.debug("WAV文件信息: 通道数=%d 采样宽度=%d 采样率=%d 总帧数=%d 总时长=%.2f秒",
+                             wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate(),
+                             wav_file.getnframes(), wav_file.getnframes() / wav_file.getframerate())
         return filepath
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import struct
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+AUDIO_MESSAGE_TYPE = 1  # 1字节消息类型，1表示音频数据
+PACKET_HEADER = struct.Struct('>BH')  # 消息类型(1字节) + 序列号(2字节)
+
+
+class _ClientStream:
+    """单个客户端的发送队列和令牌桶"""
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity  # 新的回复可以先突发几个包，填满设备端缓冲
+        self.updated = now
+        self.queue = deque()  # (packet, deadline)
+        self.queued_bytes = 0
+        self.play_clock = now  # 按设备码率计算的理想发送时间
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AudioSender:
+    """
+    UDP音频发送调度器
+
+    所有客户端共用一个asyncio任务，按设备码率用令牌桶控制发送速度，
+    替代原来每个回复一个线程、每1KB sleep 20ms的做法。
+    enqueue是同步非阻塞的，可以直接在TTS回调里调用。
+    """
+    def __init__(self, send_packet, sample_rate=16000, sample_width=2, channels=1,
+                 speedup=1.6, chunk_size=1024, burst_chunks=4):
+        self.send_packet = send_packet  # send_packet(packet: bytes, addr)
+        # 默认 16000Hz*2字节*1.6 = 51200 B/s，与原来 1KB/20ms 的速度一致，略快于实时播放
+        self.rate = sample_rate * sample_width * channels * speedup
+        self.chunk_size = chunk_size
+        self.capacity = chunk_size * burst_chunks
+        self.streams = {}  # addr -> _ClientStream
+        self._wakeup = None
+        self._task = None
+
+        # 发送指标
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.bytes_cancelled = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, addr, audio_data):
+        """把一段音频按chunk_size分包放入该客户端的发送队列，序列号从0开始"""
+        now = time.monotonic()
+        stream = self.streams.get(addr)
+        if stream is None:
+            stream = self.streams[addr] = _ClientStream(self.rate, self.capacity, now)
+        if not stream.queue:
+            stream.play_clock = max(stream.play_clock, now)
+
+        view = memoryview(audio_data)
+        for sequence, offset in enumerate(range(0, len(view), self.chunk_size)):
+            chunk = view[offset:offset + self.chunk_size]
+            packet = PACKET_HEADER.pack(AUDIO_MESSAGE_TYPE, sequence & 0xffff) + chunk
+            stream.queue.append((packet, stream.play_clock))
+            stream.queued_bytes += len(packet)
+            stream.play_clock += len(packet) / self.rate
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, addr):
+        """打断：丢弃该客户端还没发出的音频，返回丢弃的字节数"""
+        stream = self.streams.pop(addr, None)
+        if stream is None:
+            return 0
+        self.bytes_cancelled += stream.queued_bytes
+        return stream.queued_bytes
+
+    def pending_bytes(self, addr):
+        stream = self.streams.get(addr)
+        return stream.queued_bytes if stream else 0
+
+    def _drain(self, now):
+        """发送所有令牌足够的包，返回距离下一个包可发送的最短等待时间"""
+        next_wait = None
+        for addr, stream in list(self.streams.items()):
+            stream.refill(now)
+            queue = stream.queue
+            while queue and stream.tokens >= len(queue[0][0]):
+                packet, deadline = queue.popleft()
+                stream.tokens -= len(packet)
+                stream.queued_bytes -= len(packet)
+                try:
+                    self.send_packet(packet, addr)
+                except Exception as e:
+                    logger.warning("发送音频到 %s 出错: %s", addr, e)
+                lag = max(0.0, now - deadline)
+                self.packets_sent += 1
+                self.bytes_sent += len(packet)
+                self.total_lag += lag
+                self.max_lag = max(self.max_lag, lag)
+
+            if queue:
+                wait = (len(queue[0][0]) - stream.tokens) / stream.rate
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+            elif stream.tokens >= stream.capacity:
+                # 空闲且令牌已满的客户端不再需要保留状态
+                del self.streams[addr]
+        return next_wait
+
+    async def _run(self):
+        while True:
+            next_wait = self._drain(time.monotonic())
+            self._wakeup.clear()
+            if next_wait is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self):
+        return {
+            "active_streams": len(self.streams),
+            "queued_bytes": sum(s.queued_bytes for s in self.streams.values()),
+            "packets_sent": self.packets_sent,
+            "bytes_sent": self.bytes_sent,
+            "bytes_cancelled": self.bytes_cancelled,
+            "avg_lag_ms": self.total_lag / self.packets_sent * 1000 if self.packets_sent else 0.0,
+            "max_lag_ms": self.max_lag * 1000,
+        }
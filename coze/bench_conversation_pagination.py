@@ -0,0 +1,100 @@
+"""
+/conversations 分页对比（百万行）
+
+用法（在项目根目录）: python -m coze.bench_conversation_pagination [总行数] [用户数]
+
+临时目录中的SQLite文件写入 总行数 条记录，平均分给各用户，然后对不同页深度统计每次请求（总数 + 一页记录）的耗时：
+    无索引+偏移   - 原来的写法：每次 count，offset 跳过前面的页
+    索引+偏移     - 加上 (user_id, created_at) 索引，仍然每次 count + offset
+    索引+游标     - 索引 + keyset 游标分页 + 总数缓存
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from coze.database import Base, create_sqlite_engine, init_db
+from coze.models import Conversation
+from coze.conversation_query import TotalCache, count_conversations, fetch_conversations
+
+PAGE_SIZE = 20
+REPEAT = 10
+SEED_CHUNK = 50000
+
+
+def seed(engine, rows, users):
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_conversations_user_created"))
+        for offset in range(0, rows, SEED_CHUNK):
+            conn.execute(insert(Conversation), [
+                {"user_id": i % users, "message": "今天在学校做了什么呀", "response": "这是一段模拟的回答内容",
+                 "emotion": "happy", "topic": "study", "created_at": start + timedelta(seconds=i)}
+                for i in range(offset, min(offset + SEED_CHUNK, rows))
+            ])
+
+
+def cursors_for(db, user_id, pages):
+    """游标模式下第 n 页需要第 n-1 页的游标，预先翻一遍（不计时）"""
+    cursors = {1: None}
+    cursor = None
+    for page in range(2, max(pages) + 1):
+        _, cursor = fetch_conversations(db, user_id, page_size=PAGE_SIZE, cursor=cursor)
+        cursors[page] = cursor
+    return cursors
+
+
+def measure(db, users, page, keyset, cache, cursors):
+    rng = random.Random(page)
+    elapsed = 0.0
+    for _ in range(REPEAT):
+        user_id = rng.randrange(users)
+        cursor = cursors[user_id][page] if keyset else None
+        start = time.perf_counter()
+        count_conversations(db, user_id, cache=cache)
+        items, _ = fetch_conversations(db, user_id, page=page, page_size=PAGE_SIZE, cursor=cursor)
+        elapsed += time.perf_counter() - start
+        assert len(items) == PAGE_SIZE
+    return elapsed / REPEAT * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    last_page = rows // users // PAGE_SIZE
+    pages = sorted({1, 10, last_page // 4, last_page // 2, last_page})
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        start = time.perf_counter()
+        seed(engine, rows, users)
+        print(f"{rows} 行, {users} 个用户, 每人 {rows // users} 条, 每页 {PAGE_SIZE} 条 "
+              f"(写入耗时 {time.perf_counter() - start:.1f}s)")
+        print(f"{'页数':<12}" + "".join(f"{page:>10}" for page in pages))
+
+        with Session(engine) as db:
+            print(f"{'无索引+偏移':<10}" + "".join(
+                f"{measure(db, users, page, False, None, None):8.2f}ms" for page in pages))
+        start = time.perf_counter()
+        init_db(engine)
+        index_seconds = time.perf_counter() - start
+        with Session(engine) as db:
+            print(f"{'索引+偏移':<11}" + "".join(
+                f"{measure(db, users, page, False, None, None):8.2f}ms" for page in pages))
+            cursors = {user_id: cursors_for(db, user_id, pages) for user_id in range(users)}
+            cache = TotalCache(ttl=60)
+            for user_id in range(users):
+                count_conversations(db, user_id, cache=cache)  # 第一页请求时已经统计过
+            print(f"{'索引+游标':<11}" + "".join(
+                f"{measure(db, users, page, True, cache, cursors):8.2f}ms" for page in pages))
+        print(f"建索引耗时 {index_seconds:.1f}s")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+对话记录保存方式对比：每次对话结束 db.commit()（原来的 chat_stream）vs ConversationWriter 后台批量写入
+
+用法（在项目根目录）: python -m coze.bench_conversation_store [并发用户数] [每个用户的对话数]
+
+每个用户依次完成多轮对话，每轮先模拟 LLM 流式输出耗时，再保存对话记录；数据库是临时目录中的SQLite文件。
+统计 每秒完成的对话数、请求路径上保存记录的耗时(p50/p99)，以及最终写入的行数。
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from coze.database import Base
+from coze.models import Conversation
+from coze.conversation_store import ConversationWriter
+
+LLM_SECONDS = 0.02
+
+
+def legacy_saver(engine):
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    async def save(user_id, message, response):
+        # 原来的写法：每个请求一个会话，add + 在线程池中 commit
+        db = session_factory()
+        try:
+            db.add(Conversation(user_id=user_id, message=message, response=response, emotion="", topic=""))
+            await run_in_threadpool(db.commit)
+        finally:
+            db.close()
+
+    return save, None
+
+
+def writer_saver(engine):
+    writer = ConversationWriter(engine)
+
+    async def save(user_id, message, response):
+        await writer.save(user_id, message, response)
+
+    return save, writer
+
+
+async def run_users(save, writer, users, turns):
+    latencies = []
+
+    async def user(user_id):
+        for i in range(turns):
+            await asyncio.sleep(LLM_SECONDS)
+            start = time.perf_counter()
+            await save(user_id, f"第{i}个问题", "这是一段模拟的回答内容" * 10)
+            latencies.append(time.perf_counter() - start)
+
+    if writer is not None:
+        await writer.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    elapsed = time.perf_counter() - start
+    if writer is not None:
+        await writer.close()  # 剩余记录写完，不计入请求耗时
+    return elapsed, latencies
+
+
+def bench(name, make_saver, use_async, users, turns):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        sync_engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=sync_engine)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}") if use_async else sync_engine
+
+        async def main():
+            save, writer = make_saver(engine)
+            result = await run_users(save, writer, users, turns)
+            if use_async:
+                await engine.dispose()
+            return result, writer
+
+        (elapsed, latencies), writer = asyncio.run(main())
+        with sync_engine.connect() as conn:
+            rows = conn.execute(select(func.count()).select_from(Conversation)).scalar()
+        sync_engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    extra = ""
+    if writer is not None:
+        stats = writer.stats()
+        extra = f"   {stats['batches']} 个事务, 平均 {stats['avg_batch']:.0f} 条/事务"
+    print(f"{name:<18} {users * turns / elapsed:7.1f} 对话/s   保存耗时 p50 {statistics.median(latencies) * 1000:7.2f}ms "
+          f"p99 {p99 * 1000:7.2f}ms   写入 {rows} 行{extra}")
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"并发用户 {users}, 每人 {turns} 轮, 模拟LLM输出 {LLM_SECONDS * 1000:.0f}ms/轮")
+    bench("每次commit", legacy_saver, False, users, turns)
+    bench("批量写入(同步引擎)", writer_saver, False, users, turns)
+    bench("批量写入(aiosqlite)", writer_saver, True, users, turns)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+日志开销基准：每个音频包在接收路径上的耗时（原来的print / 日志INFO级别 / 日志DEBUG级别）
+
+用法: python bench_logging.py
+
+输出写到 os.devnull，只比较格式化和调用本身的开销，不受终端速度影响。
+"""
+import contextlib
+import logging
+import os
+import timeit
+
+import audio_handler
+from audio_handler import AudioHandler
+from log_utils import LOG_FORMAT, SampledLogger
+
+PACKET = bytes(640)  # 20ms 16kHz/16bit 音频
+ADDR = ('192.168.1.20', 40000)
+NUMBER = 20000
+UTTERANCE_PACKETS = 500  # 每10秒一句话，不超过最长录音时长
+
+bench_logger = logging.getLogger("bench")
+
+
+def legacy_packet(handler, sequence):
+    """原来每个包的输出：socket_server 一行 + AudioHandler 两行"""
+    print(f"收到来自 {ADDR} 的数据包 #{sequence}, 大小: {len(PACKET)} bytes")
+    handler.add_audio_data(PACKET)
+    print(f"接收数据块大小: {len(PACKET)} bytes")
+    print(f"累计接收: {handler.total_bytes} bytes")
+
+
+def make_logged_packet(every):
+    """与 socket_server.ClientSession.feed 相同的日志调用，采样间隔为every"""
+    packet_logger = SampledLogger(bench_logger, every)
+    audio_handler.packet_logger = SampledLogger(audio_handler.logger, every)
+
+    def logged_packet(handler, sequence):
+        packet_logger.debug("收到来自 %s 的数据包 #%d, 大小: %d bytes", ADDR, sequence, len(PACKET))
+        handler.add_audio_data(PACKET)
+    return logged_packet
+
+
+def measure(packet):
+    def loop():
+        handler = AudioHandler()
+        for sequence in range(NUMBER):
+            if sequence % UTTERANCE_PACKETS == 0:
+                handler.reset_buffer()
+            packet(handler, sequence)
+    return min(timeit.repeat(loop, number=1, repeat=5)) / NUMBER
+
+
+def main():
+    root = logging.getLogger()
+    cases = [
+        ("原来的print", logging.INFO, lambda: legacy_packet),
+        ("logging INFO", logging.INFO, lambda: make_logged_packet(50)),
+        ("logging DEBUG(采样1/50)", logging.DEBUG, lambda: make_logged_packet(50)),
+        ("logging DEBUG(不采样)", logging.DEBUG, lambda: make_logged_packet(1)),
+    ]
+    with open(os.devnull, 'w') as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        results = []
+        for name, level, factory in cases:
+            root.setLevel(level)
+            with contextlib.redirect_stdout(devnull):
+                results.append((name, measure(factory())))
+        root.removeHandler(handler)
+
+    baseline = results[0][1]
+    for name, per_packet in results:
+        print(f"{name:<28}{per_packet * 1e6:>10.2f} us/包{baseline / per_packet:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+协议编解码微基准：protocol_codec 与原来 asr_huoshan/tts_doubao 中的实现对比（帧/秒）
+
+用法: python bench_protocol_codec.py
+"""
+import gzip
+import json
+import os
+import timeit
+
+from protocol_codec import (
+    AUDIO_ONLY_RESPONSE, FULL_SERVER_RESPONSE, GZIP, JSON, NEG_WITH_SEQUENCE,
+    NO_COMPRESSION, NO_SERIALIZATION, POS_SEQUENCE,
+    decode_frame, encode_audio_only_request, encode_frame, pack_header,
+)
+
+CHUNK = os.urandom(6400)  # 200ms 16kHz/16bit 音频
+LARGE_CHUNK = os.urandom(64000)  # 2s 音频，TTS长句常见的单帧大小
+GZIPPED_CHUNK = gzip.compress(CHUNK)
+
+
+# ---------------- 原实现（去掉了print，保留逐字节拼接、切片复制和十六进制字符串） ----------------
+def legacy_generate_header(message_type=1, message_type_specific_flags=0, serial_method=1,
+                           compression_type=1, reserved_data=0x00):
+    header = bytearray()
+    header_size = 1
+    header.append((0b0001 << 4) | header_size)
+    header.append((message_type << 4) | message_type_specific_flags)
+    header.append((serial_method << 4) | compression_type)
+    header.append(reserved_data)
+    return header
+
+
+def legacy_generate_before_payload(sequence):
+    before_payload = bytearray()
+    before_payload.extend(sequence.to_bytes(4, 'big', signed=True))
+    return before_payload
+
+
+def legacy_audio_only_request(payload_bytes, seq):
+    audio_only_request = bytearray(legacy_generate_header(message_type=2, message_type_specific_flags=1))
+    audio_only_request.extend(legacy_generate_before_payload(sequence=seq))
+    audio_only_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
+    req_str = ' '.join(format(byte, '02x') for byte in audio_only_request)
+    audio_only_request.extend(payload_bytes)
+    return audio_only_request
+
+
+def legacy_asr_parse_response(res):
+    header_size = res[0] & 0x0f
+    message_type = res[1] >> 4
+    message_type_specific_flags = res[1] & 0x0f
+    serialization_method = res[2] >> 4
+    message_compression = res[2] & 0x0f
+    payload = res[header_size * 4:]
+    result = {'is_last_package': False}
+    payload_msg = None
+    if message_type_specific_flags & 0x01:
+        result['payload_sequence'] = int.from_bytes(payload[:4], "big", signed=True)
+        payload = payload[4:]
+    if message_type_specific_flags & 0x02:
+        result['is_last_package'] = True
+    if message_type == 0b1001:
+        payload_size = int.from_bytes(payload[:4], "big", signed=True)
+        payload_msg = payload[4:]
+    if payload_msg is None:
+        return result
+    if message_compression == 1:
+        payload_msg = gzip.decompress(payload_msg)
+    if serialization_method == 1:
+        payload_msg = json.loads(str(payload_msg, "utf-8"))
+    result['payload_msg'] = payload_msg
+    result['payload_size'] = payload_size
+    return result
+
+
+def legacy_tts_parse_response(res, audio_callback):
+    header_size = res[0] & 0x0f
+    message_type = res[1] >> 4
+    message_type_specific_flags = res[1] & 0x0f
+    payload = res[header_size * 4:]
+    if message_type == 0xb:
+        if message_type_specific_flags == 0:
+            return False
+        sequence_number = int.from_bytes(payload[:4], "big", signed=True)
+        payload = payload[8:]
+        audio_callback(payload)
+        return sequence_number < 0
+    return True
+
+
+# ---------------- 测试数据 ----------------
+ASR_RESPONSE = encode_frame(FULL_SERVER_RESPONSE,
+                            gzip.compress(json.dumps({"result": {"text": "今天天气怎么样" * 3}}).encode()),
+                            POS_SEQUENCE, 12, JSON, GZIP)
+
+
+def tts_audio_frame(chunk):
+    return pack_header(AUDIO_ONLY_RESPONSE, POS_SEQUENCE, NO_SERIALIZATION, NO_COMPRESSION) \
+        + (5).to_bytes(4, 'big', signed=True) + len(chunk).to_bytes(4, 'big') + chunk
+
+
+TTS_AUDIO = tts_audio_frame(CHUNK)
+TTS_AUDIO_LARGE = tts_audio_frame(LARGE_CHUNK)
+
+
+def codec_tts_parse(res, audio_callback):
+    frame = decode_frame(res)
+    audio_callback(frame.payload)
+    return frame.sequence < 0
+
+
+def run(name, legacy, codec, number):
+    legacy_time = min(timeit.repeat(legacy, number=number, repeat=5))
+    codec_time = min(timeit.repeat(codec, number=number, repeat=5))
+    print(f"{name:<28} 原实现 {number / legacy_time:>12,.0f} 帧/s   "
+          f"codec {number / codec_time:>12,.0f} 帧/s   {legacy_time / codec_time:5.1f}x")
+
+
+def main():
+    callback = lambda data: None
+    run("音频帧封装(已压缩payload)",
+        lambda: legacy_audio_only_request(GZIPPED_CHUNK, 3),
+        lambda: encode_frame(2, GZIPPED_CHUNK, POS_SEQUENCE, 3, NO_SERIALIZATION, GZIP), 50000)
+    run("音频帧封装(含gzip)",
+        lambda: legacy_audio_only_request(gzip.compress(CHUNK), 3),
+        lambda: encode_audio_only_request(CHUNK, 3), 2000)
+    run("ASR响应解析",
+        lambda: legacy_asr_parse_response(ASR_RESPONSE),
+        lambda: decode_frame(ASR_RESPONSE).decode_payload(), 50000)
+    run("TTS音频帧解析(6.4KB)",
+        lambda: legacy_tts_parse_response(TTS_AUDIO, callback),
+        lambda: codec_tts_parse(TTS_AUDIO, callback), 200000)
+    run("TTS音频帧解析(64KB)",
+        lambda: legacy_tts_parse_response(TTS_AUDIO_LARGE, callback),
+        lambda: codec_tts_parse(TTS_AUDIO_LARGE, callback), 50000)
+
+
+if __name__ == "__main__":
+    main()
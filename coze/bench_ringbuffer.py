@@ -0,0 +1,129 @@
+"""
+环形缓冲区吞吐量基准（MB/s）：原来的逐次分配实现 vs read() / readinto() / views()
+
+用法: python bench_ringbuffer.py
+"""
+import asyncio
+import time
+import unittest
+
+from ringbuffer import RingBuffer, AsyncRingBuffer, OVERWRITE
+
+CAPACITY = 64 * 1024
+CHUNK = bytes(640)  # 20ms 16kHz/16bit 音频
+TOTAL = 64 * 1024 * 1024
+
+
+class LegacyRingBuffer:
+    """原实现（去掉了print）：每次读都分配新的bytearray，写入时切片复制源数据"""
+    def __init__(self, size):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.available = 0
+
+    def write(self, data):
+        data_len = len(data)
+        if data_len > self.size - self.available:
+            return 0
+        first_part = min(data_len, self.size - self.write_pos)
+        self.buffer[self.write_pos:self.write_pos + first_part] = data[:first_part]
+        if first_part < data_len:
+            second_part = data_len - first_part
+            self.buffer[0:second_part] = data[first_part:]
+            self.write_pos = second_part
+        else:
+            self.write_pos = (self.write_pos + first_part) % self.size
+        self.available += data_len
+        return data_len
+
+    def read(self, size):
+        if self.available == 0:
+            return bytearray(0)
+        read_size = min(size, self.available)
+        first_part = min(read_size, self.size - self.read_pos)
+        result = bytearray(read_size)
+        result[:first_part] = self.buffer[self.read_pos:self.read_pos + first_part]
+        if first_part < read_size:
+            second_part = read_size - first_part
+            result[first_part:] = self.buffer[0:second_part]
+            self.read_pos = second_part
+        else:
+            self.read_pos = (self.read_pos + first_part) % self.size
+        self.available -= read_size
+        return result
+
+
+def report(name, seconds):
+    print(f"{name:<36}{TOTAL / seconds / 1e6:>10.0f} MB/s")
+
+
+class BenchRingBuffer(unittest.TestCase):
+    # 读块大小不等于写块大小，保证经常出现环绕
+    read_size = 1000
+
+    def run_sync(self, rb, consume):
+        chunks = TOTAL // len(CHUNK)
+        start = time.perf_counter()
+        for _ in range(chunks):
+            if not rb.write(CHUNK):
+                self.fail("写入失败")
+            while rb.available >= self.read_size:
+                consume(rb)
+        return time.perf_counter() - start
+
+    def test_legacy_read(self):
+        report("原实现 read()", self.run_sync(LegacyRingBuffer(CAPACITY), lambda rb: rb.read(self.read_size)))
+
+    def test_read(self):
+        report("read()", self.run_sync(RingBuffer(CAPACITY), lambda rb: rb.read(self.read_size)))
+
+    def test_readinto(self):
+        out = bytearray(self.read_size)
+        report("readinto() 复用缓冲区", self.run_sync(RingBuffer(CAPACITY), lambda rb: rb.readinto(out)))
+
+    def test_views(self):
+        def consume(rb):
+            first, second = rb.views(self.read_size)
+            rb.consume(len(first) + len(second))
+        report("views() + consume() 零拷贝", self.run_sync(RingBuffer(CAPACITY), consume))
+
+    def test_overwrite_without_reader(self):
+        rb = RingBuffer(CAPACITY, policy=OVERWRITE)
+        start = time.perf_counter()
+        for _ in range(TOTAL // len(CHUNK)):
+            rb.write(CHUNK)
+        report("OVERWRITE 只写不读", time.perf_counter() - start)
+
+    def test_async_backpressure(self):
+        async def run():
+            rb = AsyncRingBuffer(CAPACITY)
+
+            async def produce():
+                for _ in range(TOTAL // len(CHUNK)):
+                    if rb.free < len(CHUNK):
+                        await rb.write_all(CHUNK)
+                    else:
+                        rb.write(CHUNK)
+                    if rb.available >= 16 * 1024:
+                        await asyncio.sleep(0)  # 让出给消费者，模拟按包到达
+                rb.close()
+
+            received = 0
+            producer = asyncio.ensure_future(produce())
+            while True:
+                chunk = await rb.read_exactly(16 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+            await producer
+            self.assertEqual(received, TOTAL // len(CHUNK) * len(CHUNK))
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        report("AsyncRingBuffer 背压 read_exactly()", time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+分句对比：原来 chat_with_ai 里的规则（句末是标点且长度>=5就断开）vs SentenceSegmenter
+
+用法: python bench_sentence_segmenter.py [录制的LLM流.jsonl]
+
+jsonl每行是一次回复的token列表，例如 ["你好", "呀，", ...]；不指定时使用下面录制的几段回复。
+统计 TTS调用次数、平均每次合成的字数、第一段的字数和出现时间（按每个token 30ms）、
+把数字拆开的次数（"3." + "14"），以及每个token的CPU耗时。
+"""
+import json
+import re
+import sys
+import timeit
+
+from sentence_segmenter import SentenceSegmenter
+
+TOKEN_MS = 30
+
+RECORDED_STREAMS = [
+    ["你好", "呀", "！", "我是", "你的", "小", "助手", "，", "今天", "过得", "怎么样", "？", "有没有", "什么",
+     "开心", "的事情", "想", "和我", "分享", "呢", "？"],
+    ["恐龙", "生活", "在", "大约", "2", ".", "3亿", "年前", "到", "6", "6", "00", "万年前", "，", "其中",
+     "最大的", "阿根廷", "龙", "体长", "可以", "达到", "3", "5", "米", "，", "体重", "大约", "7", "0", "吨",
+     "。", "是不是", "很", "厉害", "？"],
+    ["好的", "，", "我们", "来", "算", "一下", "：", "1", "2", ".", "5", "乘以", "4", "等于", "5", "0",
+     "，", "再", "加上", "1", ",", "000", "，", "结果", "是", "1", ",", "050", "。", "你", "算", "对", "了",
+     "吗", "？"],
+    ["妈妈", "说", "：", "“", "早点", "睡觉", "，", "明天", "还要", "上学", "呢", "！", "”", "所以",
+     "我们", "今天", "就", "聊到", "这里", "吧", "，", "晚安", "～"],
+    ["Let", "'s", " learn", " some", " English", ".", " Apple", " means", "苹果", "，", "banana", " means",
+     "香蕉", "。", " Can", " you", " say", " it", "?", " Great", " job", "!"],
+    ["下面", "给你", "讲", "一个", "故事", "。", "从前", "有", "一只", "小兔子", "，", "它", "住在", "森林",
+     "里", "，", "每天", "都", "去", "河边", "喝水", "，", "有一天", "它", "在", "河边", "遇到", "了", "一只",
+     "迷路", "的", "小鸭子", "，", "小鸭子", "哭着", "说", "找不到", "妈妈", "了", "，", "小兔子", "说",
+     "别怕", "，", "我", "带你", "去", "找", "妈妈", "吧", "。"],
+]
+
+
+class LegacySegmenter:
+    """原来 chat_with_ai 中的规则"""
+    endings = ["，", "。", "！", "？", ",", ".", "!", "?"]
+
+    def __init__(self):
+        self.current = ""
+
+    def feed(self, text):
+        self.current += text
+        if len(self.current) >= 5 and any(self.current.endswith(e) for e in self.endings):
+            out, self.current = [self.current], ""
+            return out
+        return []
+
+    def flush(self):
+        out = [self.current] if self.current.strip() else []
+        self.current = ""
+        return out
+
+
+_NUMBER_SPLIT = re.compile(r"\d[.,:]$")
+
+
+def run(factory, stream):
+    segmenter = factory()
+    segments = []
+    first_at = None
+    for index, token in enumerate(stream):
+        out = segmenter.feed(token)
+        if out and first_at is None:
+            first_at = (index + 1) * TOKEN_MS
+        segments += out
+    segments += segmenter.flush()
+    if first_at is None:
+        first_at = len(stream) * TOKEN_MS
+    broken = sum(1 for a, b in zip(segments, segments[1:]) if _NUMBER_SPLIT.search(a) and b[:1].isdigit())
+    return segments, first_at, broken
+
+
+def report(name, factory, streams):
+    calls = chars = first_chars = first_ms = broken = 0
+    for stream in streams:
+        segments, first_at, split_numbers = run(factory, stream)
+        calls += len(segments)
+        chars += sum(len(s) for s in segments)
+        first_chars += len(segments[0]) if segments else 0
+        first_ms += first_at
+        broken += split_numbers
+    tokens = sum(len(s) for s in streams)
+    elapsed = min(timeit.repeat(lambda: [run(factory, s) for s in streams], number=200, repeat=3))
+    n = len(streams)
+    print(f"{name:<10} TTS调用 {calls:3d} 次   平均 {chars / calls:5.1f} 字/次   第一段 {first_chars / n:4.1f} 字 "
+          f"@{first_ms / n:4.0f}ms   拆开数字 {broken} 次   {elapsed / 200 / tokens * 1e6:5.2f} us/token")
+
+
+def main():
+    streams = RECORDED_STREAMS
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            streams = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(streams)} 段回复, 共 {sum(len(s) for s in streams)} 个token")
+    report("原规则", LegacySegmenter, streams)
+    report("分句器", SentenceSegmenter, streams)
+    for segments, _, _ in (run(SentenceSegmenter, s) for s in streams[:3]):
+        print("   ", " | ".join(segments))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+SQLite存储配置对比：legacy（回滚日志 + 默认连接池）vs wal（WAL + synchronous=NORMAL + mmap + 连接池 + busy_timeout）
+
+用法（在项目根目录）: python -m coze.bench_sqlite_profile [秒数] [读线程数] [写线程数]
+
+临时目录中的SQLite文件先写入 SEED_ROWS 条对话记录，然后同时运行：
+    读线程 - 和 /conversations/{user_id} 一样：按用户统计总数 + 按时间倒序取一页
+    写线程 - 和 ConversationWriter 一样：每个事务插入 WRITE_BATCH 条记录
+统计 每秒读请求数和读耗时(p50/p99)、每秒写入行数和提交耗时(p99)、以及 database is locked 错误数。
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from coze.database import Base, create_sqlite_engine
+from coze.models import Conversation
+
+SEED_ROWS = 50000
+USERS = 200
+WRITE_BATCH = 20
+PAGE_SIZE = 20
+
+
+def make_row(user_id, created_at):
+    return {"user_id": user_id, "message": "今天在学校做了什么呀", "response": "这是一段模拟的回答内容" * 10,
+            "emotion": "happy", "topic": "study", "created_at": created_at}
+
+
+def seed(engine):
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    rows = [make_row(i % USERS, start + timedelta(seconds=i)) for i in range(SEED_ROWS)]
+    with engine.begin() as conn:
+        conn.execute(insert(Conversation), rows)
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(int(len(values) * ratio) - 1, 0)]
+
+
+def run(profile, seconds, readers, writers):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile)
+        seed(engine)
+        stop = time.perf_counter() + seconds
+        read_times, commit_times = [], []
+        counters = {"rows": 0, "locked": 0}
+        lock = threading.Lock()
+
+        def reader():
+            rng = random.Random()
+            times = []
+            while time.perf_counter() < stop:
+                user_id = rng.randrange(USERS)
+                start = time.perf_counter()
+                try:
+                    with engine.connect() as conn:
+                        query = select(Conversation).where(Conversation.user_id == user_id)
+                        conn.execute(select(func.count()).select_from(query.subquery())).scalar()
+                        conn.execute(query.order_by(Conversation.created_at.desc()).limit(PAGE_SIZE)).all()
+                except OperationalError:
+                    with lock:
+                        counters["locked"] += 1
+                    continue
+                times.append(time.perf_counter() - start)
+            with lock:
+                read_times.extend(times)
+
+        def writer():
+            rng = random.Random()
+            times = []
+            rows = 0
+            while time.perf_counter() < stop:
+                batch = [make_row(rng.randrange(USERS), datetime.now()) for _ in range(WRITE_BATCH)]
+                start = time.perf_counter()
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(Conversation), batch)
+                except OperationalError:
+                    with lock:
+                        counters["locked"] += 1
+                    continue
+                times.append(time.perf_counter() - start)
+                rows += len(batch)
+            with lock:
+                commit_times.extend(times)
+                counters["rows"] += rows
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    print(f"{profile:<7} 读 {len(read_times) / seconds:7.1f} 次/s  p50 {statistics.median(read_times or [0]) * 1000:6.2f}ms "
+          f"p99 {percentile(read_times, 0.99) * 1000:7.2f}ms   写 {counters['rows'] / seconds:7.1f} 行/s  "
+          f"提交p99 {percentile(commit_times, 0.99) * 1000:7.2f}ms   locked错误 {counters['locked']}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    print(f"{SEED_ROWS} 条记录, {readers} 个读线程, {writers} 个写线程({WRITE_BATCH} 条/事务), 持续 {seconds:g}s")
+    for profile in ("legacy", "wal"):
+        run(profile, seconds, readers, writers)
+
+
+if __name__ == "__main__":
+    main()
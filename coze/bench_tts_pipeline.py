@@ -0,0 +1,79 @@
+"""
+LLM -> TTS 流水线对比：原来在读LLM流的循环里逐句 await 合成 vs SentencePipeline
+
+用法: python bench_tts_pipeline.py [句子数]
+
+LLM和TTS都用固定耗时模拟：LLM是同步生成器（和 coze_client.chat_stream 一样），
+每个token耗时 TOKEN_SECONDS；TTS首包延迟 TTS_FIRST_CHUNK_SECONDS，之后按 TTS_CHUNK_SECONDS 输出音频块。
+"""
+import asyncio
+import sys
+import time
+
+from tts_pipeline import SentencePipeline
+
+TOKEN_SECONDS = 0.03          # LLM每个token的间隔
+TOKENS_PER_SENTENCE = 6
+TTS_FIRST_CHUNK_SECONDS = 0.15  # TTS首包延迟
+TTS_CHUNK_SECONDS = 0.05
+TTS_CHUNKS = 6
+CHUNK = bytes(3200)
+
+
+class SimulatedTTS:
+    async def query_tts(self, text, audio_callback):
+        await asyncio.sleep(TTS_FIRST_CHUNK_SECONDS)
+        for _ in range(TTS_CHUNKS):
+            audio_callback(CHUNK)
+            await asyncio.sleep(TTS_CHUNK_SECONDS)
+
+
+def llm(sentences):
+    for index in range(sentences):
+        for token in range(TOKENS_PER_SENTENCE - 1):
+            time.sleep(TOKEN_SECONDS)
+            yield "字"
+        time.sleep(TOKEN_SECONDS)
+        yield "。"
+
+
+async def legacy(tts, sentences, sink):
+    """原实现：同步生成器直接在事件循环里迭代，每句合成完才继续读LLM"""
+    current = ""
+    for message in llm(sentences):
+        current += message
+        if len(current) >= 5 and current.endswith("。"):
+            await tts.query_tts(current, sink)
+            current = ""
+
+
+class Timeline:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_audio = None
+        self.chunks = 0
+
+    def __call__(self, chunk):
+        if self.first_audio is None:
+            self.first_audio = time.monotonic() - self.start
+        self.chunks += 1
+
+
+async def main(sentences):
+    print(f"{sentences} 句, LLM {TOKEN_SECONDS * 1000:.0f}ms/token x {TOKENS_PER_SENTENCE} token/句, "
+          f"TTS 首包 {TTS_FIRST_CHUNK_SECONDS * 1000:.0f}ms + {TTS_CHUNKS}x{TTS_CHUNK_SECONDS * 1000:.0f}ms/句")
+    tts = SimulatedTTS()
+    timeline = Timeline()
+    await legacy(tts, sentences, timeline)
+    total = time.monotonic() - timeline.start
+    print(f"{'原实现':<12} 首段音频 {timeline.first_audio * 1000:6.0f}ms   总耗时 {total * 1000:6.0f}ms")
+    for parallel in (1, 2, 4):
+        timeline = Timeline()
+        stats = await SentencePipeline(tts, timeline, max_parallel=parallel).run(llm(sentences))
+        assert timeline.chunks == sentences * TTS_CHUNKS
+        print(f"{'流水线 x' + str(parallel):<12} 首段音频 {stats['time_to_first_audio_ms']:6.0f}ms   "
+              f"总耗时 {stats['total_ms']:6.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 8))
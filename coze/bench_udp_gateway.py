@@ -0,0 +1,140 @@
+"""
+UDP网关并发压测：对比旧的 recvfrom+run_in_executor 串行接收循环 与 DatagramProtocol 会话任务
+
+用法: python bench_udp_gateway.py [设备数] [每台设备轮数]
+
+ASR/LLM/TTS 用固定耗时的 sleep 代替，只衡量接收与调度本身。
+"""
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import sys
+import time
+
+os.environ.setdefault("COZE_API_TOKEN", "bench")  # coze_client 导入时需要
+os.environ["STREAMING_ASR"] = "0"  # 压测不连接真实的识别服务
+
+import socket_server
+from socket_server import END_MARKER, UdpGatewayProtocol
+
+TURN_SECONDS = 0.3        # 模拟一轮 ASR + LLM + TTS 的耗时
+PACKETS_PER_TURN = 50     # 每轮语音的数据包数（约1.6秒音频）
+PACKET_INTERVAL = 0.005   # 设备发送间隔（压测时比实际更快）
+PAYLOAD = bytes(1024)
+
+
+class Stats:
+    def __init__(self):
+        self.turns = 0
+        self.packets = 0
+        self.turn_latency = []  # 从发送结束标记到该轮处理完成
+        self.end_sent = {}
+
+
+async def legacy_receive_loop(server_socket, stats):
+    """旧实现：阻塞recvfrom放到线程池，然后在接收循环里直接await整轮对话"""
+    loop = asyncio.get_running_loop()
+    buffers = {}
+    while True:
+        data, addr = await loop.run_in_executor(None, lambda: server_socket.recvfrom(1500))
+        if data == END_MARKER:
+            buffers.pop(addr, None)
+            await asyncio.sleep(TURN_SECONDS)
+            record_turn(stats, addr)
+            continue
+        stats.packets += 1
+        buffers.setdefault(addr, bytearray()).extend(data[2:])
+
+
+def record_turn(stats, addr):
+    stats.turns += 1
+    sent = stats.end_sent.pop(addr, None)
+    if sent is not None:
+        stats.turn_latency.append(time.perf_counter() - sent)
+
+
+def make_turn_handler(stats):
+    async def fake_turn(client_session, utterance):
+        utterance.audio_handler.reset_buffer()
+        await asyncio.sleep(TURN_SECONDS)
+        record_turn(stats, client_session.addr)
+    return fake_turn
+
+
+async def device(server_addr, rounds, stats, turn_timeout):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=server_addr)
+    addr = transport.get_extra_info('sockname')
+    for _ in range(rounds):
+        for seq in range(PACKETS_PER_TURN):
+            transport.sendto(seq.to_bytes(2, 'big') + PAYLOAD)
+            await asyncio.sleep(PACKET_INTERVAL)
+        # 等上一轮处理完再说下一轮，和真实设备一样；结束标记被丢弃时超时放弃
+        deadline = time.perf_counter() + turn_timeout
+        while addr in stats.end_sent and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        stats.end_sent[addr] = time.perf_counter()
+        transport.sendto(END_MARKER)
+    transport.close()
+
+
+async def run(mode, devices, rounds):
+    stats = Stats()
+    loop = asyncio.get_running_loop()
+    if mode == "legacy":
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server_socket.bind(('127.0.0.1', 0))
+        server_addr = server_socket.getsockname()
+        server = asyncio.ensure_future(legacy_receive_loop(server_socket, stats))
+    else:
+        socket_server.clients.close()
+        server_transport, protocol = await loop.create_datagram_endpoint(
+            lambda: UdpGatewayProtocol(make_turn_handler(stats)), local_addr=('127.0.0.1', 0))
+        server_addr = server_transport.get_extra_info('sockname')
+
+    start = time.perf_counter()
+    turn_timeout = devices * TURN_SECONDS + 2
+    await asyncio.gather(*(device(server_addr, rounds, stats, turn_timeout) for _ in range(devices)))
+    deadline = time.perf_counter() + turn_timeout
+    while stats.turns < devices * rounds and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    if mode == "legacy":
+        server.cancel()
+        # 线程池中的recvfrom仍在阻塞，发一个包让它返回，否则事件循环无法退出
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as wakeup:
+            wakeup.sendto(b'', server_addr)
+        await asyncio.sleep(0.05)
+        server_socket.close()
+    else:
+        stats.packets = protocol.packets - stats.turns
+        server_transport.close()
+        socket_server.clients.close()
+    return stats, elapsed
+
+
+def report(mode, devices, rounds, stats, elapsed):
+    expected = devices * rounds * PACKETS_PER_TURN
+    latency = sorted(stats.turn_latency) or [float('nan')]
+    print(f"{mode:>8}: 轮次 {stats.turns}/{devices * rounds}, "
+          f"数据包 {stats.packets}/{expected}, 耗时 {elapsed:.2f}s, "
+          f"吞吐 {stats.turns / elapsed:.1f} 轮/s, "
+          f"轮次延迟 p50 {latency[len(latency) // 2] * 1000:.0f}ms "
+          f"max {latency[-1] * 1000:.0f}ms")
+
+
+def main():
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"设备数 {devices}, 每台 {rounds} 轮, 模拟处理耗时 {TURN_SECONDS}s/轮")
+    for mode in ("legacy", "protocol"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats, elapsed = asyncio.run(run(mode, devices, rounds))
+        report(mode, devices, rounds, stats, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+/ws 音频传输格式对比：旧固件的 JSON+十六进制 vs 二进制帧（ws_frames）
+
+用法: python bench_ws_frames.py [音频秒数]
+
+本机回环的WebSocket连接上分别测上行（设备 -> 服务端录音）和下行（TTS音频 -> 设备），
+每个包1024字节（和 server.py 下发的分块大小一致），统计吞吐量和线上字节数；
+另外单独测每个包的编解码CPU耗时。
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import timeit
+
+import websockets
+
+from ws_frames import (
+    FORMAT_BINARY, FORMAT_JSON, FRAME_AUDIO, FRAME_END, FrameEncoder,
+    decode_binary, decode_json_audio, encode_binary, encode_json_audio,
+)
+
+CHUNK_SIZE = 1024
+BYTES_PER_SECOND = 16000 * 2
+
+
+async def serve(ws):
+    """模拟server.py：上行时解码收到的音频，下行时按请求的格式发送音频"""
+    request = json.loads(await ws.recv())
+    if request["direction"] == "up":
+        received = 0
+        async for frame in ws:
+            if isinstance(frame, bytes):
+                frame_type, _, _, payload = decode_binary(frame)
+                if frame_type == FRAME_END:
+                    break
+                received += len(payload)
+            else:
+                message = json.loads(frame)
+                if message["type"] == "end_recording":
+                    break
+                received += len(decode_json_audio(message))
+        await ws.send(json.dumps({"received": received}))
+    else:
+        encoder = FrameEncoder(ws.send, ws.send, request["audio_format"])
+        audio = memoryview(os.urandom(request["bytes"]))
+        for offset in range(0, len(audio), CHUNK_SIZE):
+            await encoder.send_audio(audio[offset:offset + CHUNK_SIZE])
+        if encoder.binary:
+            await encoder.send_end()
+        else:
+            await ws.send(json.dumps({"type": "end"}))
+
+
+async def uplink(uri, audio_format, audio):
+    async with websockets.connect(uri, max_size=None) as ws:
+        await ws.send(json.dumps({"direction": "up"}))
+        wire = 0
+        start = time.perf_counter()
+        for sequence, offset in enumerate(range(0, len(audio), CHUNK_SIZE)):
+            chunk = audio[offset:offset + CHUNK_SIZE]
+            if audio_format == FORMAT_BINARY:
+                frame = encode_binary(FRAME_AUDIO, sequence, chunk)
+            else:
+                frame = encode_json_audio(chunk)
+            wire += len(frame)
+            await ws.send(frame)
+        await ws.send(encode_binary(FRAME_END, 0) if audio_format == FORMAT_BINARY
+                      else json.dumps({"type": "end_recording"}))
+        received = json.loads(await ws.recv())["received"]
+        assert received == len(audio), received
+        return time.perf_counter() - start, wire
+
+
+async def downlink(uri, audio_format, size):
+    async with websockets.connect(uri, max_size=None) as ws:
+        start = time.perf_counter()
+        await ws.send(json.dumps({"direction": "down", "audio_format": audio_format, "bytes": size}))
+        received = wire = 0
+        async for frame in ws:
+            wire += len(frame)
+            if isinstance(frame, bytes):
+                frame_type, _, _, payload = decode_binary(frame)
+                if frame_type == FRAME_END:
+                    break
+                received += len(payload)
+            else:
+                message = json.loads(frame)
+                if message["type"] == "end":
+                    break
+                received += len(decode_json_audio(message))
+        assert received == size, received
+        return time.perf_counter() - start, wire
+
+
+def report(name, audio_bytes, elapsed, wire):
+    print(f"{name:<16} {audio_bytes / elapsed / 1e6:8.2f} MB/s 音频   "
+          f"{audio_bytes / CHUNK_SIZE / elapsed:>10,.0f} 包/s   线上字节/音频字节 {wire / audio_bytes:5.2f}")
+
+
+def codec_cost():
+    chunk = os.urandom(CHUNK_SIZE)
+    text = encode_json_audio(chunk)
+    frame = encode_binary(FRAME_AUDIO, 1, chunk)
+    number = 20000
+    for name, func in [
+        ("JSON 编码", lambda: encode_json_audio(chunk)),
+        ("JSON 解码", lambda: decode_json_audio(json.loads(text))),
+        ("二进制 编码", lambda: encode_binary(FRAME_AUDIO, 1, chunk)),
+        ("二进制 解码", lambda: decode_binary(frame)),
+    ]:
+        elapsed = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:<16} {elapsed / number * 1e6:8.2f} us/包")
+
+
+async def main(seconds):
+    audio = os.urandom(int(seconds * BYTES_PER_SECOND))
+    async with websockets.serve(serve, "127.0.0.1", 0, max_size=None) as server:
+        port = server.sockets[0].getsockname()[1]
+        uri = f"ws://127.0.0.1:{port}"
+        print(f"音频 {seconds:.0f} 秒 ({len(audio)} bytes), 每包 {CHUNK_SIZE} bytes")
+        for audio_format in (FORMAT_JSON, FORMAT_BINARY):
+            elapsed, wire = await uplink(uri, audio_format, audio)
+            report(f"上行 {audio_format}", len(audio), elapsed, wire)
+        for audio_format in (FORMAT_JSON, FORMAT_BINARY):
+            elapsed, wire = await downlink(uri, audio_format, len(audio))
+            report(f"下行 {audio_format}", len(audio), elapsed, wire)
+    codec_cost()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 300))
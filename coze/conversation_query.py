@@ -0,0 +1,104 @@
+"""
+/conversations/{user_id} 的分页查询
+
+    - 索引 ix_conversations_user_created (user_id, created_at)：按用户过滤、按时间排序都走索引，不扫全表
+    - 游标分页(keyset)：按 (created_at, id) 倒序，下一页从上一页最后一条之后开始，
+      翻到多深都只读一页的索引；page/page_size 的偏移分页保留兼容，深页要先跳过前面所有行
+    - 总数缓存：同一用户和时间范围的总数缓存 CONVERSATION_TOTAL_TTL 秒，翻页时不再重复统计；
+      缓存期间新写入的记录不计入，总数是近似值
+"""
+import base64
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func, select, tuple_
+
+from coze.models import Conversation
+
+CONVERSATION_TOTAL_TTL = float(os.getenv("CONVERSATION_TOTAL_TTL", 30))
+CONVERSATION_TOTAL_CACHE_SIZE = int(os.getenv("CONVERSATION_TOTAL_CACHE_SIZE", 10000))
+
+
+def encode_cursor(conversation):
+    """用一页最后一条记录生成下一页的游标"""
+    raw = json.dumps([conversation.created_at.isoformat(), conversation.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (created_at, id)；格式不对时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, conversation_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(conversation_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+class TotalCache:
+    """按 (user_id, start_date, end_date) 缓存总数，过期时间 ttl 秒，超过 max_entries 时淘汰最久没用的"""
+    def __init__(self, ttl=CONVERSATION_TOTAL_TTL, max_entries=CONVERSATION_TOTAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (过期时间, 总数)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, total):
+        self.entries[key] = (time.monotonic() + self.ttl, total)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def conversation_filters(user_id, start_date=None, end_date=None):
+    conditions = [Conversation.user_id == user_id]
+    if start_date:
+        conditions.append(Conversation.created_at >= start_date)
+    if end_date:
+        conditions.append(Conversation.created_at < end_date)
+    return conditions
+
+
+def count_conversations(db, user_id, start_date=None, end_date=None, cache=None):
+    """满足条件的记录总数；传入 cache 时优先使用缓存"""
+    key = (user_id, start_date, end_date)
+    if cache is not None:
+        total = cache.get(key)
+        if total is not None:
+            return total
+    total = db.execute(
+        select(func.count(Conversation.id)).where(*conversation_filters(user_id, start_date, end_date))
+    ).scalar()
+    if cache is not None:
+        cache.put(key, total)
+    return total
+
+
+def fetch_conversations(db, user_id, start_date=None, end_date=None, page=1, page_size=20, cursor=None):
+    """
+    按时间倒序取一页记录，返回 (记录列表, 下一页游标)
+    有 cursor 时按游标分页，忽略 page；没有下一页时游标为 None
+    """
+    query = select(Conversation).where(*conversation_filters(user_id, start_date, end_date))
+    if cursor:
+        created_at, conversation_id = decode_cursor(cursor)
+        query = query.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(created_at, conversation_id))
+    else:
+        query = query.offset((page - 1) * page_size)
+    query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(page_size)
+    conversations = db.execute(query).scalars().all()
+    next_cursor = encode_cursor(conversations[-1]) if len(conversations) == page_size else None
+    return conversations, next_cursor
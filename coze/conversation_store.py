@@ -0,0 +1,131 @@
+"""
+对话记录的后台批量写入（write-behind）
+
+chat_stream 原来每次对话结束都要 db.commit() 一次，SQLite每次提交都要等磁盘 fsync，占着线程池的线程。
+现在只把记录放进队列就返回，由后台任务把一段时间内的多条记录合并到一个事务中插入：
+    - 第一条记录到达后最多再等 DB_WRITE_FLUSH_MS 毫秒，或攒够 DB_WRITE_BATCH_SIZE 条就提交一次；
+      上一批提交期间到达的记录自然进入下一批
+    - 异步引擎(aiosqlite)直接在事件循环中执行；同步引擎在线程中执行
+    - 队列满(DB_WRITE_QUEUE_MAX)时 save 等待，数据库跟不上时对请求施加背压，而不是无限占用内存
+    - 一批写入失败时重试 DB_WRITE_RETRIES 次，仍然失败则记录日志并丢弃这一批
+记录的 created_at 在放入队列时确定，和原来一样是对话结束的时间。关闭时（应用 shutdown）写完队列中剩余的记录。
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from coze import database
+from coze.models import Conversation
+
+logger = logging.getLogger(__name__)
+
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 200))
+DB_WRITE_FLUSH_MS = float(os.getenv("DB_WRITE_FLUSH_MS", 50))
+DB_WRITE_QUEUE_MAX = int(os.getenv("DB_WRITE_QUEUE_MAX", 10000))
+DB_WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", 2))
+
+CHINA_TZ = timezone(timedelta(hours=8))
+
+
+class ConversationWriter:
+    def __init__(self, engine=None, batch_size=DB_WRITE_BATCH_SIZE, flush_interval=DB_WRITE_FLUSH_MS / 1000,
+                 max_queue=DB_WRITE_QUEUE_MAX, retries=DB_WRITE_RETRIES):
+        self.engine = engine  # None 时在 start() 中按 DATABASE_ASYNC 选择异步或同步引擎
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retries = retries
+        self.queue = None
+        self.task = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.max_batch = 0
+
+    async def start(self):
+        if self.task is not None:
+            return
+        if self.engine is None:
+            self.engine = database.get_async_engine() if database.DATABASE_ASYNC else database.engine
+        self.queue = asyncio.Queue(self.max_queue)
+        self.task = asyncio.ensure_future(self._run())
+
+    async def save(self, user_id, message, response, emotion="", topic=""):
+        """放入写入队列后立即返回（队列满时等待）"""
+        if self.task is None:
+            await self.start()
+        await self.queue.put({
+            "user_id": user_id,
+            "message": message,
+            "response": response,
+            "emotion": emotion,
+            "topic": topic,
+            "created_at": datetime.now(CHINA_TZ),
+        })
+
+    async def flush(self):
+        """等待已放入队列的记录全部写完（或被丢弃）"""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def close(self):
+        if self.task is None:
+            return
+        await self.flush()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            rows = [await self.queue.get()]
+            if self.flush_interval and self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.flush_interval)  # 攒一批
+            while len(rows) < self.batch_size and not self.queue.empty():
+                rows.append(self.queue.get_nowait())
+            try:
+                await self._write(rows)
+            finally:
+                for _ in rows:
+                    self.queue.task_done()
+
+    async def _write(self, rows):
+        for attempt in range(self.retries + 1):
+            try:
+                if isinstance(self.engine, AsyncEngine):
+                    async with self.engine.begin() as conn:
+                        await conn.execute(insert(Conversation), rows)
+                else:
+                    await asyncio.to_thread(self._write_sync, rows)
+            except Exception as e:
+                logger.warning("写入 %d 条对话记录失败(第%d次): %s", len(rows), attempt + 1, e)
+                if attempt < self.retries:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                continue
+            self.written += len(rows)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(rows))
+            return
+        self.dropped += len(rows)
+        logger.error("对话记录写入失败，丢弃 %d 条", len(rows))
+
+    def _write_sync(self, rows):
+        with self.engine.begin() as conn:
+            conn.execute(insert(Conversation), rows)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch": self.written / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "dropped": self.dropped,
+        }
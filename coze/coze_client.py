@@ -6,8 +6,10 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 import json
 from fastapi.responses import StreamingResponse
-from cozepy import Coze, TokenAuth, Message, ChatStatus, MessageContentType, ChatEventType, COZE_CN_BASE_URL
-from typing import Generator
+from cozepy import Coze, AsyncCoze, AsyncHTTPClient, TokenAuth, Message, ChatStatus, MessageContentType, ChatEventType, COZE_CN_BASE_URL
+from typing import AsyncGenerator, Generator
+from contextvars import ContextVar
+import httpx
 import os
 from dotenv import load_dotenv
 
@@ -54,10 +56,51 @@ class ConversationListResponse(BaseModel):
 load_dotenv(override=True)
 
 token = os.getenv("COZE_API_TOKEN")
-print(token)
 # 初始化 Coze 客户端
 coze = Coze(auth=TokenAuth(token), base_url=COZE_CN_BASE_URL)
 
+# 异步客户端：同一进程内的所有网关共用一个HTTP连接池，流式响应不阻塞事件循环
+COZE_MAX_CONNECTIONS = int(os.getenv("COZE_MAX_CONNECTIONS", 100))
+COZE_MAX_KEEPALIVE = int(os.getenv("COZE_MAX_KEEPALIVE", 20))
+COZE_READ_TIMEOUT = float(os.getenv("COZE_READ_TIMEOUT", 120))
+_async_coze = None
+_async_http_client = None
+
+# ChatStream 读取下一个事件期间，底层发出的流式HTTP响应记录到这里
+_stream_responses: ContextVar[Optional[list]] = ContextVar("coze_stream_responses", default=None)
+
+class StreamTrackingHTTPClient(AsyncHTTPClient):
+    """
+    cozepy 的 AsyncStream 只保留 response.aiter_lines()，拿不到响应本身，
+    中途放弃读取时连接既不会归还连接池，服务端也会继续生成；这里记录流式响应，由 ChatStream 关闭
+    """
+    async def send(self, request, *, stream=False, **kwargs):
+        response = await super().send(request, stream=stream, **kwargs)
+        responses = _stream_responses.get()
+        if stream and responses is not None:
+            responses.append(response)
+        return response
+
+def get_async_coze() -> AsyncCoze:
+    """进程内共享的异步Coze客户端，第一次使用时创建（连接池绑定当前事件循环）"""
+    global _async_coze, _async_http_client
+    if _async_coze is None:
+        _async_http_client = StreamTrackingHTTPClient(
+            limits=httpx.Limits(max_connections=COZE_MAX_CONNECTIONS,
+                                max_keepalive_connections=COZE_MAX_KEEPALIVE,
+                                keepalive_expiry=30.0),
+            timeout=httpx.Timeout(COZE_READ_TIMEOUT, connect=5.0),
+        )
+        _async_coze = AsyncCoze(auth=TokenAuth(token), base_url=COZE_CN_BASE_URL, http_client=_async_http_client)
+    return _async_coze
+
+async def close_async_coze():
+    """关闭共享的HTTP连接池（服务退出时调用）"""
+    global _async_coze, _async_http_client
+    if _async_http_client is not None:
+        http_client, _async_coze, _async_http_client = _async_http_client, None, None
+        await http_client.aclose()
+
 # 初始化数据库
 # @app.on_event("startup")
 # async def startup_event():
@@ -94,6 +137,66 @@ def chat_stream(
             message = event.message
             yield message.content
 
+class ChatStream:
+    """
+    get_async_coze().chat.stream() 的包装，async for 逐个返回 ChatEvent
+    aclose()（或 async with 退出）时关闭底层HTTP响应：中途放弃（设备打断、HTTP客户端断开）时
+    连接马上释放，服务端也停止生成；否则每次放弃都会占住连接池中的一个连接
+    """
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._events = None
+        self._responses = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._events is None:
+            self._events = get_async_coze().chat.stream(**self._kwargs)
+        # 普通协程中设置和恢复，只影响这一次读取
+        token = _stream_responses.set(self._responses)
+        try:
+            return await self._events.__anext__()
+        finally:
+            _stream_responses.reset(token)
+
+    async def aclose(self):
+        responses, self._responses = self._responses, []
+        for response in responses:
+            await response.aclose()
+        if self._events is not None:
+            await self._events.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+async def async_create_conversation_id() -> str:
+    conversation = await get_async_coze().conversations.create()
+    return conversation.id
+
+async def async_chat_stream(
+    bot_id: str,
+    user_id: str,
+    message: str,
+    conversation_id: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """
+    处理对话流式响应（异步版本，等待LLM输出时其他设备的音频照常处理）
+    """
+    async with ChatStream(
+        bot_id=bot_id,
+        user_id=str(user_id),
+        additional_messages=[Message.build_user_question_text(message)],
+        conversation_id=conversation_id
+    ) as events:
+        async for event in events:
+            if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
+                yield event.message.content
+
 # if __name__ == "__main__":
 #     for message in chat_stream(bot_id="7435549735148273679", user_id="1", message="你好"):
 #         print(message)
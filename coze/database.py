@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from contextlib import contextmanager
@@ -9,15 +9,103 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # 数据库文件路径
 DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'chat_analysis.db')}"
 
+# SQLite存储配置，SQLITE_PROFILE 选择：
+#   wal    - WAL日志，读写互不阻塞；synchronous=NORMAL 提交时不再每次fsync（断电可能丢最后几个事务，不会损坏数据库）
+#   legacy - 原来的回滚日志模式和默认连接池
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+SQLITE_PROFILES = {
+    "legacy": {
+        "pragmas": {},
+        "pool": {},
+    },
+    "wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),  # 等锁的毫秒数，而不是马上报 database is locked
+            "mmap_size": int(float(os.getenv("SQLITE_MMAP_MB", 256)) * 1024 * 1024),
+            "cache_size": -int(float(os.getenv("SQLITE_CACHE_MB", 16)) * 1024),  # 负数表示KB
+            "temp_store": "MEMORY",
+        },
+        "pool": {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            "pool_pre_ping": False,
+        },
+    },
+}
+
+def sqlite_pragmas(profile=SQLITE_PROFILE):
+    """配置对应的 PRAGMA 语句，创建引擎时生成一次，每个新连接依次执行"""
+    return [f"PRAGMA {name}={value}" for name, value in SQLITE_PROFILES[profile]["pragmas"].items()]
+
+def _install_pragmas(sync_engine, profile):
+    statements = sqlite_pragmas(profile)
+    if not statements:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+def create_sqlite_engine(url=DATABASE_URL, profile=SQLITE_PROFILE):
+    """
+    按存储配置创建同步引擎（连接池大小 + 连接参数）
+    """
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},  # SQLite 特定设置
+        **SQLITE_PROFILES[profile]["pool"]
+    )
+    _install_pragmas(engine, profile)
+    return engine
+
+def create_async_sqlite_engine(url, profile=SQLITE_PROFILE):
+    """
+    按存储配置创建异步引擎(aiosqlite)
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    pool = SQLITE_PROFILES[profile]["pool"]
+    if pool:
+        # aiosqlite 对文件数据库默认不使用连接池，每次都要重新打开文件并执行 PRAGMA
+        pool = dict(pool, poolclass=AsyncAdaptedQueuePool)
+    engine = create_async_engine(url, **pool)
+    _install_pragmas(engine.sync_engine, profile)
+    return engine
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # SQLite 特定设置
-)
+engine = create_sqlite_engine(DATABASE_URL)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎(aiosqlite)，对话记录在后台批量写入时使用；设为0时批量写入改用同步引擎在线程中执行
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "1") == "1"
+ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+_async_engine = None
+
+def get_async_engine():
+    """
+    按需创建异步引擎，只用到同步引擎的进程不需要安装 aiosqlite
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_sqlite_engine(ASYNC_DATABASE_URL)
+    return _async_engine
+
+async def close_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
 # 创建数据库基类
 Base = declarative_base()
 
@@ -35,12 +123,17 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
+def init_db(bind=None):
     """
-    初始化数据库（创建所有表）
+    初始化数据库（创建所有表和索引）
     """
     from . import models  # 导入模型
-    Base.metadata.create_all(bind=engine)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    # create_all 不会给已经存在的表补建索引
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
 
 def get_db_session():
     """
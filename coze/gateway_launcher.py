@@ -0,0 +1,226 @@
+"""
+多进程UDP网关
+
+用法: python gateway_launcher.py [进程数]
+
+启动N个工作进程，每个进程都用 SO_REUSEPORT 绑定同一个端口(8765)运行 socket_server 的网关。
+内核按 (源地址, 源端口, 目的地址, 目的端口) 哈希分配数据包，同一设备的数据包总是交给同一个进程，
+所以会话、流式识别等状态不需要跨进程共享；工作进程数不变时这种对应关系保持稳定。
+
+主进程只负责：
+    - 监控工作进程，异常退出时重新拉起
+    - 汇总各进程定期上报的指标，通过 http://METRICS_HOST:METRICS_PORT/metrics 提供（JSON）
+
+TTS连接池、ASR预热连接等按进程创建，TTS_POOL_SIZE 等配置是每个进程的数量。
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+from log_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_WORKERS = int(os.getenv("GATEWAY_WORKERS", 0)) or os.cpu_count() or 1
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 5))  # 工作进程上报指标的间隔（秒）
+
+
+# 每个进程各自的字段（进程号、上报时间等），相加没有意义，不汇总
+NON_ADDITIVE_KEYS = {"pid", "reported_at", "uptime_s", "age_s"}
+
+
+def merge_stats(snapshots):
+    """
+    汇总多个进程的指标：数值相加，max_* 取最大值，avg_*/*_ratio 取平均；
+    列表（如每个连接的状态）、非数值字段和 NON_ADDITIVE_KEYS 不汇总
+    """
+    snapshots = [s for s in snapshots if isinstance(s, dict)]
+    merged = {}
+    keys = {key for snapshot in snapshots for key in snapshot}
+    for key in sorted(keys):
+        if key in NON_ADDITIVE_KEYS:
+            continue
+        values = [s[key] for s in snapshots if key in s]
+        if all(isinstance(v, dict) for v in values):
+            merged[key] = merge_stats(values)
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            if key.startswith("max_"):
+                merged[key] = max(values)
+            elif key.startswith("avg_") or key.endswith("_ratio"):
+                merged[key] = sum(values) / len(values)
+            else:
+                merged[key] = sum(values)
+    return merged
+
+
+# ---------------- 工作进程 ----------------
+def worker_main(index, conn, local_addr, interval):
+    setup_logging()
+    import socket_server  # 只在工作进程中导入，主进程不创建连接池等资源
+    try:
+        asyncio.run(run_worker(socket_server, conn, local_addr, interval))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_worker(socket_server, conn, local_addr, interval):
+    reporter = asyncio.ensure_future(report_stats(conn, socket_server.gateway_stats, interval))
+    try:
+        await socket_server.receive_data(local_addr, reuse_port=True)
+    finally:
+        reporter.cancel()
+
+
+async def report_stats(conn, collect, interval):
+    while True:
+        try:
+            snapshot = collect()
+            snapshot["reported_at"] = time.time()
+            conn.send_bytes(json.dumps(snapshot, default=str).encode())
+        except (BrokenPipeError, EOFError):
+            return  # 主进程已退出
+        except Exception:
+            logger.exception("上报指标出错")
+        await asyncio.sleep(interval)
+
+
+# ---------------- 主进程 ----------------
+class _Worker:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.started = time.time()
+        self.snapshot = None
+
+
+class GatewaySupervisor:
+    def __init__(self, workers=GATEWAY_WORKERS, local_addr=('0.0.0.0', 8765),
+                 metrics_addr=(METRICS_HOST, METRICS_PORT), interval=METRICS_INTERVAL):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("当前系统不支持SO_REUSEPORT，请直接运行 socket_server.py")
+        self.size = workers
+        self.local_addr = local_addr
+        self.metrics_addr = metrics_addr
+        self.interval = interval
+        # 用spawn启动，工作进程不继承主进程的事件循环和文件描述符
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = {}  # index -> _Worker
+        self.restarts = 0
+
+    def start_worker(self, index):
+        loop = asyncio.get_running_loop()
+        parent_conn, child_conn = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=worker_main, args=(index, child_conn, self.local_addr, self.interval),
+            name=f"gateway-{index}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker = self.workers[index] = _Worker(index, process, parent_conn)
+        loop.add_reader(parent_conn.fileno(), self._on_report, worker)
+        logger.info("工作进程 #%d 已启动, pid=%d", index, process.pid)
+
+    def _on_report(self, worker):
+        try:
+            worker.snapshot = json.loads(worker.conn.recv_bytes())
+        except (EOFError, OSError):
+            self._close_conn(worker)
+        except ValueError:
+            logger.warning("工作进程 #%d 上报的指标无法解析", worker.index)
+
+    def _close_conn(self, worker):
+        if worker.conn.closed:
+            return
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        worker.conn.close()
+
+    async def monitor(self):
+        """工作进程退出后重新拉起"""
+        while True:
+            await asyncio.sleep(1)
+            for index, worker in list(self.workers.items()):
+                if worker.process.is_alive():
+                    continue
+                logger.warning("工作进程 #%d (pid=%d) 退出, exitcode=%s, 重新启动",
+                               index, worker.process.pid, worker.process.exitcode)
+                self._close_conn(worker)
+                self.restarts += 1
+                self.start_worker(index)
+
+    def metrics(self):
+        now = time.time()
+        workers = {}
+        for index, worker in sorted(self.workers.items()):
+            snapshot = dict(worker.snapshot or {})
+            snapshot["alive"] = worker.process.is_alive()
+            snapshot["uptime_s"] = now - worker.started
+            if "reported_at" in snapshot:
+                snapshot["age_s"] = now - snapshot.pop("reported_at")
+            workers[index] = snapshot
+        return {
+            "workers": workers,
+            "total": merge_stats([w.snapshot for w in self.workers.values() if w.snapshot]),
+            "worker_count": len(self.workers),
+            "restarts": self.restarts,
+        }
+
+    async def handle_http(self, reader, writer):
+        """极简HTTP：GET /metrics 返回汇总指标，GET /health 返回存活的进程数"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path == '/metrics':
+                status, body = "200 OK", self.metrics()
+            elif path == '/health':
+                alive = sum(1 for w in self.workers.values() if w.process.is_alive())
+                status, body = "200 OK", {"status": "healthy" if alive else "down", "alive": alive}
+            else:
+                status, body = "404 Not Found", {"error": "not found"}
+            payload = json.dumps(body, ensure_ascii=False, default=str).encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        for index in range(self.size):
+            self.start_worker(index)
+        server = await asyncio.start_server(self.handle_http, *self.metrics_addr)
+        logger.info("网关 %s:%d 共 %d 个工作进程, 指标: http://%s:%d/metrics",
+                    self.local_addr[0], self.local_addr[1], self.size, *self.metrics_addr)
+        try:
+            await self.monitor()
+        finally:
+            server.close()
+            self.stop()
+
+    def stop(self):
+        for worker in self.workers.values():
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers.values():
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else GATEWAY_WORKERS
+    try:
+        asyncio.run(GatewaySupervisor(workers).run())
+    except KeyboardInterrupt:
+        logger.info("网关关闭")
@@ -0,0 +1,139 @@
+"""
+UDP音频接收的抖动缓冲：按2字节序列号重排，丢包时补齐
+
+    - 按序到达的包立即输出，不增加延迟
+    - 提前到达的包最多缓存 window 个，等前面的包补上
+    - 等不到的包判定为丢失，用前后两个包之间的线性插值（或静音）补齐，保证时间轴不错位
+    - 迟到（已经被判定为丢失）和重复的包直接丢弃
+序列号是16位，按模65536比较，支持回绕。
+"""
+import numpy as np
+
+SEQUENCE_MOD = 1 << 16
+HALF_SEQUENCE = SEQUENCE_MOD >> 1
+
+CONCEAL_ZERO = "zero"
+CONCEAL_INTERPOLATE = "interpolate"
+
+
+class JitterBuffer:
+    def __init__(self, window=8, conceal=CONCEAL_INTERPOLATE, max_gap=50, sample_width=2):
+        self.window = window  # 最多缓存的乱序包个数，每包20ms时最多增加 window*20ms 的延迟
+        self.conceal = conceal
+        self.max_gap = max_gap  # 跳跃超过该值视为设备重新计数，不再补齐
+        self.sample_width = sample_width
+        self.received = 0
+        self.emitted = 0
+        self.reordered = 0  # 乱序到达但在窗口内被排好的包
+        self.lost = 0  # 补齐的包
+        self.late = 0  # 判定丢失后才到达的包
+        self.duplicates = 0
+        self.resyncs = 0
+        self.reset()
+
+    def reset(self):
+        """新的一句话开始，序列号重新同步（统计数据保留）"""
+        self.expected = None
+        self.held = {}  # sequence -> payload
+        self.last_payload = None
+        self.packet_bytes = 0
+
+    def push(self, sequence, payload):
+        """收到一个包，返回可以按顺序输出的数据块列表（可能为空）"""
+        self.received += 1
+        if self.expected is None:
+            self.expected = sequence
+        out = []
+        offset = self._offset(sequence)
+        if offset >= HALF_SEQUENCE:
+            # 在期望的序列号之前：已经输出过或已经被判定为丢失；落后太多说明设备重新计数了
+            if (self.expected - sequence) % SEQUENCE_MOD <= 2 * self.window:
+                self.late += 1
+                return out
+            out = self._resync(sequence)
+        elif offset > self.max_gap + self.window:
+            out = self._resync(sequence)
+
+        if sequence == self.expected:
+            out.append(self._emit(payload))
+            self._drain(out)
+            return out
+        if sequence in self.held:
+            self.duplicates += 1
+            return out
+        self.held[sequence] = payload
+        self.reordered += 1
+        # 窗口满了或者跳得太远：前面缺的包不再等待
+        while self.held and (len(self.held) > self.window or
+                             max(map(self._offset, self.held)) >= self.window):
+            self._conceal_until_next(out)
+            self._drain(out)
+        return out
+
+    def flush(self):
+        """一句话结束：输出缓存中剩余的包，中间缺的包补齐"""
+        out = []
+        while self.held:
+            self._conceal_until_next(out)
+            self._drain(out)
+        return out
+
+    def _offset(self, sequence):
+        return (sequence - self.expected) % SEQUENCE_MOD
+
+    def _resync(self, sequence):
+        """序列号跳变（设备重启或重新计数）：先输出缓存的包，再从新的序列号开始"""
+        self.resyncs += 1
+        out = self.flush()
+        self.expected = sequence
+        self.last_payload = None
+        return out
+
+    def _emit(self, payload):
+        self.expected = (self.expected + 1) % SEQUENCE_MOD
+        self.emitted += 1
+        self.last_payload = payload
+        if len(payload) > self.packet_bytes:
+            self.packet_bytes = len(payload)
+        return payload
+
+    def _drain(self, out):
+        held = self.held
+        while self.expected in held:
+            out.append(self._emit(held.pop(self.expected)))
+
+    def _conceal_until_next(self, out):
+        """补齐从expected到下一个缓存包之间缺失的包"""
+        next_sequence = min(self.held, key=self._offset)
+        missing = self._offset(next_sequence)
+        if missing == 0:
+            return
+        packet_bytes = self.packet_bytes or len(self.held[next_sequence])
+        fill = self._concealment(self.last_payload, self.held[next_sequence], missing, packet_bytes)
+        for i in range(missing):
+            out.append(fill[i * packet_bytes:(i + 1) * packet_bytes])
+            self.expected = (self.expected + 1) % SEQUENCE_MOD
+        self.lost += missing
+
+    def _concealment(self, before, after, count, packet_bytes):
+        samples = count * packet_bytes // self.sample_width
+        if self.conceal != CONCEAL_INTERPOLATE or self.sample_width != 2 or not before or not after:
+            return bytes(samples * self.sample_width)
+        # 从前一个包的最后一个采样到后一个包的第一个采样线性过渡，避免补零造成的爆音
+        start = int.from_bytes(before[-2:], 'little', signed=True)
+        end = int.from_bytes(after[:2], 'little', signed=True)
+        ramp = np.linspace(start, end, samples + 2)[1:-1]
+        return ramp.astype(np.int16).tobytes()
+
+    def stats(self):
+        total = self.emitted + self.lost
+        return {
+            "received": self.received,
+            "emitted": self.emitted,
+            "reordered": self.reordered,
+            "lost": self.lost,
+            "late": self.late,
+            "duplicates": self.duplicates,
+            "resyncs": self.resyncs,
+            "loss_ratio": self.lost / total if total else 0.0,
+        }
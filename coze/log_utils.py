@@ -0,0 +1,50 @@
+"""
+日志工具
+
+各模块用 logging.getLogger(__name__) 获取logger，消息用 %s 占位参数，级别不够时不做任何格式化。
+入口脚本调用 setup_logging() 配置一次，级别由环境变量 LOG_LEVEL 控制（默认INFO）。
+每个数据包都会经过的热点路径用 SampledLogger，每N条只输出一条。
+"""
+import logging
+import os
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_configured = False
+
+
+def setup_logging(level=None):
+    """配置根logger，重复调用只生效一次"""
+    global _configured
+    if _configured:
+        return
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, format=LOG_FORMAT)
+    _configured = True
+
+
+class SampledLogger:
+    """
+    采样日志：每 every 次调用只输出第一次，用于每个音频包都会调用的地方。
+    级别未开启时只有一次 isEnabledFor 判断的开销。
+    """
+    def __init__(self, logger, every=50):
+        self.logger = logger
+        self.every = every
+        self.count = 0
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        self.count += 1
+        if self.count % self.every == 1 or self.every == 1:
+            self.logger.log(level, msg + " (每%d条采样1条)", *args, self.every)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
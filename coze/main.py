@@ -5,14 +5,22 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import json
+import logging
 from fastapi.responses import StreamingResponse
 from cozepy import Coze, TokenAuth, Message, ChatStatus, MessageContentType, ChatEventType, COZE_CN_BASE_URL
-from typing import Generator
+from typing import AsyncGenerator
 import os
 from dotenv import load_dotenv
 
 from coze import models
-from coze.database import get_db_session, init_db
+from coze.database import get_db_session, init_db, close_async_engine
+from coze.log_utils import setup_logging
+from coze.coze_client import get_async_coze, close_async_coze, ChatStream
+from coze.conversation_store import ConversationWriter
+from coze.conversation_query import TotalCache, count_conversations, fetch_conversations
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="儿童对话分析系统",
     root_path="/aimage-chat-i"
@@ -63,12 +71,31 @@ class ConversationResponse(BaseModel):
 class ConversationListResponse(BaseModel):
     total: int
     items: List[ConversationResponse]
+    next_cursor: Optional[str] = None  # 下一页的游标，没有下一页时为空
 
 # 加载环境变量
 load_dotenv()
 
-# 初始化 Coze 客户端
-coze = Coze(auth=TokenAuth(os.getenv("COZE_API_TOKEN")), base_url=COZE_CN_BASE_URL)
+# Coze 客户端使用 coze_client 中按进程共享的异步客户端，流式响应不占用线程池
+@app.on_event("shutdown")
+async def close_coze():
+    await close_async_coze()
+
+# 对话记录放入队列后由后台任务批量写入，不在响应流中等待数据库提交
+conversation_writer = ConversationWriter()
+
+@app.on_event("startup")
+async def start_conversation_writer():
+    await conversation_writer.start()
+
+@app.on_event("shutdown")
+async def close_conversation_writer():
+    # 写完队列中剩余的记录
+    await conversation_writer.close()
+    await close_async_engine()
+
+# /conversations 的总数缓存，翻页时不重复统计
+conversation_totals = TotalCache()
 
 # 初始化数据库
 # @app.on_event("startup")
@@ -83,7 +110,7 @@ async def get_conversation_id():
     获取新的会话ID
     """
     try:
-        conversation_id = coze.conversations.create().id
+        conversation_id = (await get_async_coze().conversations.create()).id
         return {
             "code": 200,
             "data": {"conversation_id": conversation_id}
@@ -118,7 +145,6 @@ async def customer(
 async def chat(
     user_id: int,
     chat_message: ChatMessage,
-    db: Session = Depends(get_db_session)
 ):
     """
     处理用户对话请求并保存对话记录
@@ -130,7 +156,7 @@ async def chat(
                 chat_message.bot_id,
                 user_id,
                 chat_message.message,
-                db  # 传入数据库会话
+                conversation_writer  # 对话结束后保存记录
             ),
             media_type="text/event-stream"
         )
@@ -183,32 +209,28 @@ async def get_conversations(
     end_date: Optional[datetime] = None,
     page: int = 1,
     page_size: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db_session)
 ):
     """
     获取指定用户的对话记录，支持时间范围筛选和分页
+    传入上一页返回的 next_cursor 时按游标翻页（深页也很快），否则按 page 偏移分页；total 缓存一段时间，是近似值
     """
     try:
-        query = db.query(models.Conversation).filter(
-            models.Conversation.user_id == user_id
-        )
-        
-        # 添加时间范围过滤
-        if start_date:
-            query = query.filter(models.Conversation.created_at >= start_date)
         if end_date:
             # 将结束日期加一天，以包含整个结束日期
             end_date = end_date + timedelta(days=1)
-            query = query.filter(models.Conversation.created_at < end_date)
-            
+
         # 计算总记录数
-        total = query.count()
-        
+        total = count_conversations(db, user_id, start_date, end_date, cache=conversation_totals)
+
         # 添加分页
-        conversations = query.order_by(models.Conversation.created_at.desc())\
-            .offset((page - 1) * page_size)\
-            .limit(page_size)\
-            .all()
+        try:
+            conversations, next_cursor = fetch_conversations(
+                db, user_id, start_date, end_date, page=page, page_size=page_size, cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
             
         # 将 SQLAlchemy 模型转换为 Pydantic 模型
         conversation_responses = [
@@ -225,8 +247,11 @@ async def get_conversations(
             
         return ConversationListResponse(
             total=total,
-            items=conversation_responses
+            items=conversation_responses,
+            next_cursor=next_cursor
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -271,32 +296,33 @@ def analyze_mental_health(conversations: List[models.Conversation]) -> dict:
     # TODO: 实现心理健康分析逻辑
     return {"status": "healthy", "stress_level": "low", "recommendations": []}
 
-def report_stream(messages: List[str]) -> Generator[str, None, None]:
+async def report_stream(messages: List[str]) -> AsyncGenerator[str, None]:
     """
     处理报告流式响应
     """
     # 将消息列表拼接为编号文本
     formatted_text = "\n".join([f"{i+1}. {message}" for i, message in enumerate(messages)])
     
-    for event in coze.chat.stream(
+    async with ChatStream(
         bot_id='7433987342346190900',
         user_id='123',  # 转换为字符串
         additional_messages=[Message.build_user_question_text(formatted_text)]
-    ):
-        print(event)
-        if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
-            message = event.message
-            # 对 content 进行 JSON 转义处理
-            escaped_content = json.dumps(message.content)[1:-1]  # 去掉首尾的引号
-            yield f"data: {{\"role\": \"{message.role}\", \"content\": \"{escaped_content}\"}}\n\n"
-
-def chat_stream(
+    ) as events:
+        async for event in events:
+            logger.debug("coze event: %s", event)
+            if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
+                message = event.message
+                # 对 content 进行 JSON 转义处理
+                escaped_content = json.dumps(message.content)[1:-1]  # 去掉首尾的引号
+                yield f"data: {{\"role\": \"{message.role}\", \"content\": \"{escaped_content}\"}}\n\n"
+
+async def chat_stream(
     bot_id: str, 
     user_id: str, 
     message: str,
-    db: Optional[Session] = None,
+    writer: Optional[ConversationWriter] = None,
     conversation_id: Optional[str] = None,
-) -> Generator[str, None, None]:
+) -> AsyncGenerator[str, None]:
     """
     处理对话流式响应
     """
@@ -305,47 +331,48 @@ def chat_stream(
     response_messages = ''
     # 是否已回答
     answered = False
+    emotion = ""
+    topic = ""
     
-    for event in coze.chat.stream(
+    async with ChatStream(
         bot_id=bot_id,
         user_id=str(user_id),  # 转换为字符串
         additional_messages=[Message.build_user_question_text(message)],
         conversation_id=conversation_id
-    ):
-        print(event)
-        if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
-            message = event.message
-            # 对 content 进行 JSON 转义处理
-            escaped_content = json.dumps(message.content)[1:-1]  # 去掉首尾的引号
-            yield f"data: {{\"role\": \"{message.role}\", \"content\": \"{escaped_content}\"}}\n\n"
-
-        if event.event == ChatEventType.CONVERSATION_MESSAGE_COMPLETED:
-            message = event.message
-            if not answered:
-                response_messages = message.content
-                answered = True
-            else:
-                # 解析JSON响应获取情绪和主题
-                try:
-                    response_data = json.loads(message.content)
-                    if isinstance(response_data, dict) and "output" in response_data:
-                        analysis_data = json.loads(response_data["output"])
-                        emotion = analysis_data.get("emotion", "")
-                        topic = analysis_data.get("topic", "")
-                except (json.JSONDecodeError, KeyError):
-                    emotion = ""
-                    topic = ""
-
-        if event.event == ChatEventType.CONVERSATION_CHAT_COMPLETED:
-            if db:
-                # 如果是最终响应，保存到数据库
-                conversation = models.Conversation(
+    ) as events:
+        async for event in events:
+            logger.debug("coze event: %s", event)
+            if event.event == ChatEventType.CONVERSATION_MESSAGE_DELTA:
+                message = event.message
+                # 对 content 进行 JSON 转义处理
+                escaped_content = json.dumps(message.content)[1:-1]  # 去掉首尾的引号
+                yield f"data: {{\"role\": \"{message.role}\", \"content\": \"{escaped_content}\"}}\n\n"
+
+            if event.event == ChatEventType.CONVERSATION_MESSAGE_COMPLETED:
+                message = event.message
+                if not answered:
+                    response_messages = message.content
+                    answered = True
+                else:
+                    # 解析JSON响应获取情绪和主题
+                    try:
+                        response_data = json.loads(message.content)
+                        if isinstance(response_data, dict) and "output" in response_data:
+                            analysis_data = json.loads(response_data["output"])
+                            emotion = analysis_data.get("emotion", "")
+                            topic = analysis_data.get("topic", "")
+                    except (json.JSONDecodeError, KeyError):
+                        emotion = ""
+                        topic = ""
+
+            if event.event == ChatEventType.CONVERSATION_CHAT_COMPLETED:
+                if writer:
+                    # 如果是最终响应，放入写入队列，由后台批量保存到数据库
+                    await writer.save(
                         user_id=user_id,
                         message=user_message,  # 使用原始用户消息
                         response=response_messages,
                         emotion=emotion,
                         topic=topic
                     )
-                db.add(conversation)
-                db.commit()
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone, timedelta
@@ -33,6 +33,11 @@ class Conversation(Base):
     # 关系
     user = relationship("User", back_populates="conversations")
 
+    # 按用户 + 时间范围查询、按时间倒序分页都走这个索引
+    __table_args__ = (
+        Index("ix_conversations_user_created", "user_id", "created_at"),
+    )
+
 class AnalysisReport(Base):
     __tablename__ = "analysis_reports"
     id = Column(Integer, primary_key=True)
@@ -0,0 +1,139 @@
+"""
+预置提示音（等待提示、问候、出错提示等）
+
+启动时加载一次，之后所有会话共用同一份只读数据，发送时不复制：
+    - assets 目录下的 wav 用 mmap 只读映射，只保留 data 块的视图；
+      多个工作进程映射同一个文件时共用系统的页缓存
+    - CANNED_PROMPTS 中没有对应 wav 文件的提示音，启动后用TTS合成一次保存在内存中
+    - PROMPT_PHRASES 中的常用句子预先合成，经过 CachedTTS 时写入TTS缓存，之后对话中直接命中
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = os.getenv("PROMPT_ASSETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+PROMPT_PREFETCH = os.getenv("PROMPT_PREFETCH", "1") == "1"
+# 额外预先合成的句子，用 | 分隔
+PROMPT_PHRASES = [p for p in os.getenv("PROMPT_PHRASES", "").split("|") if p.strip()]
+
+# 提示音名称 -> 没有 assets/<名称>.wav 时用TTS合成的文本
+CANNED_PROMPTS = {
+    "wait": "好的，请稍等。",
+    "greeting": "你好呀，我在呢。",
+    "not_heard": "我没有听清楚，可以再说一遍吗？",
+    "error": "网络好像有点问题，请稍后再试。",
+}
+
+_CHUNK = struct.Struct('<4sI')
+_FMT = struct.Struct('<HHIIHH')
+
+
+def wav_pcm_view(buffer):
+    """
+    返回wav文件中PCM数据的只读视图和格式 (view, (channels, sample_rate, sample_width))；
+    不是RIFF/WAVE格式时把整个文件当作原始PCM
+    """
+    view = memoryview(buffer).toreadonly()
+    if len(view) < 12 or view[:4] != b'RIFF' or view[8:12] != b'WAVE':
+        return view, None
+    offset = 12
+    fmt = None
+    while offset + _CHUNK.size <= len(view):
+        chunk_id, size = _CHUNK.unpack_from(view, offset)
+        offset += _CHUNK.size
+        if chunk_id == b'fmt ' and size >= _FMT.size:
+            _, channels, sample_rate, _, _, bits = _FMT.unpack_from(view, offset)
+            fmt = (channels, sample_rate, bits // 8)
+        elif chunk_id == b'data':
+            return view[offset:offset + size], fmt
+        offset += size + (size & 1)  # 块按2字节对齐
+    raise ValueError("wav文件中没有data块")
+
+
+class PromptLibrary:
+    def __init__(self, assets_dir=ASSETS_DIR, prompts=CANNED_PROMPTS, phrases=PROMPT_PHRASES,
+                 expected_format=(1, 16000, 2)):
+        self.assets_dir = assets_dir
+        self.prompts = dict(prompts)
+        self.phrases = list(phrases)
+        self.expected_format = expected_format
+        self.audio = {}  # 名称 -> 只读memoryview
+        self.sources = {}  # 名称 -> "file" / "tts"
+        self._maps = []
+        self.prefetched = 0
+        self.prefetch_failed = 0
+
+    def load(self):
+        """映射 assets 目录下的所有wav，返回加载的个数"""
+        if not os.path.isdir(self.assets_dir):
+            logger.warning("提示音目录不存在: %s", self.assets_dir)
+            return 0
+        loaded = 0
+        for filename in sorted(os.listdir(self.assets_dir)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() != ".wav":
+                continue
+            path = os.path.join(self.assets_dir, filename)
+            try:
+                with open(path, "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view, fmt = wav_pcm_view(mapped)
+            except (OSError, ValueError) as e:
+                logger.warning("加载提示音 %s 失败: %s", path, e)
+                continue
+            if fmt is not None and fmt != self.expected_format:
+                logger.warning("提示音 %s 的格式 %s 与设备播放格式 %s 不一致", filename, fmt, self.expected_format)
+            self._maps.append(mapped)
+            self.audio[name] = view
+            self.sources[name] = "file"
+            loaded += 1
+        logger.info("加载提示音 %d 个: %s", loaded, ", ".join(sorted(self.audio)))
+        return loaded
+
+    async def prefetch(self, tts):
+        """合成缺少wav文件的提示音和常用句子；单句失败只记录日志"""
+        missing = [(name, text) for name, text in self.prompts.items() if name not in self.audio]
+        jobs = [self._synthesize(tts, name, text) for name, text in missing]
+        jobs += [self._synthesize(tts, None, text) for text in self.phrases]
+        if jobs:
+            await asyncio.gather(*jobs)
+            logger.info("预先合成提示音 %d 句, 失败 %d 句", self.prefetched, self.prefetch_failed)
+        return self.prefetched
+
+    async def _synthesize(self, tts, name, text):
+        chunks = []
+        try:
+            await tts.query_tts(text, chunks.append)
+        except Exception as e:
+            self.prefetch_failed += 1
+            logger.warning("预先合成 %r 失败: %s", text, e)
+            return
+        self.prefetched += 1
+        if name is not None and chunks:
+            self.audio[name] = memoryview(b"".join(chunks)).toreadonly()
+            self.sources[name] = "tts"
+
+    def get(self, name):
+        """提示音PCM的只读视图，没有时返回None"""
+        return self.audio.get(name)
+
+    def close(self):
+        self.audio.clear()
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 还有发送队列在引用，由垃圾回收释放
+        self._maps.clear()
+
+    def stats(self):
+        return {
+            "prompts": {name: {"source": self.sources[name], "bytes": len(view)}
+                        for name, view in self.audio.items()},
+            "prefetched": self.prefetched,
+            "prefetch_failed": self.prefetch_failed,
+        }
@@ -0,0 +1,214 @@
+"""
+火山引擎语音二进制协议编解码（ASR 和 TTS 共用）
+
+帧格式:
+    protocol_version(4 bits), header_size(4 bits),
+    message_type(4 bits), message_type_specific_flags(4 bits)
+    serialization_method(4 bits) message_compression(4 bits)
+    reserved （8bits) 保留字段
+    header_extensions 扩展头(大小等于 8 * 4 * (header_size - 1) )
+    [sequence(4 bytes)] [error code(4 bytes)] payload_size(4 bytes) payload
+
+编码时头部按参数组合缓存，用struct一次打包；解码时payload是原始数据的memoryview切片，不复制。
+"""
+import json
+import struct
+import zlib
+
+PROTOCOL_VERSION = 0b0001
+DEFAULT_HEADER_SIZE = 0b0001
+
+# Message Type:
+FULL_CLIENT_REQUEST = 0b0001
+AUDIO_ONLY_REQUEST = 0b0010
+FULL_SERVER_RESPONSE = 0b1001
+SERVER_ACK = 0b1011
+AUDIO_ONLY_RESPONSE = 0b1011  # TTS的音频数据和ASR的ACK是同一个类型
+FRONTEND_RESPONSE = 0b1100
+SERVER_ERROR_RESPONSE = 0b1111
+
+# Message Type Specific Flags
+NO_SEQUENCE = 0b0000  # no check sequence
+POS_SEQUENCE = 0b0001
+NEG_SEQUENCE = 0b0010
+NEG_WITH_SEQUENCE = 0b0011
+NEG_SEQUENCE_1 = 0b0011
+
+# Message Serialization
+NO_SERIALIZATION = 0b0000
+JSON = 0b0001
+
+# Message Compression
+NO_COMPRESSION = 0b0000
+GZIP = 0b0001
+
+COMPRESSION_METHODS = {"none": NO_COMPRESSION, "gzip": GZIP}
+
+_HEADER = struct.Struct('>4B')
+_UINT32 = struct.Struct('>I')
+_INT32 = struct.Struct('>i')
+_INT32_UINT32 = struct.Struct('>iI')
+_WITH_SEQUENCE = struct.Struct('>4siI')  # header + sequence + payload size
+_WITHOUT_SEQUENCE = struct.Struct('>4sI')  # header + payload size
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS  # 用zlib直接处理gzip格式，比gzip模块少一层Python解析
+
+_header_cache = {}
+
+
+def pack_header(message_type=FULL_CLIENT_REQUEST, flags=NO_SEQUENCE,
+                serialization=JSON, compression=GZIP, reserved=0x00) -> bytes:
+    """4字节协议头，相同参数只计算一次"""
+    key = (message_type, flags, serialization, compression, reserved)
+    header = _header_cache.get(key)
+    if header is None:
+        header = _header_cache[key] = _HEADER.pack(
+            (PROTOCOL_VERSION << 4) | DEFAULT_HEADER_SIZE,
+            (message_type << 4) | flags,
+            (serialization << 4) | compression,
+            reserved,
+        )
+    return header
+
+
+def compress(payload, compression=GZIP, level=9):
+    if compression == GZIP:
+        # zlib.compress 从3.11起才支持 wbits 参数，用 compressobj 兼容3.10
+        compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+        return compressor.compress(payload) + compressor.flush()
+    return payload
+
+
+def decompress(payload, compression=GZIP):
+    if compression == GZIP:
+        return zlib.decompress(payload, _GZIP_WBITS)
+    return payload
+
+
+def encode_frame(message_type, payload, flags=NO_SEQUENCE, sequence=None,
+                 serialization=JSON, compression=GZIP) -> bytes:
+    """payload需要已经按compression压缩好；flags带序列号位时必须传sequence"""
+    header = pack_header(message_type, flags, serialization, compression)
+    if flags & POS_SEQUENCE:
+        prefix = _WITH_SEQUENCE.pack(header, sequence, len(payload))
+    else:
+        prefix = _WITHOUT_SEQUENCE.pack(header, len(payload))
+    return prefix + payload
+
+
+def encode_full_client_request(request, sequence=None, compression=GZIP, level=9) -> bytes:
+    """JSON请求帧，request可以是dict或已经序列化好的bytes"""
+    if not isinstance(request, (bytes, bytearray, memoryview)):
+        request = json.dumps(request).encode()
+    flags = NO_SEQUENCE if sequence is None else POS_SEQUENCE
+    return encode_frame(FULL_CLIENT_REQUEST, compress(request, compression, level), flags, sequence,
+                        JSON, compression)
+
+
+def encode_audio_only_request(chunk, sequence, last=False, compression=GZIP, level=9) -> bytes:
+    """音频帧，最后一包的sequence为负数"""
+    flags = NEG_WITH_SEQUENCE if last else POS_SEQUENCE
+    return encode_frame(AUDIO_ONLY_REQUEST, compress(chunk, compression, level), flags, sequence,
+                        NO_SERIALIZATION, compression)
+
+
+class CompressionPolicy:
+    """
+    按消息类型配置压缩方式和zlib级别
+
+    JSON请求很小、压缩率高，默认gzip最高级别；PCM音频熵很高，gzip省不了多少流量，
+    默认用最低级别，也可以配置为不压缩（协议头里会标明，服务端按头部处理）。
+    """
+    def __init__(self, request=GZIP, request_level=9, audio=GZIP, audio_level=1):
+        self.request = request
+        self.request_level = request_level
+        self.audio = audio
+        self.audio_level = audio_level
+
+    @classmethod
+    def from_names(cls, request="gzip", audio="gzip", request_level=9, audio_level=1):
+        """从配置字符串创建，例如 CompressionPolicy.from_names(audio="none")"""
+        return cls(COMPRESSION_METHODS[request], int(request_level),
+                   COMPRESSION_METHODS[audio], int(audio_level))
+
+    def encode_full_client_request(self, request, sequence=None) -> bytes:
+        return encode_full_client_request(request, sequence, self.request, self.request_level)
+
+    def encode_audio_only_request(self, chunk, sequence, last=False) -> bytes:
+        return encode_audio_only_request(chunk, sequence, last, self.audio, self.audio_level)
+
+
+DEFAULT_COMPRESSION = CompressionPolicy()
+
+
+class Frame:
+    """解码后的一帧，payload是原始消息的memoryview切片"""
+    __slots__ = ('protocol_version', 'header_size', 'message_type', 'flags', 'serialization',
+                 'compression', 'reserved', 'header_extensions', 'sequence', 'code',
+                 'payload_size', 'payload')
+
+    def __init__(self, view, b0, b1, b2, b3, sequence=None, code=None, payload_size=0, payload=None):
+        self.protocol_version = b0 >> 4
+        self.header_size = b0 & 0x0f
+        self.message_type = b1 >> 4
+        self.flags = b1 & 0x0f
+        self.serialization = b2 >> 4
+        self.compression = b2 & 0x0f
+        self.reserved = b3
+        self.header_extensions = view[4:self.header_size * 4]
+        self.sequence = sequence
+        self.code = code
+        self.payload_size = payload_size
+        self.payload = payload
+
+    @property
+    def is_last(self):
+        return bool(self.flags & NEG_SEQUENCE)
+
+    @property
+    def is_error(self):
+        return self.message_type == SERVER_ERROR_RESPONSE
+
+    def decompressed(self):
+        if self.payload is None:
+            return None
+        return decompress(self.payload, self.compression)
+
+    def decode_payload(self):
+        """解压并反序列化payload：JSON返回对象，其他序列化方式返回字符串，无序列化返回bytes"""
+        payload = self.decompressed()
+        if payload is None:
+            return None
+        if self.serialization == JSON:
+            return json.loads(bytes(payload))
+        if self.serialization != NO_SERIALIZATION:
+            return str(payload, "utf-8")
+        return bytes(payload)
+
+
+def decode_frame(data) -> Frame:
+    view = memoryview(data)
+    b0, b1, b2, b3 = _HEADER.unpack_from(view)
+    offset = (b0 & 0x0f) * 4
+    message_type = b1 >> 4
+    flags = b1 & 0x0f
+    sequence = None
+    code = None
+
+    if message_type == AUDIO_ONLY_RESPONSE:
+        # 不带标志位时是不含数据的ACK；否则是 sequence + payload_size + payload
+        if flags == NO_SEQUENCE or len(view) < offset + 8:
+            return Frame(view, b0, b1, b2, b3)
+        sequence, payload_size = _INT32_UINT32.unpack_from(view, offset)
+        offset += 8
+    else:
+        if flags & POS_SEQUENCE:
+            sequence = _INT32.unpack_from(view, offset)[0]
+            offset += 4
+        if message_type == SERVER_ERROR_RESPONSE:
+            code = _UINT32.unpack_from(view, offset)[0]
+            offset += 4
+        payload_size = _UINT32.unpack_from(view, offset)[0]
+        offset += 4
+
+    return Frame(view, b0, b1, b2, b3, sequence, code, payload_size, view[offset:offset + payload_size])
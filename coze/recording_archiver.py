@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_handler import write_wav
+
+logger = logging.getLogger(__name__)
+
+
+class RecordingArchiver:
+    """
+    录音后台归档
+
+    语音识别直接使用内存中的PCM数据，录音文件只用于留档，
+    写WAV文件放到单独的线程中执行，不占用事件循环。
+    """
+    def __init__(self, directory="audio_files", max_pending=32,
+                 sample_rate=16000, channels=1, sample_width=2):
+        self.directory = directory
+        self.max_pending = max_pending  # 磁盘太慢时最多积压的录音数，超过则丢弃
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recording-archiver")
+        self.pending = 0
+        self.archived = 0
+        self.dropped = 0
+
+    def archive(self, filename, audio_data):
+        """
+        提交一段录音归档，立即返回。
+        audio_data在写完之前不能再被修改，返回的future完成后才能把录音缓冲区归还给缓冲池；
+        丢弃时返回None
+        """
+        if self.pending >= self.max_pending:
+            self.dropped += 1
+            logger.warning("录音归档积压过多，丢弃: %s", filename)
+            return None
+        self.pending += 1
+        filepath = os.path.join(self.directory, filename)
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._write, filepath, audio_data)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _write(self, filepath, audio_data):
+        os.makedirs(self.directory, exist_ok=True)
+        write_wav(filepath, audio_data, self.sample_rate, self.channels, self.sample_width)
+        return filepath
+
+    def _on_done(self, future):
+        self.pending -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error("录音归档失败: %s", future.exception())
+        else:
+            self.archived += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
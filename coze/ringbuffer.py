@@ -1,53 +1,219 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 缓冲区满时的处理方式
+REJECT = "reject"  # 整块拒绝写入，write返回0
+OVERWRITE = "overwrite"  # 丢弃最旧的数据腾出空间，实时音频宁可丢旧数据也不要延迟
+BLOCK = "block"  # 仅AsyncRingBuffer：await write_all() 等待消费者腾出空间（背压）
+
+POLICIES = (REJECT, OVERWRITE, BLOCK)
+
+
+def _as_bytes_view(data) -> memoryview:
+    """任意支持buffer协议的对象（bytes/bytearray/memoryview/numpy数组）转成按字节的视图"""
+    view = memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
 class RingBuffer:
-    """环形缓冲区实现"""
-    def __init__(self, size):
+    """
+    环形缓冲区实现
+
+    读写都在预先分配好的bytearray上按切片复制，不产生中间对象；
+    views()/consume() 可以直接拿到可读数据的两段连续内存，完全不复制。
+    """
+    def __init__(self, size, policy=REJECT):
+        if policy not in (REJECT, OVERWRITE):
+            raise ValueError(f"RingBuffer不支持的策略: {policy}")
         self.size = size
+        self.policy = policy
         self.buffer = bytearray(size)
+        self._view = memoryview(self.buffer)
         self.write_pos = 0
         self.read_pos = 0
         self.available = 0
-        
+        self.overwritten = 0  # OVERWRITE策略下丢弃的旧数据字节数
+        self.rejected = 0  # REJECT策略下拒绝写入的字节数
+
+    @property
+    def free(self):
+        return self.size - self.available
+
     def write(self, data):
-        """写入数据到缓冲区"""
-        print(f"写入数据到缓冲区: {data}")
-        data_len = len(data)   
+        """写入数据到缓冲区，返回写入的字节数"""
+        if type(data) is not bytes and type(data) is not bytearray:
+            data = _as_bytes_view(data)
+        data_len = len(data)
         if data_len > self.size - self.available:
-            print("缓冲区满了")
-            return 0  # 缓冲区已满
-            
-        # 写入数据
-        first_part = min(data_len, self.size - self.write_pos)
-        self.buffer[self.write_pos:self.write_pos + first_part] = data[:first_part]
-        
-        if first_part < data_len:
-            # 需要环绕写入
-            second_part = data_len - first_part
-            self.buffer[0:second_part] = data[first_part:]
-            self.write_pos = second_part
+            if self.policy == REJECT:
+                self.rejected += data_len
+                logger.debug("缓冲区满了，丢弃 %d bytes", data_len)
+                return 0  # 缓冲区已满
+            # 覆盖最旧的数据；比整个缓冲区还大时只保留最后size字节
+            if data_len > self.size:
+                self.overwritten += data_len - self.size
+                data = memoryview(data)[data_len - self.size:]
+                data_len = self.size
+            self._drop(data_len - (self.size - self.available))
+        self._copy_in(data, data_len)
+        return data_len
+
+    def _copy_in(self, data, data_len):
+        write_pos = self.write_pos
+        end = write_pos + data_len
+        if end <= self.size:
+            self.buffer[write_pos:end] = data
+            self.write_pos = end if end < self.size else 0
         else:
-            self.write_pos = (self.write_pos + first_part) % self.size
-            
+            # 需要环绕写入
+            first_part = self.size - write_pos
+            data = memoryview(data)
+            self.buffer[write_pos:] = data[:first_part]
+            self.buffer[:data_len - first_part] = data[first_part:]
+            self.write_pos = data_len - first_part
         self.available += data_len
-        return data_len
-        
+
+    def _drop(self, count):
+        self.overwritten += count
+        self.consume(count)
+
+    def views(self, size=None):
+        """
+        返回可读数据的两段连续内存 (first, second)，不复制，也不移动读指针。
+        second在数据没有环绕时为空；用完后调用consume()。
+        视图在下一次写入前有效。
+        """
+        read_size = self.available if size is None or size > self.available else size
+        read_pos = self.read_pos
+        end = read_pos + read_size
+        if end <= self.size:
+            return self._view[read_pos:end], self._view[0:0]
+        return self._view[read_pos:], self._view[0:end - self.size]
+
+    def consume(self, size):
+        """丢弃最多size字节的可读数据，返回实际丢弃的字节数"""
+        if size >= self.available:
+            # 读空时回到起点，下一次写入更可能是一整段连续内存
+            size = self.available
+            self.read_pos = self.write_pos = 0
+            self.available = 0
+            return size
+        self.read_pos = (self.read_pos + size) % self.size
+        self.available -= size
+        return size
+
+    def readinto(self, out):
+        """读取数据到调用方提供的缓冲区，返回读取的字节数"""
+        if type(out) is not bytearray:
+            out = _as_bytes_view(out)
+        read_size = min(len(out), self.available)
+        read_pos = self.read_pos
+        end = read_pos + read_size
+        if end <= self.size:
+            out[:read_size] = self._view[read_pos:end]
+        else:
+            first_part = self.size - read_pos
+            out[:first_part] = self._view[read_pos:]
+            out[first_part:read_size] = self._view[:end - self.size]
+        return self.consume(read_size)
+
     def read(self, size):
         """从缓冲区读取数据"""
         if self.available == 0:
             return bytearray(0)
-            
         read_size = min(size, self.available)
-        first_part = min(read_size, self.size - self.read_pos)
-        result = bytearray(read_size)
-        
-        result[:first_part] = self.buffer[self.read_pos:self.read_pos + first_part]
-        
-        if first_part < read_size:
-            # 需要环绕读取
-            second_part = read_size - first_part
-            result[first_part:] = self.buffer[0:second_part]
-            self.read_pos = second_part
+        read_pos = self.read_pos
+        end = read_pos + read_size
+        if end <= self.size:
+            result = self.buffer[read_pos:end]  # bytearray切片直接得到新的bytearray
         else:
-            self.read_pos = (self.read_pos + first_part) % self.size
-            
-        self.available -= read_size
-        return result
\ No newline at end of file
+            result = self.buffer[read_pos:]
+            result += self._view[:end - self.size]
+        self.consume(read_size)
+        return result
+
+    def clear(self):
+        self.read_pos = self.write_pos = 0
+        self.available = 0
+
+
+class AsyncRingBuffer(RingBuffer):
+    """
+    事件循环中使用的环形缓冲区：消费者可以 await 凑够N字节，
+    BLOCK策略下生产者 await write_all() 等待空间。只能在同一个事件循环中使用。
+    """
+    def __init__(self, size, policy=BLOCK):
+        if policy not in POLICIES:
+            raise ValueError(f"AsyncRingBuffer不支持的策略: {policy}")
+        super().__init__(size, OVERWRITE if policy == OVERWRITE else REJECT)
+        self.policy = policy
+        self.closed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+
+    def write(self, data):
+        """同步写入，BLOCK策略下空间不够时和REJECT一样返回0"""
+        if self.closed:
+            raise ValueError("缓冲区已关闭")
+        written = super().write(data)
+        if written:
+            self._readable.set()
+        return written
+
+    async def write_all(self, data):
+        """写入全部数据，空间不够时分段写并等待消费者读取"""
+        data = _as_bytes_view(data)
+        if self.policy != BLOCK:
+            return self.write(data)
+        offset = 0
+        while offset < len(data):
+            if self.closed:
+                raise ValueError("缓冲区已关闭")
+            if self.free == 0:
+                self._writable.clear()
+                await self._writable.wait()
+                continue
+            chunk = data[offset:offset + self.free]
+            self._copy_in(chunk, len(chunk))
+            offset += len(chunk)
+            self._readable.set()
+        return offset
+
+    def consume(self, size):
+        size = super().consume(size)
+        if size:
+            self._writable.set()
+        return size
+
+    async def wait_readable(self, size):
+        """等待至少size字节可读（size不能超过容量），关闭后立即返回，返回可读字节数"""
+        size = min(size, self.size)
+        while self.available < size and not self.closed:
+            self._readable.clear()
+            await self._readable.wait()
+        return self.available
+
+    async def read_exactly(self, size):
+        """读取正好size字节，缓冲区关闭时返回剩余的数据（可能不足size）"""
+        result = bytearray(size)
+        view = memoryview(result)
+        offset = 0
+        while offset < size:
+            await self.wait_readable(min(size - offset, self.size))
+            if self.available == 0:
+                break  # 已关闭且读空
+            offset += self.readinto(view[offset:])
+        del view
+        if offset < size:
+            del result[offset:]
+        return result
+
+    def close(self):
+        """关闭缓冲区，唤醒所有等待者"""
+        self.closed = True
+        self._readable.set()
+        self._writable.set()
@@ -0,0 +1,111 @@
+"""
+LLM流式输出的增量分句，决定每次送去TTS合成的文本
+
+    强断句：。！？；…!?; 和换行，达到 first_min_length 就断开
+    弱断句：，、：,: 第一段达到 first_min_length 就断开（尽快出第一段音频），
+            之后要达到 min_length 才断开（句子长一些，TTS调用次数少）
+    超过 max_length 还没有断句时强制断开，优先断在最后一个弱断句或空格处
+    ASCII的 . , : 后面紧跟字母或数字时不断句（3.14、1,000、12:30、e.g.），
+    所以出现在缓冲区末尾时先等下一个token再判断
+    连续的标点（……、?!）和后面的右引号、右括号归入前一句；句子里有没闭合的左引号、左括号时，
+    断句标点出现在缓冲区末尾也先等下一个token，免得右引号被分到下一句开头
+每个token只扫描新增的字符，feed/flush 返回可以合成的文本列表。
+"""
+
+STRONG_BREAKS = frozenset("。！？；…!?;\n")
+WEAK_BREAKS = frozenset("，、：,:")
+ASCII_AMBIGUOUS = frozenset(".,:")  # 后面的字符决定是不是断句
+CLOSING = frozenset("”’」』）》】)]\"'")
+PAIRS = (("“", "”"), ("「", "」"), ("『", "』"), ("（", "）"), ("《", "》"), ("【", "】"), ("(", ")"))
+BREAKS = STRONG_BREAKS | WEAK_BREAKS | ASCII_AMBIGUOUS
+
+
+class SentenceSegmenter:
+    def __init__(self, first_min_length=3, min_length=12, max_length=80):
+        self.first_min_length = first_min_length
+        self.min_length = max(min_length, first_min_length)
+        self.max_length = max(max_length, self.min_length)
+        self.reset()
+
+    def reset(self):
+        self.buffer = ""
+        self._scan = 0  # buffer中已经扫描过、确定不用断开的位置
+        self.segments = 0
+
+    def feed(self, text):
+        """送入一段LLM输出，返回已经可以合成的文本（可能为空列表）"""
+        if not text:
+            return []
+        self.buffer += text
+        out = []
+        self._split(out, final=False)
+        return out
+
+    def flush(self):
+        """LLM输出结束：剩余的文本全部输出"""
+        out = []
+        self._split(out, final=True)
+        rest = self.buffer.strip()
+        if rest:
+            out.append(self.buffer)
+            self.segments += 1
+        self.buffer = ""
+        self._scan = 0
+        return out
+
+    def _threshold(self, strong):
+        return self.first_min_length if strong or self.segments == 0 else self.min_length
+
+    def _split(self, out, final):
+        buf = self.buffer
+        n = len(buf)
+        i = self._scan
+        while i < n:
+            ch = buf[i]
+            if ch not in BREAKS:
+                i += 1
+                if i >= self.max_length:
+                    buf, n, i = self._force(out, buf)
+                continue
+            if ch in ASCII_AMBIGUOUS:
+                if i + 1 >= n:
+                    if not final:
+                        break  # 等下一个token
+                elif buf[i + 1].isalnum() and buf[i + 1].isascii():
+                    i += 1
+                    continue
+                strong = ch == "."
+            else:
+                strong = ch in STRONG_BREAKS
+            end = i + 1
+            while end < n and (buf[end] in STRONG_BREAKS or buf[end] in CLOSING or buf[end] == "."):
+                end += 1
+            if end >= n and not final and _unclosed(buf[:end]):
+                break  # 等下一个token，看是不是右引号
+            if len(buf[:end].strip()) >= self._threshold(strong):
+                out.append(buf[:end])
+                self.segments += 1
+                buf = buf[end:]
+                n = len(buf)
+                i = 0
+            else:
+                i = end
+        self.buffer = buf
+        self._scan = i
+
+    def _force(self, out, buf):
+        """超过最长长度：断在最后一个弱断句或空格处，没有就直接截断"""
+        limit = self.max_length
+        cut = limit
+        for j in range(limit - 1, self.first_min_length - 1, -1):
+            if buf[j] in WEAK_BREAKS or buf[j].isspace():
+                cut = j + 1
+                break
+        out.append(buf[:cut])
+        self.segments += 1
+        buf = buf[cut:]
+        return buf, len(buf), 0
+
+
+def _unclosed(text):
+    return any(text.count(left) > text.count(right) for left, right in PAIRS if left in text)
@@ -1,222 +1,209 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import asyncio
 import wave
 import io
 import base64
 import json
+import logging
 import os
 import numpy as np
 from datetime import datetime
 from asrclient import call_audio_to_text_api
-from coze_client import chat_stream
+from coze_client import async_chat_stream, close_async_coze
 from tts_cosyvoice import CosyVoiceTTS
 from dotenv import load_dotenv
-from tts_doubao import TTSClient
-import binascii
+from tts_pool import TTSClientPool
+from log_utils import SampledLogger, setup_logging
+from audio_handler import AudioHandler, write_wav
+from vad import VoiceActivityDetector
+from tts_pipeline import SentencePipeline
+from tts_cache import CachedTTS, TTSCache, TTS_CACHE_ENABLED
+from prompt_audio import PromptLibrary, PROMPT_PREFETCH
+from ws_frames import (
+    FORMAT_BINARY, FORMAT_JSON, FORMATS, FRAME_AUDIO, FRAME_END, FrameEncoder,
+    decode_binary, decode_json_audio, hello_message,
+)
 
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
+packet_logger = SampledLogger(logger, every=50)
 app = FastAPI()
 COSYVOICE_API_KEY = os.getenv("COSYVOICE_API_KEY")
-TTS_CLIENT = TTSClient()
-
-class AudioHandler:
-    def __init__(self):
-        self.audio_buffer:bytearray = bytearray()  # 存储音频数据
-        self.sample_rate = 16000  # 修改为32000Hz，是I2S配置的2倍
-        self.channels = 1
-        self.sample_width = 2  # 16位音频
-        self.total_bytes = 0  # 添加计数器
-        
-    def reset_buffer(self):
-        """重置音频缓冲区和计数器"""
-        self.audio_buffer = bytearray()
-        self.total_bytes = 0  # 同时重置计数器
-
-    def process_audio_data(self, audio_data: bytes) -> bytes:
-        """处理音频数据，确保格式正确"""
-        # 将音频数据转换为16位有符号整数的numpy数组
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        
-        # 如果需要，这里可以添加外的音频处理
-        # 例如：降噪、音量归一化等
-        
-        return audio_array.tobytes()
-        
-    def add_audio_data(self, audio_data: bytes):
-        """添加音频数据到缓冲区"""
-        self.audio_buffer.extend(audio_data)
-        self.total_bytes += len(audio_data)
-        print(f"接收数据块大小: {len(audio_data)} bytes")
-        print(f"累计接收: {self.total_bytes} bytes") # 调试信息
-        
-    def save_wav(self, filename: str) -> str:
-        """将缓冲区数据保存为WAV文件"""
-        if not self.audio_buffer:
-            return None
-            
-        print(f"总数据量: {self.total_bytes} bytes")  # 调试信息
-        print(f"预计时长: {self.total_bytes / (self.sample_rate * self.channels * self.sample_width):.2f} 秒")
-        
-        # 确保目录存在
-        os.makedirs("audio_files", exist_ok=True)
-        filepath = os.path.join("audio_files", filename)
-        
-        # 创建WAV文件
-        with wave.open(filepath, 'wb') as wav_file:
-            wav_file.setnchannels(self.channels)
-            wav_file.setsampwidth(self.sample_width)
-            wav_file.setframerate(self.sample_rate)
-
-            # 计算总帧数
-            total_frames = len(self.audio_buffer) // 2  # 16位 = 2字节
-            
-            # 写入音频数据
-            wav_file.writeframes(self.audio_buffer)
-
-        # 验证生成的文件
-        with wave.open(filepath, 'rb') as wav_file:
-            print(f"WAV文件信息:")
-            print(f"通道数: {wav_file.getnchannels()}")
-            print(f"采样宽度: {wav_file.getsampwidth()}")
-            print(f"采样率: {wav_file.getframerate()}")
-            print(f"总帧数: {wav_file.getnframes()}")
-            print(f"总时长: {wav_file.getnframes() / wav_file.getframerate():.2f}秒")    
-        return filepath
-
+TTS_POOL = TTSClientPool(
+    size=int(os.getenv("TTS_POOL_SIZE", 4)),
+    max_concurrency=int(os.getenv("TTS_MAX_CONCURRENCY", 4))
+)
+# 常用句子的合成结果缓存（内存 + 磁盘），命中时不请求TTS服务
+TTS_CACHE = TTSCache() if TTS_CACHE_ENABLED else None
+TTS = CachedTTS(TTS_POOL, TTS_CACHE) if TTS_CACHE is not None else TTS_POOL
+# websocket接口不播放提示音，只预先合成 PROMPT_PHRASES 中的常用句子写入TTS缓存
+PROMPTS = PromptLibrary(prompts={})
+prefetch_task = None
+
+# 服务端语音活动检测：检测到说话结束就开始识别，不等客户端的end_recording；识别时去掉前后静音
+SERVER_VAD = os.getenv("SERVER_VAD", "1") == "1"
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", 700))
+
+def new_audio_handler():
+    vad = VoiceActivityDetector(end_silence_ms=VAD_END_SILENCE_MS) if SERVER_VAD else None
+    return AudioHandler(vad=vad)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    audio_handler = AudioHandler()
-    
-    
+    audio_handler = new_audio_handler()
+    vad_ended = False  # 上一句话是否由服务端VAD结束（客户端的end_recording还没到）
+    # 默认用旧固件的JSON格式，设备发hello或者直接发二进制帧后切换为二进制帧
+    encoder = FrameEncoder(websocket.send_text, websocket.send_bytes, FORMAT_JSON)
+
+    # 修改为分块发送的异步音频处理函数
+    async def custom_audio_handler(data: bytes):
+        chunk_size = 1024  # 设置更小的块大小，可以根据ESP32的内存情况调整
+        logger.debug("Total audio data length: %d", len(data))
+
+        # 将数据分块发送
+        view = memoryview(data)
+        for i in range(0, len(data), chunk_size):
+            chunk = view[i:i + chunk_size]
+            packet_logger.debug("Sending chunk %d, size: %d", i // chunk_size + 1, len(chunk))
+            await encoder.send_audio(chunk)
+            # await asyncio.sleep(0.01)  # 添加小延迟，给ESP32处理时间
+
+    def set_format(audio_format):
+        if encoder.audio_format != audio_format:
+            logger.info("音频格式切换为: %s", audio_format)
+            encoder.audio_format = audio_format
+
+    async def finish_recording():
+        """结束当前这句话：保存去掉静音的录音 -> 语音识别 -> 对话"""
+        nonlocal audio_handler
+        # 换一个新的缓冲区继续接收，准备接收新的录音
+        handler, audio_handler = audio_handler, new_audio_handler()
+        try:
+            speech = handler.get_speech_data()
+            if not speech:
+                return
+            logger.info("录音时长: %.2f 秒, 去掉静音后: %.2f 秒", handler.duration, handler.speech_duration)
+            # 生成唯一文件名
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.makedirs("audio_files", exist_ok=True)
+            filepath = write_wav(os.path.join("audio_files", f"recording_{timestamp}.wav"), speech)
+        finally:
+            handler.reset_buffer()
+
+        # 调用语音转文字 API
+        try:
+            response = await call_audio_to_text_api(filepath)
+            logger.info("语音识别结果: %s", response)
+
+            # LLM输出边分句边并发合成，音频按句子顺序发给设备
+            pipeline = SentencePipeline(TTS, custom_audio_handler)
+            await pipeline.run(async_chat_stream(bot_id="7435549735148273679", user_id="1",
+                                                 message=response["result"][0]["text"]))
+            await encoder.send_end()
+
+        except Exception:
+            logger.exception("处理录音出错")
+
     try:
-        # 创建一个异步队列
-        tts_queue = asyncio.Queue()
-        
-        # 创建一个异步处理器
-        async def tts_processor():
-            while True:
-                sentence = await tts_queue.get()
-                # print(f"合成语音: {sentence}")
-                await TTS_CLIENT.query_tts(sentence, custom_audio_handler)
-                tts_queue.task_done()
-        
-        # 启动处理器
-        asyncio.create_task(tts_processor())
+        async def on_audio(audio_data):
+            nonlocal vad_ended
+            # processed_data = audio_handler.process_audio_data(audio_data)
+            audio_handler.add_audio_data(audio_data)
+            if audio_handler.speech_detected:
+                vad_ended = False
+            if audio_handler.speech_ended:
+                # 检测到说话结束，马上开始识别
+                vad_ended = True
+                await finish_recording()
+
+        async def on_end_recording():
+            nonlocal vad_ended
+            if vad_ended and not audio_handler.speech_detected:
+                # 这句话已经由服务端VAD结束，之后收到的只有静音
+                vad_ended = False
+                audio_handler.reset_buffer()
+                return
+            await finish_recording()
 
         while True:
-            # 接收WebSocket消息
-            message = await websocket.receive_json()
-            
+            # 接收WebSocket消息：二进制帧是新固件的音频，文本帧是JSON
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            data = frame.get("bytes")
+            if data is not None:
+                try:
+                    frame_type, _, sequence, payload = decode_binary(data)
+                except ValueError as e:
+                    # 截断或有噪声的帧只丢弃这一帧，不结束整个会话
+                    packet_logger.warning("丢弃无效的二进制帧(%d bytes): %s", len(data), e)
+                    continue
+                set_format(FORMAT_BINARY)
+                packet_logger.debug("收到二进制帧 #%d, 类型: %d, 大小: %d bytes", sequence, frame_type, len(payload))
+                if frame_type == FRAME_AUDIO:
+                    await on_audio(payload)
+                elif frame_type == FRAME_END:
+                    await on_end_recording()
+                continue
+
+            message = json.loads(frame["text"])
             if message['type'] == 'audio':
-                # 解码音频数据
-                audio_data = binascii.unhexlify(message['audio'])
-                # audio_data = bytes.fromhex(message['audio'])
-                # processed_data = audio_handler.process_audio_data(audio_data)
-                audio_handler.add_audio_data(audio_data)
-                
-                # 发送确认消息
-                # await websocket.send_json({
-                #     "type": "status",
-                #     "message": "received_chunk",
-                #     "size": len(audio_data)
-                # })
-                
+                # 旧固件：十六进制编码的音频
+                await on_audio(decode_json_audio(message))
+
             elif message['type'] == 'end_recording':
-                # 生成唯一文件名
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"recording_{timestamp}.wav"
-                
-                # 保存音频文件
-                filepath = audio_handler.save_wav(filename)
-                # 重置缓冲区，准备接收新的录音
-                audio_handler.reset_buffer()
+                await on_end_recording()
+
+            elif message['type'] == 'hello':
+                audio_format = message.get('audio_format', FORMAT_JSON)
+                if audio_format not in FORMATS:
+                    audio_format = FORMAT_JSON
+                set_format(audio_format)
+                await websocket.send_json(hello_message(audio_format))
 
-                if not filepath:
-                    # 调用语音转文字 API
-                    try:
-                        # 这里需要实现调用 API 的具体逻辑
-                        response = await call_audio_to_text_api(filepath)
-                        print(response)
-
-                        # 修改为分块发送的异步音频处理函数
-                        async def custom_audio_handler(data: bytes):
-                            chunk_size = 1024  # 设置更小的块大小，可以根据ESP32的内存情况调整
-                            print("Total audio data length:", len(data))
-                            
-                            # 将数据分块发送
-                            for i in range(0, len(data), chunk_size):
-                                chunk = data[i:i + chunk_size]
-                                current_time = datetime.now().strftime("%H:%M:%S.%f")[:-3]  # 时:分:秒.毫秒
-                                print(f"[{current_time}] Sending chunk {i//chunk_size + 1}, size: {len(chunk)}")
-                                await websocket.send_json({
-                                    "type": "audio",
-                                    "audio": chunk.hex()
-                                })
-                                # await asyncio.sleep(0.01)  # 添加小延迟，给ESP32处理时间
-
-                        # 创建 TTS 实例
-                        # tts = CosyVoiceTTS(
-                        #     api_key=COSYVOICE_API_KEY,
-                        #     on_data_callback=custom_audio_handler
-                        # )
-
-                        # 调用对话流式响应
-                        current_sentence = ""
-                        sentence_endings = ["，", "。", "！", "？", ",", ".", "!", "?"]  # 定义句子结束标记
-                        min_sentence_length = 5
-                        
-                        for message in chat_stream(bot_id="7435549735148273679", user_id="1",
-                                                   message=response["result"][0]["text"]):
-                            print(message)
-                            current_sentence += message
-                            
-                            # 检查是否遇到句子结束标记
-                            if len(current_sentence) >= min_sentence_length and any(current_sentence.endswith(ending) for ending in sentence_endings):
-                                print(f"合成语音: {current_sentence}")
-                                # 不等待，直接放入队列
-                                await TTS_CLIENT.query_tts(current_sentence, custom_audio_handler)
-                                current_sentence = ""  # 重置当前句子
-                        
-                        # 处理最后可能剩余的文本
-                        if current_sentence.strip():
-                            print(f"合成剩余语音: {current_sentence}")
-                            # 这里也需要添加 await
-                            await TTS_CLIENT.query_tts(current_sentence, custom_audio_handler)
-
-                    except Exception as e:
-                        print(f"Error: {e}")
-                        
-                    
-                
-                
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        print(f"Error: {e}")
+        logger.exception("websocket处理出错")
         await websocket.send_json({
             "type": "error",
             "message": str(e)
         })
         
     finally:
-        # 清理队列中的所有剩余项目
-        while not tts_queue.empty():
-            try:
-                tts_queue.get_nowait()
-                tts_queue.task_done()
-            except asyncio.QueueEmpty:
-                break
+        logger.info("连接关闭, 发送统计: %s", encoder.stats())
+        audio_handler.reset_buffer()
 
         try:
             await websocket.close()
         except:
             pass
 
+@app.on_event("startup")
+async def warm_up_tts():
+    # 预先建立TTS连接，避免第一句话承担握手延迟
+    global prefetch_task
+    await TTS_POOL.warm_up()
+    if PROMPT_PREFETCH:
+        # 常用句子预先合成写入TTS缓存，对话中直接命中
+        prefetch_task = asyncio.ensure_future(PROMPTS.prefetch(TTS))
+
+@app.on_event("shutdown")
+async def close_tts():
+    if prefetch_task is not None:
+        prefetch_task.cancel()
+    await TTS_POOL.close()
+    await close_async_coze()
+    PROMPTS.close()
+
 # 添加普通的HTTP端点用于健康检查
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "tts_pool": TTS_POOL.stats(),
+            "tts_cache": TTS_CACHE.stats() if TTS_CACHE is not None else None}
 
 
 
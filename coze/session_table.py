@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def _shard_of(addr, shards):
+    """按客户端地址计算进程内的会话分片号，进程重启后结果不变（不使用随机化的hash()）"""
+    if shards <= 1:
+        return 0
+    host, port = addr[0], addr[1]
+    return zlib.crc32(f"{host}:{port}".encode()) % shards
+
+
+class _Shard:
+    def __init__(self):
+        self.sessions = OrderedDict()  # addr -> session，按最近活跃时间排序，最旧的在前
+
+
+class SessionTable:
+    """
+    UDP网关的客户端会话表
+
+    - 空闲超过idle_timeout的会话由后台任务回收（NAT端口变化后旧地址不会再有数据）
+    - 会话总数超过max_sessions时淘汰最久未活跃的会话（LRU）
+    - 按地址哈希分成若干分片，每个分片独立维护LRU顺序；后台任务每次只扫描一个分片，
+      会话很多时单次回收的耗时也有上限
+
+    session需要有 last_active(time.time()) 属性和 close() 方法；有 is_busy() 时，
+    正在处理对话的会话不会因为空闲被回收，LRU淘汰时也优先淘汰空闲的会话。
+    """
+    def __init__(self, factory, idle_timeout=300.0, max_sessions=1024, shards=1,
+                 on_evict=None, clock=time.time):
+        self.factory = factory  # addr -> session
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.shards = [_Shard() for _ in range(max(1, shards))]
+        self.on_evict = on_evict  # 会话被移除时回调(addr, session)
+        self.clock = clock
+        self._count = 0
+        self._next_shard = 0
+        self._reaper = None
+
+        # 指标
+        self.created = 0
+        self.reaped = 0  # 因空闲超时移除
+        self.evicted = 0  # 因超过容量移除
+
+    def _shard(self, addr):
+        return self.shards[_shard_of(addr, len(self.shards))]
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, addr):
+        return addr in self._shard(addr).sessions
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from list(shard.sessions)
+
+    def get(self, addr, default=None):
+        return self._shard(addr).sessions.get(addr, default)
+
+    def items(self):
+        for shard in self.shards:
+            yield from list(shard.sessions.items())
+
+    def values(self):
+        for _, session in self.items():
+            yield session
+
+    def get_or_create(self, addr):
+        """取得客户端会话并标记为最近活跃，不存在时创建"""
+        sessions = self._shard(addr).sessions
+        session = sessions.get(addr)
+        if session is not None:
+            sessions.move_to_end(addr)
+            return session
+        if self._count >= self.max_sessions:
+            self._evict_lru()
+        session = sessions[addr] = self.factory(addr)
+        self._count += 1
+        self.created += 1
+        return session
+
+    def remove(self, addr):
+        session = self._shard(addr).sessions.pop(addr, None)
+        if session is None:
+            return None
+        self._count -= 1
+        try:
+            session.close()
+        finally:
+            if self.on_evict is not None:
+                self.on_evict(addr, session)
+        return session
+
+    def _evict_lru(self):
+        """淘汰所有分片中最久未活跃的会话，优先选择空闲的"""
+        oldest = None
+        for shard in self.shards:
+            for addr, session in shard.sessions.items():
+                busy = _is_busy(session)
+                candidate = (busy, session.last_active, addr)
+                if oldest is None or candidate[:2] < oldest[:2]:
+                    oldest = candidate
+                if not busy:
+                    break  # 分片内按LRU排序，第一个空闲会话就是该分片的候选
+        if oldest is not None:
+            logger.info("会话数达到上限 %d，淘汰 %s", self.max_sessions, oldest[2])
+            self.evicted += 1
+            self.remove(oldest[2])
+
+    def reap(self, shard_index=None, now=None):
+        """回收空闲超时的会话，shard_index为None时扫描所有分片，返回回收的个数"""
+        now = self.clock() if now is None else now
+        shards = self.shards if shard_index is None else [self.shards[shard_index]]
+        expired = []
+        for shard in shards:
+            for addr, session in shard.sessions.items():
+                if now - session.last_active < self.idle_timeout:
+                    break  # 按活跃时间排序，后面的都更新
+                if not _is_busy(session):
+                    expired.append(addr)
+        for addr in expired:
+            logger.debug("回收空闲会话 %s", addr)
+            self.remove(addr)
+        self.reaped += len(expired)
+        return len(expired)
+
+    def start_reaper(self, interval=None):
+        """启动后台回收任务，每个周期扫描一遍所有分片（每次一个分片，均匀分布在周期内）"""
+        if interval is None:
+            interval = min(self.idle_timeout / 4, 30.0)
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._run_reaper(interval / len(self.shards)))
+        return self._reaper
+
+    async def _run_reaper(self, step):
+        while True:
+            await asyncio.sleep(step)
+            try:
+                self.reap(self._next_shard)
+            except Exception:
+                logger.exception("回收会话出错")
+            self._next_shard = (self._next_shard + 1) % len(self.shards)
+
+    def close(self):
+        """停止回收任务并关闭所有会话"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for addr in list(self):
+            self.remove(addr)
+
+    def stats(self):
+        return {
+            "sessions": self._count,
+            "max_sessions": self.max_sessions,
+            "shards": [len(shard.sessions) for shard in self.shards],
+            "created": self.created,
+            "reaped": self.reaped,
+            "evicted": self.evicted,
+        }
+
+
+def _is_busy(session):
+    is_busy = getattr(session, "is_busy", None)
+    return bool(is_busy and is_busy())
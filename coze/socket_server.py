@@ -1,29 +1,126 @@
 # UDP 服务器
+import logging
+import os
 import socket
-from audio_handler import AudioHandler
+from audio_handler import AudioHandler, AUDIO_BUFFER_POOL, SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH
 import time
 # from asrclient import call_audio_to_text_api
-from coze_client import chat_stream,create_conversation_id
+from coze_client import async_chat_stream, async_create_conversation_id, close_async_coze
 from dotenv import load_dotenv
-from tts_doubao import TTSClient
+from tts_pool import TTSClientPool
+from audio_sender import AudioSender
 import asyncio
 import wave
 from asr_huoshan import AsrWsClient
+from asr_connection import AsrConnectionManager
+from recording_archiver import RecordingArchiver
+from log_utils import SampledLogger, setup_logging
+from session_table import SessionTable
+from vad import VoiceActivityDetector
+from jitter_buffer import JitterBuffer
+from tts_pipeline import SentencePipeline
+from tts_cache import CachedTTS, TTSCache, TTS_CACHE_ENABLED
+from prompt_audio import PromptLibrary, PROMPT_PREFETCH
 
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-server_socket.bind(('0.0.0.0', 8765))
+logger = logging.getLogger(__name__)
+packet_logger = SampledLogger(logger, every=50)  # 每个音频包都会调用，采样输出
+
+SERVER_ADDR = ('0.0.0.0', 8765)
 
 END_MARKER = b'END_OF_AUDIO'
 
 buffer_size = 1500  # UDP推荐的缓冲区大小
 
+# 录音是否在后台归档到 audio_files/，识别本身不依赖文件
+ARCHIVE_RECORDINGS = os.getenv("ARCHIVE_RECORDINGS", "1") == "1"
+RECORDING_ARCHIVER = RecordingArchiver() if ARCHIVE_RECORDINGS else None
+
+# 预先握手好的ASR连接，识别开始时不用再等TLS握手
+ASR_CONNECTIONS = AsrConnectionManager(warm_size=int(os.getenv("ASR_WARM_CONNECTIONS", 2)))
+
+# 音频帧压缩方式(gzip/none)和级别，可用 bench_compression.py 比较各模式的CPU开销
+ASR_AUDIO_COMPRESSION = os.getenv("ASR_AUDIO_COMPRESSION", "gzip")
+ASR_AUDIO_COMPRESS_LEVEL = int(os.getenv("ASR_AUDIO_COMPRESS_LEVEL", 1))
+
+def new_asr_client():
+    return AsrWsClient(format="pcm", connection_manager=ASR_CONNECTIONS,
+                       audio_compression=ASR_AUDIO_COMPRESSION,
+                       audio_compress_level=ASR_AUDIO_COMPRESS_LEVEL)
+
+# 收到第一个音频包就开始流式识别，设为0时在结束标记后用录音文件识别
+STREAMING_ASR = os.getenv("STREAMING_ASR", "1") == "1"
+
+# 服务端语音活动检测：检测到说话结束就开始识别，不等设备的结束标记；识别时去掉前后静音
+SERVER_VAD = os.getenv("SERVER_VAD", "1") == "1"
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", 700))
+
+# 乱序包最多等待的包数（每包20ms），超过后判定丢包并补齐
+JITTER_WINDOW = int(os.getenv("JITTER_WINDOW", 8))
+
+def new_audio_handler():
+    vad = VoiceActivityDetector(end_silence_ms=VAD_END_SILENCE_MS) if SERVER_VAD else None
+    return AudioHandler(vad=vad)
+
+class Utterance:
+    """一轮语音：录音缓冲区 + 边收边传的流式识别会话"""
+    def __init__(self, audio_handler, asr_stream=None):
+        self.audio_handler = audio_handler
+        self.asr_stream = asr_stream
+
+
+class Turn:
+    """
+    正在处理的一轮对话（识别 + 回复），作为单独的任务运行，设备再次开口时可以取消
+    只有进入回复阶段（replying）后才会被打断；识别阶段不取消，免得丢掉用户前面说的话
+    """
+    def __init__(self, utterance):
+        self.utterance = utterance
+        self.task = None
+        self.replying = False
+        self.pipeline = None  # 回复阶段的 SentencePipeline，取消后从中读取浪费的工作量
+        self.cancelled = False
+
+    def cancel(self):
+        """取消还没结束的任务，返回是否真的取消了；取消后不再向设备发送音频"""
+        if self.task is None or self.task.done():
+            return False
+        self.cancelled = True
+        self.task.cancel()
+        return True
+
+
+# 打断（barge-in）统计：设备在回复过程中又开始说话
+BYTES_PER_SECOND = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+barge_in_counters = {
+    "barge_ins": 0,
+    "aborted_llm_streams": 0,  # LLM还在输出时被关闭的流
+    "aborted_tts_requests": 0,  # 被取消或不再发起的句子合成
+    "discarded_audio_bytes": 0,  # 已合成但没有交给发送队列的音频
+    "unsent_audio_bytes": 0,  # 已在发送队列中但没有发出的音频
+}
+
+def barge_in_stats():
+    stats = dict(barge_in_counters)
+    stats["discarded_audio_seconds"] = stats.pop("discarded_audio_bytes") / BYTES_PER_SECOND
+    stats["unsent_audio_seconds"] = stats.pop("unsent_audio_bytes") / BYTES_PER_SECOND
+    return stats
+
+
 # 使用字典来存储每个客户端的 AudioHandler
 class ClientSession:
-    def __init__(self):
-        self.audio_handler = AudioHandler()
+    def __init__(self, addr=None):
+        self.addr = addr
+        self.audio_handler = new_audio_handler()
         self.last_active = time.time()
         self.session_id = None
         self.conversation_id = None
+        self.turns = None  # 待处理的语音轮次队列
+        self.worker = None  # 处理该客户端对话的协程任务
+        self.current_turn = None  # 正在处理的一轮对话
+        self.asr_stream = None  # 当前这句话的流式识别会话
+        self.handling = False  # 是否正在处理一轮对话
+        self.vad_ended = False  # 上一句话是否由服务端VAD结束（设备的结束标记还没到）
+        self.jitter = JitterBuffer(window=JITTER_WINDOW)  # 按序列号重排和丢包补齐
     
     def update_active_time(self):
         self.last_active = time.time()
@@ -31,138 +128,388 @@ class ClientSession:
     def get_audio_handler(self):
         return self.audio_handler
     
-    def get_conversation_id(self):
+    async def get_conversation_id(self):
         if self.conversation_id is None:
-            self.conversation_id = create_conversation_id()
+            self.conversation_id = await async_create_conversation_id()
         return self.conversation_id
 
-# 存储所有客户端会话
-clients = {}  # addr -> ClientSession
+    def ensure_worker(self, turn_handler):
+        """启动该客户端的会话任务，每个客户端的对话按顺序处理，不同客户端之间互不阻塞"""
+        if self.worker is None or self.worker.done():
+            self.turns = asyncio.Queue()
+            self.worker = asyncio.ensure_future(self._run(turn_handler))
+
+    def feed(self, data: bytes):
+        """在接收回调中调用，只做内存操作，不能有任何阻塞"""
+        self.update_active_time()
+        if data == END_MARKER:
+            # 缓存中还没排好序的包先输出，下一句话重新同步序列号
+            for chunk in self.jitter.flush():
+                self.ingest(chunk)
+            self.jitter.reset()
+            if self.vad_ended and not self.audio_handler.speech_detected:
+                # 服务端VAD已经结束了这句话，设备之后发来的静音和结束标记不再处理
+                self.vad_ended = False
+                self.audio_handler.reset_buffer()
+                return
+            self.end_utterance()
+            return
+
+        if len(data) >= 2:
+            sequence = int.from_bytes(data[:2], 'big')
+            audio_data = data[2:]
+            packet_logger.debug("收到来自 %s 的数据包 #%d, 大小: %d bytes", self.addr, sequence, len(audio_data))
+            # 按序列号重排，丢失的包补齐后再进入录音和识别
+            for chunk in self.jitter.push(sequence, audio_data):
+                self.ingest(chunk)
+
+    def ingest(self, audio_data):
+        """按顺序处理一个音频块：录音、VAD、流式识别"""
+        handler = self.audio_handler
+        if handler.vad is None and handler.total_bytes == 0:
+            # 没有VAD时以第一个包作为说话开始
+            self.start_speech()
+        speech_detected = handler.speech_detected
+        accepted = handler.add_audio_data(audio_data)
+        if handler.speech_detected and not speech_detected:
+            # VAD检测到说话开始：从语音起点（含少量前置静音）开始识别，前面的静音不上传
+            self.vad_ended = False
+            start, _ = handler.vad.speech_range(handler.total_bytes)
+            self.start_speech(handler.get_audio_data()[start:])
+        elif self.asr_stream is not None and accepted:
+            # 超过最长录音时长的部分也不再送去识别
+            self.asr_stream.feed(audio_data[:accepted])
+        if handler.speech_ended:
+            # 检测到说话结束，不等设备的结束标记，马上开始识别
+            self.vad_ended = True
+            self.end_utterance()
+
+    def start_speech(self, backlog=None):
+        """设备开始说新的一句话：打断上一轮还没完成的回复，开始流式识别"""
+        self.barge_in()
+        if STREAMING_ASR:
+            self.asr_stream = new_asr_client().open_stream()
+            if backlog:
+                self.asr_stream.feed(backlog)
+
+    def barge_in(self):
+        """丢弃发送队列中还没发出的音频；正在回复时取消这一轮（关闭LLM流、取消TTS请求）"""
+        unsent = AUDIO_SENDER.cancel(self.addr)
+        turn = self.current_turn
+        interrupted = turn is not None and turn.replying and turn.cancel()
+        if interrupted or unsent:
+            barge_in_counters["barge_ins"] += 1
+            barge_in_counters["unsent_audio_bytes"] += unsent
+            logger.info("%s 打断回复, 丢弃未发送音频 %.1fs", self.addr, unsent / BYTES_PER_SECOND)
+
+    def end_utterance(self):
+        """把本轮录音交给会话任务，换一个新的缓冲区继续接收"""
+        utterance = Utterance(self.audio_handler, self.asr_stream)
+        self.audio_handler = new_audio_handler()
+        self.asr_stream = None
+        self.turns.put_nowait(utterance)
+
+    async def _run(self, turn_handler):
+        while True:
+            utterance = await self.turns.get()
+            self.handling = True
+            turn = self.current_turn = Turn(utterance)
+            # 每轮作为单独的任务运行，打断时只取消这一轮，会话任务继续处理下一句
+            turn.task = asyncio.ensure_future(turn_handler(self, utterance))
+            try:
+                await asyncio.wait((turn.task,))
+            finally:
+                turn.cancel()  # 会话任务本身被取消（客户端被回收）时
+                self.current_turn = None
+                self.handling = False
+            if turn.task.cancelled():
+                self._record_barge_in(turn)
+            elif turn.task.exception() is not None:
+                logger.error("处理 %s 的对话出错", self.addr, exc_info=turn.task.exception())
+
+    def _record_barge_in(self, turn):
+        pipeline = turn.pipeline
+        if pipeline is None:
+            return
+        barge_in_counters["aborted_llm_streams"] += pipeline.llm_aborted
+        barge_in_counters["aborted_tts_requests"] += pipeline.aborted_sentences
+        barge_in_counters["discarded_audio_bytes"] += pipeline.discarded_bytes
+        logger.info("%s 的回复被打断: 共 %d 句, 取消合成 %d 句, 丢弃已合成音频 %.1fs, LLM%s",
+                    self.addr, pipeline.sentences, pipeline.aborted_sentences,
+                    pipeline.discarded_bytes / BYTES_PER_SECOND, "流已关闭" if pipeline.llm_aborted else "已输出完")
+
+    def is_busy(self):
+        """正在处理或排队等待处理对话的会话不会因为空闲被回收"""
+        return self.handling or (self.turns is not None and not self.turns.empty())
+
+    def memory_bytes(self):
+        """该客户端当前占用的录音缓冲区大小，包括排队等待处理的轮次"""
+        queued = self.turns._queue if self.turns is not None else ()
+        return self.audio_handler.memory_bytes + sum(u.audio_handler.memory_bytes for u in queued)
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+        if self.asr_stream is not None:
+            asyncio.ensure_future(self.asr_stream.close())
+            self.asr_stream = None
+        self.audio_handler.reset_buffer()
+        if self.turns is not None:
+            # 还在排队的轮次不会再处理，录音缓冲区直接归还
+            while not self.turns.empty():
+                self.turns.get_nowait().audio_handler.reset_buffer()
+
+# 存储所有客户端会话：空闲超时回收 + 数量上限(LRU淘汰) + 按地址分片
+clients = SessionTable(
+    ClientSession,
+    idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", 300)),
+    max_sessions=int(os.getenv("MAX_SESSIONS", 1024)),
+    shards=int(os.getenv("SESSION_SHARDS", 8)),
+    on_evict=lambda addr, session: AUDIO_SENDER.cancel(addr),  # 被移除的客户端不再发送未播完的回复
+)
+
+# TTS连接池，每句话借用一个独立的ws连接，多设备并发合成
+TTS_POOL = TTSClientPool(
+    size=int(os.getenv("TTS_POOL_SIZE", 8)),
+    max_concurrency=int(os.getenv("TTS_MAX_CONCURRENCY", 8))
+)
+# 常用句子的合成结果缓存（内存 + 磁盘），命中时不请求TTS服务
+TTS_CACHE = TTSCache() if TTS_CACHE_ENABLED else None
+TTS = CachedTTS(TTS_POOL, TTS_CACHE) if TTS_CACHE is not None else TTS_POOL
+# 等待提示音等预置音频，启动时加载一次，所有会话共用
+PROMPTS = PromptLibrary()
+
+# UDP传输对象，在endpoint建立后赋值
+transport = None
+gateway_protocol = None
+
+
+class UdpGatewayProtocol(asyncio.DatagramProtocol):
+    """
+    基于asyncio的UDP接收端
+
+    datagram_received只把数据交给对应客户端的会话，ASR/LLM/TTS都在各自的会话任务中执行，
+    因此某个设备的对话处理不会阻塞其他设备（以及自己下一轮）的音频接收。
+    """
+    def __init__(self, turn_handler=None):
+        self.turn_handler = turn_handler or handle_turn
+        self.transport = None
+        self.packets = 0
 
-# TODO 并发量高的情况的得优化下,目前就一个ws实例
-TTS_CLIENT = TTSClient()
+    def connection_made(self, transport):
+        self.transport = transport
+        set_transport(transport)
 
-# 创建一个协程来处理UDP数据接收
-async def receive_data():
-    loop = asyncio.get_event_loop()
-    while True:
+    def datagram_received(self, data, addr):
+        self.packets += 1
         try:
-            # 使用线程执行器来处理阻塞的UDP接收
-            data, addr = await loop.run_in_executor(None, 
-                lambda: server_socket.recvfrom(buffer_size))
-            
             client_session = get_client_session(addr)
-            
-            if data == END_MARKER:
-                print(f"====================收到来自 {addr} 的结束标记====================")
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                filename = f"recording_{addr[0]}_{addr[1]}_{timestamp}.wav"
-                filepath = client_session.get_audio_handler().save_wav(filename)
-                print(f"音频已保存到: {filepath}")
-                client_session.get_audio_handler().reset_buffer()
-
-                # 调用发送等待提示音方法
-                send_wait_audio(addr)
-
-                # 使用新的语音识别方法
-                asr_text = await perform_speech_recognition(filepath)
-
-                # 传入客户端地址
-                if asr_text:
-                    await chat_with_ai(asr_text, addr)
-                continue
-                
-            if len(data) >= 2:
-                sequence = int.from_bytes(data[:2], 'big')
-                audio_data = data[2:]
-                print(f"收到来自 {addr} 的数据包 #{sequence}, 大小: {len(audio_data)} bytes")
-                client_session.get_audio_handler().add_audio_data(audio_data)
-                
-        except Exception as e:
-            print(f"错误: {e}")
+            client_session.ensure_worker(self.turn_handler)
+            client_session.feed(data)
+        except Exception:
+            logger.exception("处理 %s 的数据包出错", addr)
+
+    def error_received(self, exc):
+        logger.warning("UDP错误: %s", exc)
+
+
+def set_transport(udp_transport):
+    global transport
+    transport = udp_transport
+
+
+async def handle_turn(client_session: ClientSession, utterance: Utterance):
+    """处理一轮语音：等待提示音 -> 语音识别 -> 对话，录音在后台归档"""
+    addr = client_session.addr
+    logger.info("%s 的一句话结束", addr)
+    audio_handler = utterance.audio_handler
+    audio_data = audio_handler.get_audio_data()
+    if not audio_data:
+        if utterance.asr_stream is not None:
+            await utterance.asr_stream.close()
+        audio_handler.reset_buffer()
+        return
+    logger.info("%s 录音时长: %.2f 秒, 去掉静音后: %.2f 秒", addr, audio_handler.duration,
+                audio_handler.speech_duration)
+
+    archived = None
+    if RECORDING_ARCHIVER is not None:
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        archived = RECORDING_ARCHIVER.archive(f"recording_{addr[0]}_{addr[1]}_{timestamp}.wav", audio_data)
+
+    # 调用发送等待提示音方法
+    send_wait_audio(addr)
+
+    try:
+        # 流式识别在收音过程中已经完成了大部分工作，失败时再用内存中的录音识别一次
+        asr_text = await finish_speech_recognition(utterance.asr_stream)
+        if asr_text is None:
+            asr_text = await perform_speech_recognition(audio_handler.get_speech_data())
+    finally:
+        # 识别和归档都用完录音后，缓冲区归还给缓冲池，对话阶段不再占用
+        del audio_data
+        if archived is None:
+            audio_handler.reset_buffer()
+        else:
+            archived.add_done_callback(lambda _: audio_handler.reset_buffer())
+
+    if asr_text:
+        await chat_with_ai(asr_text, client_session)
+
+
+async def receive_data(local_addr=SERVER_ADDR, turn_handler=None, reuse_port=False):
+    """
+    运行UDP网关直到被取消
+    reuse_port: 多个进程绑定同一端口（SO_REUSEPORT），由 gateway_launcher.py 启动多进程时使用
+    """
+    global gateway_protocol
+    loop = asyncio.get_running_loop()
+    # 预先建立TTS连接
+    PROMPTS.load()
+    connected = await TTS_POOL.warm_up()
+    logger.info("TTS连接池预连接完成: %d/%d", connected, TTS_POOL.size)
+    # 缺少的提示音和常用句子在后台合成，不耽误开始接收
+    prefetch = asyncio.ensure_future(PROMPTS.prefetch(TTS)) if PROMPT_PREFETCH else None
+    asr_client = new_asr_client()
+    warm = await ASR_CONNECTIONS.warm_up(asr_client.connection_key(), asr_client.connect)
+    logger.info("ASR预热连接: %d/%d", warm, ASR_CONNECTIONS.warm_size)
+
+    AUDIO_SENDER.start()
+    clients.start_reaper()
+    udp_transport, gateway_protocol = await loop.create_datagram_endpoint(
+        lambda: UdpGatewayProtocol(turn_handler),
+        local_addr=local_addr,
+        reuse_port=reuse_port or None,
+    )
+    try:
+        # 接收由协议回调驱动，这里只需要保持运行
+        await asyncio.Future()
+    finally:
+        await AUDIO_SENDER.stop()
+        await ASR_CONNECTIONS.close()
+        await close_async_coze()
+        if prefetch is not None:
+            prefetch.cancel()
+        udp_transport.close()
+        clients.close()
+        PROMPTS.close()
+        if RECORDING_ARCHIVER is not None:
+            # 等还在写的录音文件写完再退出
+            RECORDING_ARCHIVER.close()
 
 # 发送等待提示音
 def send_wait_audio(addr):
-    wait_audio_path = os.path.join(os.path.dirname(__file__), "assets/wait.wav")
-    with open(wait_audio_path, 'rb') as f:
-        wait_audio_data = f.read()
-    # 在新线程中发送音频数据
-    
-    threading.Thread(
-        target=send_audio,
-        args=(wait_audio_data, addr)
-    ).start()
+    # 启动时已经加载好的只读数据，每轮对话不再读文件，也不复制
+    wait_audio_data = PROMPTS.get("wait")
+    if wait_audio_data is None:
+        logger.debug("没有等待提示音")
+        return
+    send_audio(wait_audio_data, addr)
 
 def get_client_session(addr):
-    if addr not in clients:
-        clients[addr] = ClientSession()
-    return clients[addr]
+    return clients.get_or_create(addr)
 
-# 修改为分块发送的异步音频处理函数
-def send_audio(audio_data: bytes, addr):
-    chunk_size = 1024  # 设置更小的块大小，可以根据ESP32的内存情况调整
-    print("Total audio data length:", len(audio_data))
+def memory_stats():
+    """所有客户端的录音缓冲区占用，以及缓冲池的状态"""
+    per_session = {addr: session.memory_bytes() for addr, session in clients.items()}
+    return {
+        "sessions": len(per_session),
+        "session_table": clients.stats(),
+        "session_bytes": sum(per_session.values()),
+        "max_session_bytes": max(per_session.values(), default=0),
+        "buffer_pool": AUDIO_BUFFER_POOL.stats(),
+    }
 
-    print("写入数据文件")
-    
-    # 将数据分块发送
-    for i in range(0, len(audio_data), chunk_size):
-        chunk = audio_data[i:i + chunk_size]
-        # print(f"Sending chunk {i//chunk_size + 1}, size: {len(chunk)}, addr: {addr}")
-        # file_to_save.write(chunk)
-        
-        # 添加1字节的消息类型(1表示音频数据)和2字节的序列号
-        message_type = (1).to_bytes(1, 'big')  # 1 byte for audio type
-        sequence = i // chunk_size
-        sequence_bytes = sequence.to_bytes(2, 'big')  # 2 bytes for sequence
-        
-        # 组合消息类型、序列号和音频数据
-        packet = message_type + sequence_bytes + chunk
-        server_socket.sendto(packet, addr)
+def ingress_stats():
+    """所有客户端的接收统计（乱序、丢包），以及丢包率最高的几个客户端"""
+    totals = {}
+    worst = []
+    for addr, session in clients.items():
+        stats = session.jitter.stats()
+        for key, value in stats.items():
+            if key != "loss_ratio":
+                totals[key] = totals.get(key, 0) + value
+        worst.append((stats["loss_ratio"], f"{addr[0]}:{addr[1]}"))
+    concealed = totals.get("lost", 0)
+    emitted = totals.get("emitted", 0)
+    totals["loss_ratio"] = concealed / (concealed + emitted) if concealed + emitted else 0.0
+    worst.sort(reverse=True)
+    totals["worst_clients"] = [{"addr": addr, "loss_ratio": ratio} for ratio, addr in worst[:5] if ratio > 0]
+    return totals
 
-        time.sleep(0.02)
-    
+def gateway_stats():
+    """本进程网关的运行指标，多进程时由 gateway_launcher.py 汇总"""
+    return {
+        "pid": os.getpid(),
+        "packets": gateway_protocol.packets if gateway_protocol is not None else 0,
+        "memory": memory_stats(),
+        "ingress": ingress_stats(),
+        "audio_sender": AUDIO_SENDER.stats(),
+        "tts_pool": TTS_POOL.stats(),
+        "tts_cache": TTS_CACHE.stats() if TTS_CACHE is not None else None,
+        "prompts": PROMPTS.stats(),
+        "asr_connections": ASR_CONNECTIONS.stats(),
+        "barge_in": barge_in_stats(),
+    }
 
-# 修改函数签名，接收客户端地址
-async def chat_with_ai(text, client_addr):
-    current_sentence = ""
-    sentence_endings = ["，", "。", "！", "？", ",", ".", "!", "?"]  # 定义句子结束标记
-    min_sentence_length = 5
+def sendto(packet: bytes, addr):
+    transport.sendto(packet, addr)
 
-    # file_to_save = open("esp32_query.wav", "wb")
-    
-    # 创建一个闭包函数来处理音频
+# 所有客户端共用的音频发送调度器，按设备码率限速
+AUDIO_SENDER = AudioSender(sendto)
+
+# 把音频放入发送队列，由调度器分块按码率发送，不阻塞事件循环
+def send_audio(audio_data: bytes, addr):
+    logger.debug("Total audio data length: %d", len(audio_data))
+    AUDIO_SENDER.enqueue(addr, audio_data)
+
+async def chat_with_ai(text, client_session: ClientSession):
+    client_addr = client_session.addr
+    # 识别期间会话可能已被回收或淘汰，这时不再回复，也不为它重新创建会话
+    if clients.get(client_addr) is not client_session:
+        logger.info("%s 的会话已结束，丢弃回复", client_addr)
+        return None
+    turn = client_session.current_turn
+
+    # 创建一个闭包函数来处理音频；这一轮被打断后不再发送
     def audio_handler_for_client(audio_data: bytes):
-        send_audio(audio_data, client_addr)
+        if turn is None or not turn.cancelled:
+            send_audio(audio_data, client_addr)
 
-    client_session = get_client_session(client_addr)
-    conversation_id = client_session.get_conversation_id()
-        
-    for message in chat_stream(bot_id="7435549735148273679", user_id="1",
-                             message=text, conversation_id=conversation_id):
-        print(message)
-        current_sentence += message
-        
-        # 检查是否遇到句子结束标记
-        if len(current_sentence) >= min_sentence_length and any(current_sentence.endswith(ending) for ending in sentence_endings):
-            print(f"合成语音: {current_sentence}")
-            # 使用新的处理函数
-            await TTS_CLIENT.query_tts(current_sentence, audio_handler_for_client)
-            current_sentence = ""
+    # LLM输出边分句边并发合成，音频按句子顺序发给设备
+    pipeline = SentencePipeline(TTS, audio_handler_for_client)
+    if turn is not None:
+        # 从这里开始设备再说话就打断这一轮
+        turn.replying = True
+        turn.pipeline = pipeline
+    conversation_id = await client_session.get_conversation_id()
+    return await pipeline.run(async_chat_stream(bot_id="7435549735148273679", user_id="1",
+                                                message=text, conversation_id=conversation_id))
 
-    if current_sentence.strip():
-        print(f"合成剩余语音: {current_sentence}")
-        await TTS_CLIENT.query_tts(current_sentence, audio_handler_for_client)
+async def finish_speech_recognition(asr_stream):
+    """
+    结束流式识别并返回识别结果文本
 
-    # print("关闭文件")
-    # file_to_save.close()
+    Returns:
+        str: 识别出的文本，流式识别不可用或失败时返回None
+    """
+    if asr_stream is None:
+        return None
+    try:
+        result = await asr_stream.finish()
+    except Exception as e:
+        logger.warning("流式识别失败: %s", e)
+        return None
+    if not result or 'payload_msg' not in result:
+        return None
+    return result["payload_msg"]['result']["text"]
 
-async def perform_speech_recognition(filepath):
+async def perform_speech_recognition(audio_data):
     """
     执行语音识别并返回识别结果文本
     
     Args:
-        filepath: 音频文件路径
+        audio_data: 内存中的PCM数据(16kHz/16bit/单声道)
         
     Returns:
         str: 识别出的文本，如果识别失败返回空字符串
@@ -175,16 +522,15 @@ async def perform_speech_recognition(filepath):
     #     print(f"语音识别失败: {e}")
     #     return ""
 
-    asr_client = AsrWsClient(audio_path=filepath)
-    result = await asr_client.execute()
+    asr_client = new_asr_client()
+    result = await asr_client.execute(audio_data=audio_data)
     return result["payload_msg"]['result']["text"]
 
 # 运行主循环
 if __name__ == "__main__":
+    setup_logging()
     try:
-        print("服务器启动")
+        logger.info("服务器启动")
         asyncio.run(receive_data())
     except KeyboardInterrupt:
-        print("服务器关闭")
-    finally:
-        server_socket.close()
\ No newline at end of file
+        logger.info("服务器关闭")
\ No newline at end of file
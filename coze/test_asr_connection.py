@@ -0,0 +1,171 @@
+import asyncio
+import time
+import unittest
+from asr_connection import AsrConnectionManager
+
+KEY = "wss://asr|app|token"
+
+class FakeWebsocket:
+    def __init__(self, reqid):
+        self.reqid = reqid
+        self.closed = False
+
+    @property
+    def open(self):
+        return not self.closed
+
+    async def close(self):
+        self.closed = True
+
+class FakeConnect:
+    """模拟握手：耗时delay秒，前failures次抛出异常"""
+    def __init__(self, delay=0.01, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = []  # 每次调用的时间
+        self.sockets = []
+
+    async def __call__(self, reqid):
+        self.calls.append(time.monotonic())
+        await asyncio.sleep(self.delay)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("handshake failed")
+        ws = FakeWebsocket(reqid)
+        self.sockets.append(ws)
+        return ws
+
+class TestAsrConnectionManager(unittest.TestCase):
+    def test_reuses_warm_spares(self):
+        connect = FakeConnect()
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=2)
+            self.assertEqual(await manager.warm_up(KEY, connect), 2)
+            ws, reqid = await manager.acquire(KEY, connect)
+            # 拿到的是预先握手好的连接，reqid 与握手时一致
+            self.assertIs(ws, connect.sockets[0])
+            self.assertEqual(reqid, ws.reqid)
+            await manager.release(ws)
+            await manager.refill_tasks[KEY]
+            self.assertEqual(len(manager.spares[KEY]), 2)
+            await manager.close()
+            return manager, ws
+
+        manager, ws = asyncio.run(run())
+        self.assertTrue(ws.closed)
+        self.assertEqual(len(connect.calls), 3)
+        stats = manager.stats()
+        self.assertEqual(stats["acquired"], 1)
+        self.assertEqual(stats["warm_hits"], 1)
+        self.assertEqual(stats["handshakes"], 3)
+
+    def test_expired_spare_is_discarded(self):
+        connect = FakeConnect()
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=1, max_idle=0.05)
+            await manager.warm_up(KEY, connect)
+            stale = connect.sockets[0]
+            await asyncio.sleep(0.1)
+            ws, _ = await manager.acquire(KEY, connect)
+            await asyncio.sleep(0)
+            await manager.close()
+            return manager, stale, ws
+
+        manager, stale, ws = asyncio.run(run())
+        self.assertIsNot(ws, stale)
+        self.assertTrue(stale.closed)
+        stats = manager.stats()
+        self.assertEqual(stats["discarded"], 1)
+        self.assertEqual(stats["warm_hits"], 0)
+
+    def test_closed_spare_is_discarded(self):
+        connect = FakeConnect()
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=1)
+            await manager.warm_up(KEY, connect)
+            connect.sockets[0].closed = True  # 服务端已关闭
+            ws, _ = await manager.acquire(KEY, connect)
+            await manager.close()
+            return manager, ws
+
+        manager, ws = asyncio.run(run())
+        self.assertIsNot(ws, connect.sockets[0])
+        self.assertEqual(manager.stats()["discarded"], 1)
+
+    def test_reconnect_backoff(self):
+        connect = FakeConnect(delay=0, failures=2)
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=0, backoff_base=0.05, backoff_max=0.08)
+            ws, _ = await manager.acquire(KEY, connect)
+            return manager, ws
+
+        manager, ws = asyncio.run(run())
+        self.assertTrue(ws.open)
+        # 第一次失败后等0.05秒，第二次翻倍但不超过 backoff_max
+        gaps = [b - a for a, b in zip(connect.calls, connect.calls[1:])]
+        self.assertGreaterEqual(gaps[0], 0.05 * 0.9)
+        self.assertGreaterEqual(gaps[1], 0.08 * 0.9)
+        self.assertLess(gaps[1], 0.1 * 0.9)
+        stats = manager.stats()
+        self.assertEqual(stats["handshake_failures"], 2)
+        self.assertEqual(stats["handshakes"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        connect = FakeConnect(delay=0, failures=10)
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=0, max_retries=2, backoff_base=0.001)
+            with self.assertRaises(ConnectionError):
+                await manager.acquire(KEY, connect)
+            return manager
+
+        manager = asyncio.run(run())
+        self.assertEqual(len(connect.calls), 3)
+        self.assertEqual(manager.stats()["handshake_failures"], 3)
+
+    def test_warm_hit_ratio(self):
+        connect = FakeConnect(delay=0.05)
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=1)
+            await manager.warm_up(KEY, connect)
+            await manager.acquire(KEY, connect)  # 命中备用连接
+            await manager.acquire(KEY, connect)  # 备用连接还在补充中，现场握手
+            await manager.refill_tasks[KEY]
+            await manager.acquire(KEY, connect)  # 补充完成，再次命中
+            await manager.acquire(KEY, connect)
+            await manager.close()
+            return manager
+
+        stats = asyncio.run(run()).stats()
+        self.assertEqual(stats["acquired"], 4)
+        self.assertEqual(stats["warm_hits"], 2)
+        self.assertEqual(stats["reuse_ratio"], 0.5)
+        self.assertGreater(stats["avg_handshake_ms"], 40)
+
+    def test_close(self):
+        connect = FakeConnect(delay=0.05)
+
+        async def run():
+            manager = AsrConnectionManager(warm_size=2)
+            await manager.warm_up(KEY, connect)
+            ws, _ = await manager.acquire(KEY, connect)
+            task = manager.refill_tasks[KEY]  # 正在补充备用连接
+            await manager.close()
+            await asyncio.sleep(0)
+            return manager, task, ws
+
+        manager, task, ws = asyncio.run(run())
+        self.assertTrue(task.cancelled())
+        self.assertEqual(manager.stats()["spares"], 0)
+        # 备用连接全部关闭，已经交出去的连接由使用方 release
+        self.assertTrue(connect.sockets[1].closed)
+        self.assertFalse(ws.closed)
+        self.assertEqual(len(connect.sockets), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+import unittest
+from asr_huoshan import AsrWsClient
+from protocol_codec import (
+    AUDIO_ONLY_REQUEST, FULL_SERVER_RESPONSE, GZIP, JSON, NEG_WITH_SEQUENCE, NO_SEQUENCE, POS_SEQUENCE,
+    SERVER_ERROR_RESPONSE, decode_frame, encode_frame, pack_header,
+)
+
+def server_result(text, sequence, last=False):
+    payload = gzip.compress(json.dumps({"result": {"text": text}}).encode())
+    return encode_frame(FULL_SERVER_RESPONSE, payload, NEG_WITH_SEQUENCE if last else POS_SEQUENCE,
+                        -sequence if last else sequence, JSON, GZIP)
+
+def server_error(code, message):
+    message = gzip.compress(json.dumps({"error": message}).encode())
+    return pack_header(SERVER_ERROR_RESPONSE, NO_SEQUENCE, JSON, GZIP) \
+        + code.to_bytes(4, 'big') + len(message).to_bytes(4, 'big') + message
+
+class FakeWebsocket:
+    """按识别协议应答：每收到一包音频返回一次中间结果，最后一包返回最终结果（已收到的字节数）"""
+    def __init__(self, error_after=None, final=True):
+        self.error_after = error_after
+        self.final = final
+        self.audio = []  # (序列号, 音频字节数, 是否最后一包)
+        self.responses = asyncio.Queue()
+        self.closed = False
+
+    async def send(self, data):
+        frame = decode_frame(data)
+        if frame.message_type != AUDIO_ONLY_REQUEST:
+            self.responses.put_nowait(server_result("", 1))
+            return
+        self.audio.append((frame.sequence, len(frame.decompressed()), frame.is_last))
+        received = sum(size for _, size, _ in self.audio)
+        if self.error_after is not None and len(self.audio) >= self.error_after:
+            self.responses.put_nowait(server_error(45000001, "quota exceeded"))
+        elif not frame.is_last:
+            self.responses.put_nowait(server_result(str(received), frame.sequence))
+        elif self.final:
+            self.responses.put_nowait(server_result(str(received), -frame.sequence, last=True))
+
+    async def recv(self):
+        return await self.responses.get()
+
+    async def close(self):
+        self.closed = True
+
+class FakeAsrClient(AsrWsClient):
+    def __init__(self, ws, connect_delay=0.02):
+        super().__init__(format="pcm", stream_seg_duration=200)
+        self.ws = ws
+        self.connect_delay = connect_delay
+        self.connects = 0
+
+    async def connect(self, reqid):
+        self.connects += 1
+        await asyncio.sleep(self.connect_delay)
+        return self.ws
+
+class TestAsrStreamSession(unittest.TestCase):
+    def test_batches_audio_and_returns_final(self):
+        ws = FakeWebsocket()
+
+        async def run():
+            session = FakeAsrClient(ws).open_stream()
+            # 连接还没建立时就开始推送，音频在队列中等待
+            for _ in range(20):
+                session.feed(bytes(640))
+            session.feed(bytes(320))
+            return await session.finish(timeout=1)
+
+        result = asyncio.run(run())
+        # 200ms = 6400字节一包，剩下的在最后一包发出
+        self.assertEqual(ws.audio, [(2, 6400, False), (3, 6400, False), (-4, 320, True)])
+        self.assertEqual(result["payload_msg"]["result"]["text"], "13120")
+        self.assertTrue(result["is_last_package"])
+        self.assertTrue(ws.closed)
+
+    def test_server_error(self):
+        ws = FakeWebsocket(error_after=1)
+
+        async def run():
+            session = FakeAsrClient(ws).open_stream()
+            session.feed(bytes(6400))
+            await asyncio.sleep(0.1)
+            session.feed(bytes(6400))
+            return await session.finish(timeout=1), session
+
+        result, session = asyncio.run(run())
+        self.assertIsNone(result)
+        self.assertIn("quota exceeded", str(session.error))
+        self.assertTrue(ws.closed)
+
+    def test_finish_timeout(self):
+        ws = FakeWebsocket(final=False)
+
+        async def run():
+            session = FakeAsrClient(ws).open_stream()
+            session.feed(bytes(640))
+            with self.assertRaises(asyncio.TimeoutError):
+                await session.finish(timeout=0.1)
+            return session
+
+        session = asyncio.run(run())
+        self.assertTrue(session.task.done())
+        self.assertTrue(ws.closed)
+
+    def test_close_during_connect(self):
+        ws = FakeWebsocket()
+
+        async def run():
+            client = FakeAsrClient(ws, connect_delay=10)
+            session = client.open_stream()
+            session.feed(bytes(640))
+            await asyncio.sleep(0.01)
+            await session.close()
+            return client, session
+
+        client, session = asyncio.run(run())
+        self.assertEqual(client.connects, 1)
+        self.assertTrue(session.task.cancelled())
+        self.assertIsNone(session.ws)
+        self.assertEqual(ws.audio, [])
+
+if __name__ == '__main__':
+    unittest.main()
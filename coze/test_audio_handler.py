@@ -0,0 +1,48 @@
+import unittest
+from audio_handler import AudioHandler, AudioBufferPool
+
+class TestAudioHandler(unittest.TestCase):
+    def test_capacity_limit(self):
+        # 超过最长录音时长的数据被丢弃
+        pool = AudioBufferPool(capacity=8)
+        handler = AudioHandler(pool)
+
+        self.assertEqual(handler.add_audio_data(b'123456'), 6)
+        self.assertEqual(handler.add_audio_data(b'abcd'), 2)
+        self.assertEqual(handler.add_audio_data(b'xy'), 0)
+        self.assertEqual(bytes(handler.get_audio_data()), b'123456ab')
+        self.assertEqual(handler.dropped_bytes, 4)
+        self.assertEqual(handler.stats(), {"buffered_bytes": 8, "memory_bytes": 8, "dropped_bytes": 4})
+
+    def test_buffer_reuse(self):
+        # 归还后的缓冲区被下一个会话复用，不再重新分配
+        pool = AudioBufferPool(capacity=16)
+        first = AudioHandler(pool)
+        self.assertEqual(first.memory_bytes, 0)  # 收到数据前不占内存
+        first.add_audio_data(b'hello')
+        buffer = first.audio_buffer
+        first.reset_buffer()
+        self.assertEqual(first.memory_bytes, 0)
+        self.assertEqual(first.total_bytes, 0)
+
+        second = AudioHandler(pool)
+        second.add_audio_data(b'hi')
+        self.assertIs(second.audio_buffer, buffer)
+        self.assertEqual(bytes(second.get_audio_data()), b'hi')
+        self.assertEqual(pool.stats()["allocated"], 1)
+        self.assertEqual(pool.stats()["reused"], 1)
+        self.assertEqual(pool.stats()["in_use"], 1)
+
+    def test_pool_max_free(self):
+        # 空闲缓冲区超过上限时直接释放
+        pool = AudioBufferPool(capacity=4, max_free=1)
+        handlers = [AudioHandler(pool) for _ in range(3)]
+        for handler in handlers:
+            handler.add_audio_data(b'1')
+        for handler in handlers:
+            handler.reset_buffer()
+        self.assertEqual(pool.stats()["free"], 1)
+        self.assertEqual(pool.stats()["reserved_bytes"], 4)
+
+if __name__ == '__main__':
+    unittest.main()
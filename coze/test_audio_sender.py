@@ -0,0 +1,89 @@
+import asyncio
+import time
+import unittest
+from audio_sender import AudioSender, PACKET_HEADER
+
+ADDR = ("127.0.0.1", 9000)
+
+def make_sender(sent):
+    # 8000 B/s，每包200字节音频 + 3字节包头，最多突发2包
+    return AudioSender(lambda packet, addr: sent.append((time.monotonic(), packet, addr)),
+                       sample_rate=8000, sample_width=1, speedup=1, chunk_size=200, burst_chunks=2)
+
+class TestAudioSender(unittest.TestCase):
+    def test_send_rate(self):
+        sent = []
+
+        async def run():
+            sender = make_sender(sent)
+            sender.start()
+            start = time.monotonic()
+            sender.enqueue(ADDR, bytes(2000))
+            while len(sent) < 10:
+                await asyncio.sleep(0.01)
+            await sender.stop()
+            return start, sender
+
+        start, sender = asyncio.run(run())
+        # 令牌桶初始400字节，剩下的 2030-400 字节按 8000 B/s 发出
+        elapsed = sent[-1][0] - start
+        self.assertGreaterEqual(elapsed, (2030 - 400) / 8000 * 0.9)
+        self.assertLess(elapsed, 0.5)
+        sequences = [PACKET_HEADER.unpack(packet[:3])[1] for _, packet, _ in sent]
+        self.assertEqual(sequences, list(range(10)))
+        self.assertTrue(all(addr == ADDR for _, _, addr in sent))
+        self.assertEqual(sender.stats()["bytes_sent"], 2030)
+
+    def test_cancel_drops_queued_audio(self):
+        sent = []
+
+        async def run():
+            sender = make_sender(sent)
+            sender.start()
+            sender.enqueue(ADDR, bytes(2000))
+            await asyncio.sleep(0.05)
+            dropped = sender.cancel(ADDR)
+            count = len(sent)
+            await asyncio.sleep(0.2)
+            await sender.stop()
+            return sender, dropped, count
+
+        sender, dropped, count = asyncio.run(run())
+        self.assertEqual(len(sent), count)
+        self.assertLess(count, 10)
+        self.assertEqual(dropped, 203 * (10 - count))
+        self.assertEqual(sender.pending_bytes(ADDR), 0)
+        stats = sender.stats()
+        self.assertEqual(stats["bytes_cancelled"], dropped)
+        self.assertEqual(stats["bytes_sent"] + dropped, 2030)
+        self.assertEqual(stats["active_streams"], 0)
+        self.assertEqual(sender.cancel(ADDR), 0)
+
+    def test_stats_lag(self):
+        sent = []
+        sender = make_sender(sent)
+        sender.enqueue(ADDR, bytes(1000))
+        self.assertEqual(sender.stats()["queued_bytes"], 1015)
+
+        # 晚1秒才开始发送：令牌桶满400字节，只够发1包
+        now = time.monotonic() + 1.0
+        next_wait = sender._drain(now)
+        stats = sender.stats()
+        self.assertEqual(stats["packets_sent"], 1)
+        self.assertEqual(stats["queued_bytes"], 1015 - 203)
+        self.assertAlmostEqual(next_wait, (203 - (400 - 203)) / 8000)
+        self.assertGreater(stats["max_lag_ms"], 900)
+        self.assertAlmostEqual(stats["avg_lag_ms"], stats["max_lag_ms"])
+
+        # 之后每秒补满一次令牌（400字节）只够再发1包，延迟越积越大，平均延迟小于最大延迟
+        for step in range(1, 5):
+            sender._drain(now + step)
+        stats = sender.stats()
+        self.assertEqual(stats["packets_sent"], 5)
+        self.assertEqual(stats["bytes_sent"], 1015)
+        self.assertEqual(stats["queued_bytes"], 0)
+        self.assertGreater(stats["max_lag_ms"], 4800)
+        self.assertLess(stats["avg_lag_ms"], stats["max_lag_ms"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from coze.database import create_sqlite_engine, init_db
+from coze.models import Conversation
+from coze.conversation_query import (TotalCache, count_conversations, decode_cursor, encode_cursor,
+                                     fetch_conversations)
+
+START = datetime(2024, 1, 1)
+
+class TestConversationQuery(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.engine = create_sqlite_engine(f"sqlite:///{os.path.join(self.dir.name, 'chat.db')}")
+        init_db(self.engine)
+        # 每两条记录时间相同，游标需要用id区分
+        rows = [{"user_id": i % 2, "message": str(i), "response": "", "emotion": "", "topic": "",
+                 "created_at": START + timedelta(minutes=i // 2)} for i in range(100)]
+        with self.engine.begin() as conn:
+            conn.execute(insert(Conversation), rows)
+        self.db = Session(self.engine)
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+        self.dir.cleanup()
+
+    def test_keyset_matches_offset(self):
+        by_offset = []
+        for page in range(1, 5):
+            by_offset += fetch_conversations(self.db, 0, page=page, page_size=15)[0]
+        by_cursor, cursor = [], None
+        while True:
+            items, cursor = fetch_conversations(self.db, 0, page_size=15, cursor=cursor)
+            by_cursor += items
+            if cursor is None:
+                break
+        self.assertEqual([c.id for c in by_cursor], [c.id for c in by_offset])
+        self.assertEqual(len(by_cursor), 50)
+        self.assertEqual(by_cursor[0].message, "98")
+
+    def test_date_range_and_cursor(self):
+        end = START + timedelta(minutes=10)
+        items, cursor = fetch_conversations(self.db, 1, START, end, page_size=5)
+        self.assertEqual([c.message for c in items], ["19", "17", "15", "13", "11"])
+        self.assertEqual(decode_cursor(cursor), (items[-1].created_at, items[-1].id))
+        self.assertEqual(decode_cursor(encode_cursor(items[0])), (items[0].created_at, items[0].id))
+        with self.assertRaises(ValueError):
+            decode_cursor("not-a-cursor")
+
+    def test_total_cached(self):
+        cache = TotalCache(ttl=60)
+        self.assertEqual(count_conversations(self.db, 0, cache=cache), 50)
+        self.db.execute(insert(Conversation), [{"user_id": 0, "created_at": START}])
+        self.assertEqual(count_conversations(self.db, 0, cache=cache), 50)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.ttl = 0
+        cache.put((0, None, None), 50)
+        self.assertEqual(count_conversations(self.db, 0, cache=cache), 51)
+
+    def test_index_used(self):
+        plan = self.db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM conversations WHERE user_id = 0 ORDER BY created_at DESC LIMIT 20"
+        )).all()
+        self.assertIn("ix_conversations_user_created", " ".join(row[-1] for row in plan))
+
+if __name__ == '__main__':
+    unittest.main()
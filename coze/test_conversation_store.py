@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from coze.database import Base
+from coze.models import Conversation
+from coze.conversation_store import ConversationWriter
+
+class TestConversationWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "chat.db")
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        Base.metadata.create_all(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.dir.cleanup()
+
+    def count(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(Conversation)).scalar()
+
+    def save_concurrently(self, writer, users=25, turns=10):
+        async def user(user_id):
+            for i in range(turns):
+                await writer.save(user_id, f"问题{i}", f"回答{i}", "happy", "study")
+                await asyncio.sleep(0)
+
+        async def run():
+            await asyncio.gather(*(user(u) for u in range(users)))
+            await writer.close()
+
+        asyncio.run(run())
+
+    def test_sync_engine_batches(self):
+        writer = ConversationWriter(self.engine, batch_size=100, flush_interval=0.01)
+        self.save_concurrently(writer)
+        self.assertEqual(self.count(), 250)
+        stats = writer.stats()
+        self.assertEqual((stats["written"], stats["dropped"]), (250, 0))
+        self.assertLess(stats["batches"], 10)
+        self.assertLessEqual(stats["max_batch"], 100)
+
+    def test_async_engine(self):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+        writer = ConversationWriter(async_engine, flush_interval=0.01)
+        self.save_concurrently(writer, users=5, turns=4)
+        asyncio.run(async_engine.dispose())
+        self.assertEqual(self.count(), 20)
+        with self.engine.connect() as conn:
+            row = conn.execute(select(Conversation.message, Conversation.emotion, Conversation.created_at)).first()
+        self.assertEqual((row.message, row.emotion), ("问题0", "happy"))
+        self.assertIsNotNone(row.created_at)
+
+    def test_failed_batch_dropped(self):
+        Base.metadata.drop_all(bind=self.engine)
+        writer = ConversationWriter(self.engine, flush_interval=0, retries=1)
+        self.save_concurrently(writer, users=1, turns=3)
+        stats = writer.stats()
+        self.assertEqual(stats["written"], 0)
+        self.assertEqual(stats["dropped"], 3)
+
+if __name__ == '__main__':
+    unittest.main()
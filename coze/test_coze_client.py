@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import re
+import time
+import unittest
+
+os.environ.setdefault("COZE_API_TOKEN", "test")
+
+import httpx
+from cozepy import AsyncCoze, TokenAuth, COZE_CN_BASE_URL
+
+import coze_client
+from tts_pipeline import SentencePipeline
+
+TOKENS = ["你好", "，我是", "小助手。"]
+
+def sse(event, data):
+    return f"event:{event}\ndata:{data}\n\n".encode()
+
+def delta(token):
+    return sse("conversation.message.delta", json.dumps({
+        "id": "m", "conversation_id": "conv-1", "bot_id": "b", "chat_id": "c", "role": "assistant",
+        "content": token, "content_type": "text", "type": "answer"}))
+
+async def slow_handler(request):
+    if request.url.path.endswith("/conversation/create"):
+        return httpx.Response(200, json={"code": 0, "msg": "", "data": {"id": "conv-1", "created_at": 1, "meta_data": {}}})
+
+    async def body():
+        # 模拟LLM每个token之间等待0.1秒
+        for token in TOKENS:
+            await asyncio.sleep(0.1)
+            yield delta(token)
+        yield sse("done", "")
+
+    return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+
+class TestAsyncChatStream(unittest.TestCase):
+    def setUp(self):
+        http_client = coze_client.StreamTrackingHTTPClient(transport=httpx.MockTransport(slow_handler))
+        coze_client._async_http_client = http_client
+        coze_client._async_coze = AsyncCoze(auth=TokenAuth("test"), base_url=COZE_CN_BASE_URL, http_client=http_client)
+
+    def test_stream_does_not_block_loop(self):
+        async def ticker(stop):
+            # 模拟其他设备的音频处理：每10ms运行一次，记录最长的停顿
+            longest = 0.0
+            last = time.monotonic()
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                longest = max(longest, now - last)
+                last = now
+            return longest
+
+        async def run():
+            stop = asyncio.Event()
+            tick = asyncio.ensure_future(ticker(stop))
+            conversation_id = await coze_client.async_create_conversation_id()
+            tokens = [token async for token in coze_client.async_chat_stream("b", "1", "hi", conversation_id)]
+            stop.set()
+            longest = await tick
+            await coze_client.close_async_coze()
+            return conversation_id, tokens, longest
+
+        conversation_id, tokens, longest = asyncio.run(run())
+        self.assertEqual(conversation_id, "conv-1")
+        self.assertEqual(tokens, TOKENS)
+        self.assertLess(longest, 0.05)
+        self.assertIsNone(coze_client._async_coze)
+
+async def start_sse_server(tokens, delay, stopped=None):
+    """本地HTTP服务：每个请求按chunked编码逐个发送token，支持keep-alive；客户端中途断开时记录到 stopped"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(re.search(rb"content-length: *(\d+)", head, re.I).group(1))
+                await reader.readexactly(length)
+                writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\n"
+                             b"transfer-encoding: chunked\r\n\r\n")
+                for chunk in [delta(token) for token in tokens] + [sse("done", "")]:
+                    if reader.at_eof():
+                        if stopped is not None:
+                            stopped.append(True)  # 停止生成
+                        return
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+                    await asyncio.sleep(delay)
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+class TestAbortedStream(unittest.TestCase):
+    def test_abort_releases_connection(self):
+        tokens = [f"第{i}段" for i in range(20)]
+
+        async def run():
+            server = await start_sse_server(tokens, 0.02)
+            port = server.sockets[0].getsockname()[1]
+            # 连接池只有一个连接：放弃的流没有关闭响应时，后面的请求会一直等连接
+            http_client = coze_client.StreamTrackingHTTPClient(
+                limits=httpx.Limits(max_connections=1), timeout=httpx.Timeout(5.0))
+            coze_client._async_http_client = http_client
+            coze_client._async_coze = AsyncCoze(auth=TokenAuth("test"), base_url=f"http://127.0.0.1:{port}",
+                                                http_client=http_client)
+            try:
+                for _ in range(2):
+                    # 和设备打断时一样：读到第一段就关闭
+                    stream = coze_client.async_chat_stream("b", "1", "hi")
+                    self.assertEqual(await stream.__anext__(), tokens[0])
+                    await stream.aclose()
+                return [token async for token in coze_client.async_chat_stream("b", "1", "hi")]
+            finally:
+                await coze_client.close_async_coze()
+                server.close()
+
+        # 连接泄漏时第二次请求就会一直等待
+        self.assertEqual(asyncio.run(asyncio.wait_for(run(), 5)), tokens)
+
+    def test_pipeline_barge_in_releases_connection(self):
+        # 和 socket_server 的打断一样：回复进行中取消 SentencePipeline，之后的对话仍然能拿到连接
+        tokens = [f"第{i}句话来了。" for i in range(20)]
+
+        class SlowTTS:
+            async def query_tts(self, text, audio_callback):
+                await asyncio.sleep(0.05)
+                audio_callback(text.encode())
+
+        stopped = []
+
+        async def run():
+            server = await start_sse_server(tokens, 0.02, stopped)
+            port = server.sockets[0].getsockname()[1]
+            http_client = coze_client.StreamTrackingHTTPClient(
+                limits=httpx.Limits(max_connections=1), timeout=httpx.Timeout(5.0))
+            coze_client._async_http_client = http_client
+            coze_client._async_coze = AsyncCoze(auth=TokenAuth("test"), base_url=f"http://127.0.0.1:{port}",
+                                                http_client=http_client)
+            try:
+                for _ in range(2):
+                    pipeline = SentencePipeline(SlowTTS(), lambda chunk: None)
+                    task = asyncio.ensure_future(pipeline.run(coze_client.async_chat_stream("b", "1", "hi")))
+                    await asyncio.sleep(0.1)
+                    task.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await task
+                    self.assertTrue(pipeline.llm_aborted)
+                played = []
+                stats = await SentencePipeline(SlowTTS(), played.append).run(
+                    coze_client.async_chat_stream("b", "1", "hi"))
+                return stats, played
+            finally:
+                await coze_client.close_async_coze()
+                server.close()
+
+        stats, played = asyncio.run(asyncio.wait_for(run(), 10))
+        self.assertFalse(stats["cancelled"])
+        self.assertEqual(len(stopped), 2)  # 两次打断服务端都停止了输出
+        self.assertEqual(b"".join(played).decode(), "".join(tokens))
+
+if __name__ == '__main__':
+    unittest.main()
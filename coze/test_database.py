@@ -0,0 +1,45 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from sqlalchemy import text
+from coze.database import create_async_sqlite_engine, create_sqlite_engine, sqlite_pragmas
+
+class TestSqliteProfile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def pragmas(self, engine):
+        with engine.connect() as conn:
+            return [conn.execute(text(f"PRAGMA {name}")).scalar()
+                    for name in ("journal_mode", "synchronous", "busy_timeout")]
+
+    def test_wal_profile(self):
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(self.dir.name, 'wal.db')}", "wal")
+        self.assertEqual(self.pragmas(engine), ["wal", 1, 5000])  # synchronous: 1 = NORMAL
+        self.assertEqual(engine.pool.size(), 10)
+        engine.dispose()
+
+    def test_legacy_profile(self):
+        self.assertEqual(sqlite_pragmas("legacy"), [])
+        engine = create_sqlite_engine(f"sqlite:///{os.path.join(self.dir.name, 'legacy.db')}", "legacy")
+        self.assertEqual(self.pragmas(engine)[:2], ["delete", 2])  # 回滚日志, synchronous=FULL
+        engine.dispose()
+
+    def test_async_engine_pooled(self):
+        engine = create_async_sqlite_engine(f"sqlite+aiosqlite:///{os.path.join(self.dir.name, 'async.db')}", "wal")
+
+        async def run():
+            async with engine.connect() as conn:
+                mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            await engine.dispose()
+            return mode
+
+        self.assertEqual(asyncio.run(run()), "wal")
+        self.assertEqual(engine.pool.size(), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import time
+import unittest
+from gateway_launcher import GatewaySupervisor, merge_stats, _Worker
+
+class FakeProcess:
+    def is_alive(self):
+        return True
+
+class TestMergeStats(unittest.TestCase):
+    def test_merge(self):
+        a = {"pid": 1, "packets": 10, "memory": {"sessions": 3, "max_session_bytes": 100},
+             "audio_sender": {"avg_lag_ms": 2.0}, "tts_pool": {"connections": [{"index": 0}]}}
+        b = {"pid": 2, "packets": 5, "memory": {"sessions": 1, "max_session_bytes": 300},
+             "audio_sender": {"avg_lag_ms": 4.0}, "tts_pool": {"connections": []}}
+        merged = merge_stats([a, b])
+        self.assertEqual(merged["packets"], 15)
+        self.assertNotIn("pid", merged)
+        self.assertEqual(merged["memory"], {"sessions": 4, "max_session_bytes": 300})
+        self.assertEqual(merged["audio_sender"]["avg_lag_ms"], 3.0)
+        self.assertEqual(merged["tts_pool"], {})
+
+    def test_timestamps_not_summed(self):
+        now = time.time()
+        snapshots = [{"pid": 1, "packets": 10, "reported_at": now - 1}, {"pid": 2, "packets": 5, "reported_at": now}]
+        self.assertEqual(merge_stats(snapshots), {"packets": 15})
+
+        supervisor = GatewaySupervisor(workers=2)
+        for index, snapshot in enumerate(snapshots):
+            worker = supervisor.workers[index] = _Worker(index, FakeProcess(), None)
+            worker.snapshot = snapshot
+        metrics = supervisor.metrics()
+        self.assertEqual(metrics["total"], {"packets": 15})
+        self.assertLess(metrics["workers"][0]["age_s"], 5)
+        self.assertIn("reported_at", snapshots[0])  # 原始快照不被修改
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import random
+import unittest
+import numpy as np
+from jitter_buffer import JitterBuffer, CONCEAL_ZERO
+
+def packet(value, samples=4):
+    return np.full(samples, value, dtype=np.int16).tobytes()
+
+def values(chunks):
+    return [int(np.frombuffer(chunk, dtype=np.int16)[0]) for chunk in chunks]
+
+class TestJitterBuffer(unittest.TestCase):
+    def test_in_order(self):
+        # 按序到达的包立即输出
+        jb = JitterBuffer()
+        for seq in range(5):
+            self.assertEqual(values(jb.push(seq, packet(seq * 100))), [seq * 100])
+        self.assertEqual(jb.stats()["lost"], 0)
+
+    def test_reorder(self):
+        # 窗口内乱序的包排好后输出
+        jb = JitterBuffer(window=4)
+        out = []
+        for seq in [0, 2, 3, 1, 4]:
+            out += jb.push(seq, packet(seq * 100))
+        self.assertEqual(values(out), [0, 100, 200, 300, 400])
+        self.assertEqual(jb.stats()["reordered"], 2)
+        self.assertEqual(jb.stats()["lost"], 0)
+
+    def test_loss_interpolated(self):
+        # 等不到的包用前后包之间的线性插值补齐
+        jb = JitterBuffer(window=2)
+        out = jb.push(0, packet(0))
+        for seq in [2, 3, 4]:
+            out += jb.push(seq, packet(800))
+        self.assertEqual(len(out), 5)
+        concealed = np.frombuffer(out[1], dtype=np.int16)
+        self.assertTrue(np.all(np.diff(concealed) > 0))
+        self.assertTrue(0 < concealed[0] and concealed[-1] < 800)
+        self.assertEqual(jb.stats()["lost"], 1)
+
+        # 迟到的包被丢弃
+        self.assertEqual(jb.push(1, packet(100)), [])
+        self.assertEqual(jb.stats()["late"], 1)
+
+    def test_zero_fill_and_flush(self):
+        jb = JitterBuffer(window=8, conceal=CONCEAL_ZERO)
+        out = jb.push(10, packet(5))
+        out += jb.push(13, packet(5))
+        self.assertEqual(len(out), 1)  # 13在窗口内，等待11、12
+        out += jb.flush()
+        self.assertEqual(values(out), [5, 0, 0, 5])
+
+    def test_wraparound_and_duplicates(self):
+        jb = JitterBuffer(window=4)
+        out = []
+        for seq in [65534, 0, 0, 65535, 1, 65535]:
+            out += jb.push(seq, packet(seq % 7))
+        self.assertEqual(values(out), [65534 % 7, 65535 % 7, 0, 1])
+        self.assertEqual(jb.stats()["duplicates"], 1)
+        self.assertEqual(jb.stats()["late"], 1)  # 已经输出过的包再次到达
+
+    def test_resync(self):
+        # 设备重新从0计数时不当作迟到包丢弃
+        jb = JitterBuffer(window=4)
+        for seq in range(100, 130):
+            jb.push(seq, packet(1))
+        self.assertEqual(values(jb.push(0, packet(2))), [2])
+        self.assertEqual(jb.stats()["resyncs"], 1)
+
+    def test_lossy_network(self):
+        # 随机乱序和丢包后输出长度和顺序仍然正确
+        rng = random.Random(0)
+        sequences = [seq for seq in range(1000) if rng.random() > 0.05]
+        for i in range(1, len(sequences) - 3, 7):
+            sequences[i], sequences[i + 2] = sequences[i + 2], sequences[i]
+        jb = JitterBuffer(window=8)
+        out = []
+        for seq in sequences:
+            out += jb.push(seq, packet(seq % 1000 + 1000))
+        out += jb.flush()
+        last = max(sequences)
+        self.assertEqual(len(out), last + 1)
+        received = set(sequences)
+        self.assertEqual([v - 1000 for v, i in zip(values(out), range(last + 1)) if i in received],
+                         sorted(received))
+        stats = jb.stats()
+        self.assertEqual(stats["lost"], last + 1 - len(received))
+        self.assertAlmostEqual(stats["loss_ratio"], stats["lost"] / (last + 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import wave
+from prompt_audio import PromptLibrary, wav_pcm_view
+
+PCM = bytes(range(256)) * 64
+
+def write_wav(path, pcm, rate=16000):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+
+class FakeTTS:
+    def __init__(self):
+        self.texts = []
+
+    async def query_tts(self, text, audio_callback=None):
+        self.texts.append(text)
+        if "失败" in text:
+            raise ConnectionError("tts down")
+        audio_callback(memoryview(text.encode() * 10))
+
+class TestPromptLibrary(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        write_wav(os.path.join(self.dir.name, "wait.wav"), PCM)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_wav_view(self):
+        with open(os.path.join(self.dir.name, "wait.wav"), "rb") as f:
+            view, fmt = wav_pcm_view(f.read())
+        self.assertEqual(bytes(view), PCM)
+        self.assertEqual(fmt, (1, 16000, 2))
+        self.assertEqual(bytes(wav_pcm_view(b"raw pcm")[0]), b"raw pcm")
+
+    def test_load_zero_copy(self):
+        library = PromptLibrary(self.dir.name, prompts={"wait": "请稍等"}, phrases=[])
+        self.assertEqual(library.load(), 1)
+        first, second = library.get("wait"), library.get("wait")
+        self.assertEqual(bytes(first), PCM)
+        self.assertTrue(first.readonly)
+        # 每个会话拿到的是同一块映射内存，不是副本
+        self.assertIs(first.obj, second.obj)
+        self.assertIsNone(library.get("missing"))
+        library.close()
+
+    def test_prefetch_missing_prompts_and_phrases(self):
+        tts = FakeTTS()
+        library = PromptLibrary(self.dir.name, prompts={"wait": "请稍等", "error": "出错了"},
+                                phrases=["常用句子", "会失败的句子"])
+        library.load()
+        self.assertEqual(asyncio.run(library.prefetch(tts)), 2)
+        # 已经有wav文件的提示音不再合成
+        self.assertEqual(sorted(tts.texts), sorted(["出错了", "常用句子", "会失败的句子"]))
+        self.assertEqual(bytes(library.get("error")), "出错了".encode() * 10)
+        stats = library.stats()
+        self.assertEqual(stats["prompts"]["wait"]["source"], "file")
+        self.assertEqual(stats["prompts"]["error"]["source"], "tts")
+        self.assertEqual(stats["prefetch_failed"], 1)
+        library.close()
+
+if __name__ == '__main__':
+    unittest.main()
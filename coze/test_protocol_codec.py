@@ -0,0 +1,105 @@
+import gzip
+import json
+import sys
+import unittest
+import zlib
+
+from protocol_codec import (
+    AUDIO_ONLY_REQUEST, AUDIO_ONLY_RESPONSE, FULL_CLIENT_REQUEST, FULL_SERVER_RESPONSE,
+    SERVER_ERROR_RESPONSE, CompressionPolicy, GZIP, NO_COMPRESSION, NO_SERIALIZATION, JSON,
+    NEG_WITH_SEQUENCE, NO_SEQUENCE, POS_SEQUENCE,
+    compress, decode_frame, encode_audio_only_request, encode_frame, encode_full_client_request, pack_header,
+)
+
+
+class TestProtocolCodec(unittest.TestCase):
+    def test_header_layout(self):
+        # 与TTS原来写死的默认头一致
+        self.assertEqual(pack_header(FULL_CLIENT_REQUEST, NO_SEQUENCE, JSON, GZIP), b'\x11\x10\x11\x00')
+        self.assertEqual(pack_header(AUDIO_ONLY_REQUEST, NEG_WITH_SEQUENCE, NO_SERIALIZATION, GZIP),
+                         b'\x11\x23\x01\x00')
+
+    def test_full_client_request_round_trip(self):
+        request = {"user": {"uid": "test"}, "audio": {"format": "pcm"}}
+        frame = decode_frame(encode_full_client_request(request, sequence=1))
+        self.assertEqual(frame.message_type, FULL_CLIENT_REQUEST)
+        self.assertEqual(frame.sequence, 1)
+        self.assertEqual(frame.decode_payload(), request)
+
+    def test_full_client_request_without_sequence(self):
+        data = encode_full_client_request({"text": "你好"})
+        self.assertEqual(data[:4], b'\x11\x10\x11\x00')
+        size = int.from_bytes(data[4:8], 'big')
+        self.assertEqual(json.loads(gzip.decompress(data[8:8 + size])), {"text": "你好"})
+
+    def test_audio_only_request(self):
+        chunk = bytes(range(256)) * 4
+        frame = decode_frame(encode_audio_only_request(chunk, -5, last=True))
+        self.assertTrue(frame.is_last)
+        self.assertEqual(frame.sequence, -5)
+        self.assertEqual(frame.decode_payload(), chunk)
+
+        frame = decode_frame(encode_audio_only_request(chunk, 2, compression=NO_COMPRESSION))
+        self.assertFalse(frame.is_last)
+        self.assertEqual(frame.compression, NO_COMPRESSION)
+        # 不压缩时payload直接是原始消息的视图
+        self.assertIsInstance(frame.payload, memoryview)
+        self.assertEqual(bytes(frame.payload), chunk)
+
+    def test_server_response(self):
+        payload = gzip.compress(json.dumps({"result": {"text": "你好"}}).encode())
+        data = encode_frame(FULL_SERVER_RESPONSE, payload, NEG_WITH_SEQUENCE, -3, JSON, GZIP)
+        frame = decode_frame(data)
+        self.assertTrue(frame.is_last)
+        self.assertEqual(frame.sequence, -3)
+        self.assertEqual(frame.decode_payload()["result"]["text"], "你好")
+
+    def test_error_response(self):
+        message = gzip.compress("quota exceeded".encode())
+        data = pack_header(SERVER_ERROR_RESPONSE, NO_SEQUENCE, JSON, GZIP) \
+            + (45000001).to_bytes(4, 'big') + len(message).to_bytes(4, 'big') + message
+        frame = decode_frame(data)
+        self.assertTrue(frame.is_error)
+        self.assertEqual(frame.code, 45000001)
+        self.assertEqual(frame.decompressed(), b"quota exceeded")
+
+    def test_tts_audio_response(self):
+        audio = bytes(1000)
+        header = pack_header(AUDIO_ONLY_RESPONSE, POS_SEQUENCE, NO_SERIALIZATION, NO_COMPRESSION)
+        frame = decode_frame(header + (7).to_bytes(4, 'big', signed=True) + len(audio).to_bytes(4, 'big') + audio)
+        self.assertEqual(frame.sequence, 7)
+        self.assertEqual(len(frame.payload), 1000)
+
+        # 不带标志位的音频响应只是ACK
+        ack = decode_frame(pack_header(AUDIO_ONLY_RESPONSE, NO_SEQUENCE, NO_SERIALIZATION, NO_COMPRESSION))
+        self.assertIsNone(ack.payload)
+
+    def test_compression_policy(self):
+        chunk = bytes(range(256)) * 8
+        policy = CompressionPolicy.from_names(audio="none")
+        frame = decode_frame(policy.encode_audio_only_request(chunk, 2))
+        self.assertEqual(frame.compression, NO_COMPRESSION)
+        self.assertEqual(frame.payload_size, len(chunk))
+        # 请求帧仍然按gzip压缩
+        frame = decode_frame(policy.encode_full_client_request({"a": 1}))
+        self.assertEqual(frame.compression, GZIP)
+        self.assertEqual(frame.decode_payload(), {"a": 1})
+
+        policy = CompressionPolicy.from_names(audio="gzip", audio_level=1)
+        frame = decode_frame(policy.encode_audio_only_request(chunk, -3, last=True))
+        self.assertEqual(frame.compression, GZIP)
+        self.assertEqual(frame.decompressed(), chunk)
+
+    def test_gzip_compress(self):
+        payload = json.dumps({"text": "你好" * 50}).encode()
+        for level in (1, 6, 9):
+            data = compress(payload, GZIP, level)
+            self.assertEqual(gzip.decompress(data), payload)
+            if sys.version_info >= (3, 11):
+                # 和 3.11 起支持的 zlib.compress(payload, level, wbits) 输出相同
+                self.assertEqual(data, zlib.compress(payload, level, 16 + zlib.MAX_WBITS))
+        self.assertIs(compress(payload, NO_COMPRESSION), payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import wave
+from recording_archiver import RecordingArchiver
+
+class TestRecordingArchiver(unittest.TestCase):
+    def test_archive_writes_wav(self):
+        audio = bytes(range(256)) * 25
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, "audio_files")
+            archiver = RecordingArchiver(directory)
+
+            async def run():
+                # 直接传入内存中的录音缓冲区，写完之前不能修改
+                buffer = bytearray(audio)
+                return await archiver.archive("recording.wav", memoryview(buffer))
+
+            filepath = asyncio.run(run())
+            archiver.close()
+            self.assertEqual(filepath, os.path.join(directory, "recording.wav"))
+            with wave.open(filepath, 'rb') as wav_file:
+                self.assertEqual(wav_file.getnchannels(), 1)
+                self.assertEqual(wav_file.getsampwidth(), 2)
+                self.assertEqual(wav_file.getframerate(), 16000)
+                self.assertEqual(wav_file.readframes(wav_file.getnframes()), audio)
+            self.assertEqual(archiver.archived, 1)
+            self.assertEqual(archiver.pending, 0)
+
+    def test_drops_when_backlogged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archiver = RecordingArchiver(tmp, max_pending=1)
+
+            async def run():
+                first = archiver.archive("a.wav", bytes(320))
+                second = archiver.archive("b.wav", bytes(320))
+                await first
+                return second
+
+            self.assertIsNone(asyncio.run(run()))
+            archiver.close()
+            self.assertEqual(archiver.dropped, 1)
+            self.assertEqual(archiver.archived, 1)
+            self.assertEqual(os.listdir(tmp), ["a.wav"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
+import asyncio
 import unittest
-from ringbuffer import RingBuffer
+from ringbuffer import RingBuffer, AsyncRingBuffer, OVERWRITE
 
 class TestRingBuffer(unittest.TestCase):
     def test_basic_operations(self):
@@ -52,5 +53,50 @@ class TestRingBuffer(unittest.TestCase):
         result = rb.read(1)
         self.assertEqual(len(result), 0)  # 应该返回空bytearray
 
+    def test_readinto_and_views(self):
+        # 测试零拷贝读取：环绕后views返回两段
+        rb = RingBuffer(8)
+        rb.write(b'123456')
+        rb.read(4)
+        rb.write(b'abcd')
+        first, second = rb.views()
+        self.assertEqual(bytes(first) + bytes(second), b'56abcd')
+        self.assertEqual(bytes(second), b'cd')
+        self.assertEqual(rb.available, 6)  # views不移动读指针
+
+        out = bytearray(4)
+        self.assertEqual(rb.readinto(out), 4)
+        self.assertEqual(out, bytearray(b'56ab'))
+        self.assertEqual(rb.read(8), bytearray(b'cd'))
+
+    def test_overwrite_policy(self):
+        # 测试覆盖最旧数据
+        rb = RingBuffer(4, policy=OVERWRITE)
+        rb.write(b'1234')
+        self.assertEqual(rb.write(b'56'), 2)
+        self.assertEqual(rb.read(4), bytearray(b'3456'))
+        self.assertEqual(rb.overwritten, 2)
+
+        # 比缓冲区还大的数据只保留最后部分
+        rb.write(b'abcdefg')
+        self.assertEqual(rb.read(8), bytearray(b'defg'))
+
+    def test_async_backpressure(self):
+        # 测试异步等待：生产者写满后等待，消费者凑够字节再读
+        async def run():
+            rb = AsyncRingBuffer(4)
+            data = bytes(range(10))
+
+            async def produce():
+                await rb.write_all(data)
+                rb.close()
+
+            producer = asyncio.ensure_future(produce())
+            chunks = [await rb.read_exactly(3) for _ in range(4)]
+            await producer
+            return b''.join(chunks)
+
+        self.assertEqual(asyncio.run(run()), bytes(range(10)))
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,46 @@
+import unittest
+from sentence_segmenter import SentenceSegmenter
+
+def segment(tokens, **kwargs):
+    segmenter = SentenceSegmenter(**kwargs)
+    out = []
+    for token in tokens:
+        out += segmenter.feed(token)
+    return out + segmenter.flush()
+
+class TestSentenceSegmenter(unittest.TestCase):
+    def test_first_chunk_short_then_longer(self):
+        # 第一段3个字以上就断开，之后的弱断句要12个字以上
+        tokens = ["你好", "呀，", "今天", "天气", "不错，", "我们", "去公园", "玩吧，", "好不好", "？"]
+        self.assertEqual(segment(tokens), ["你好呀，", "今天天气不错，我们去公园玩吧，", "好不好？"])
+
+    def test_strong_break_and_closing_quote(self):
+        tokens = ["他说：", "“我", "来了！", "”然后", "走了……", "再见"]
+        self.assertEqual(segment(tokens, first_min_length=2),
+                         ["他说：", "“我来了！”", "然后走了……", "再见"])
+
+    def test_numbers_not_split(self):
+        tokens = ["圆周率是3", ".", "14，", "价格是1", ",000元", "。时间12", ":30. Bye"]
+        self.assertEqual(segment(tokens, min_length=4),
+                         ["圆周率是3.14，", "价格是1,000元。", "时间12:30.", " Bye"])
+
+    def test_pending_ascii_period_waits_for_next_token(self):
+        segmenter = SentenceSegmenter()
+        self.assertEqual(segmenter.feed("The value is 3."), [])
+        self.assertEqual(segmenter.feed("5 now. "), ["The value is 3.5 now."])
+        self.assertEqual(segmenter.flush(), [])
+
+    def test_max_length_forced(self):
+        text = "这是一段" + "没有标点" * 10 + " 然后继续说很多很多的话"
+        out = segment([text[i:i + 3] for i in range(0, len(text), 3)], max_length=20)
+        self.assertEqual("".join(out), text)
+        self.assertTrue(all(len(s) <= 20 for s in out))
+        self.assertGreater(len(out), 2)
+
+    def test_flush_whitespace_only(self):
+        segmenter = SentenceSegmenter()
+        segmenter.feed("  ")
+        self.assertEqual(segmenter.flush(), [])
+
+if __name__ == '__main__':
+    unittest.main()
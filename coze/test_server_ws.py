@@ -0,0 +1,28 @@
+import os
+import unittest
+from ws_frames import FORMAT_BINARY, FRAME_AUDIO, encode_binary, hello_message
+
+os.environ.setdefault("COZE_API_TOKEN", "test")
+
+try:
+    import server
+    from fastapi.testclient import TestClient
+except ImportError as e:  # asrclient 需要 aiohttp，tts_cosyvoice 需要 pyaudio
+    server = None
+    SKIP_REASON = f"server.py 的依赖没有安装: {e}"
+else:
+    SKIP_REASON = ""
+
+@unittest.skipIf(server is None, SKIP_REASON)
+class TestWebsocketFrames(unittest.TestCase):
+    def test_short_binary_frame_does_not_close_session(self):
+        client = TestClient(server.app)
+        with client.websocket_connect("/ws") as ws:
+            ws.send_bytes(b"\x01")  # 比帧头还短
+            ws.send_bytes(encode_binary(FRAME_AUDIO, 1, b"\x00\x00" * 320))
+            # 会话还在：出错时服务端会先发 {"type": "error"} 再关闭连接
+            ws.send_json({"type": "hello", "audio_format": FORMAT_BINARY})
+            self.assertEqual(ws.receive_json(), hello_message(FORMAT_BINARY))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from audio_handler import AudioHandler, AudioBufferPool
+from session_table import SessionTable, _shard_of
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeSession:
+    """和socket_server.ClientSession一样持有录音缓冲区"""
+    def __init__(self, addr, clock, pool):
+        self.addr = addr
+        self.clock = clock
+        self.last_active = clock()
+        self.audio_handler = AudioHandler(pool)
+        self.busy = False
+        self.closed = False
+
+    def feed(self, data):
+        self.last_active = self.clock()
+        self.audio_handler.add_audio_data(data)
+
+    def is_busy(self):
+        return self.busy
+
+    def close(self):
+        self.closed = True
+        self.audio_handler.reset_buffer()
+
+class TestSessionTable(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = AudioBufferPool(capacity=1024, max_free=4)
+
+    def make_table(self, **kwargs):
+        return SessionTable(lambda addr: FakeSession(addr, self.clock, self.pool),
+                            clock=self.clock, **kwargs)
+
+    def test_idle_reap(self):
+        # 空闲超时的会话被回收，正在处理对话的会话保留
+        table = self.make_table(idle_timeout=60, shards=4)
+        for port in range(10):
+            table.get_or_create(('10.0.0.1', port)).feed(b'pcm')
+        busy = table.get(('10.0.0.1', 3))
+        busy.busy = True
+        self.clock.now += 30
+        table.get_or_create(('10.0.0.1', 5)).feed(b'pcm')
+
+        self.clock.now += 40
+        self.assertEqual(table.reap(), 8)
+        self.assertEqual(sorted(addr[1] for addr in table), [3, 5])
+        self.assertEqual(self.pool.in_use, 2)
+
+    def test_lru_cap(self):
+        # 超过容量时淘汰最久未活跃的空闲会话
+        evicted = []
+        table = self.make_table(max_sessions=3, on_evict=lambda addr, session: evicted.append(addr[1]))
+        for port in range(3):
+            table.get_or_create(('10.0.0.1', port))
+            self.clock.now += 1
+        table.get(('10.0.0.1', 0)).busy = True
+        table.get_or_create(('10.0.0.1', 1))  # 1变为最近活跃
+        table.get(('10.0.0.1', 1)).last_active = self.clock.now
+
+        table.get_or_create(('10.0.0.1', 3))
+        self.assertEqual(evicted, [2])
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.stats()["evicted"], 1)
+
+    def test_shard_of_stable(self):
+        addr = ('192.168.1.20', 40000)
+        self.assertEqual(_shard_of(addr, 8), _shard_of(addr, 8))
+        self.assertEqual(_shard_of(addr, 1), 0)
+        shards = {_shard_of(('192.168.1.20', port), 8) for port in range(1000)}
+        self.assertEqual(shards, set(range(8)))
+
+    def test_memory_over_time(self):
+        # 模拟一天的NAT端口变化：每分钟100个设备换一次端口，结束标记有时丢失。
+        # 会话数和录音缓冲区占用应保持在上限内，不随时间增长
+        table = self.make_table(idle_timeout=300, max_sessions=500, shards=8)
+        peak_sessions = peak_buffers = 0
+        for minute in range(24 * 60):
+            for device in range(100):
+                session = table.get_or_create((f'10.0.{device}.1', 20000 + minute))
+                session.feed(bytes(640))
+                if device % 10:  # 每10个设备有1个结束标记丢失，缓冲区一直被占用
+                    session.audio_handler.reset_buffer()
+            self.clock.now += 60
+            table.reap(minute % 8)
+            peak_sessions = max(peak_sessions, len(table))
+            peak_buffers = max(peak_buffers, self.pool.in_use)
+
+        self.assertEqual(table.stats()["created"], 24 * 60 * 100)
+        self.assertLessEqual(peak_sessions, 500)
+        # 只有还没回收的会话（丢失结束标记的那部分）占用缓冲区
+        self.assertLessEqual(peak_buffers, 500 // 10 + 10)
+        self.assertLessEqual(self.pool.stats()["reserved_bytes"], (peak_buffers + 4) * 1024)
+
+        table.close()
+        self.assertEqual(len(table), 0)
+        self.assertEqual(self.pool.in_use, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from tts_cache import CachedTTS, TTSCache, cache_key
+
+class FakeTTS:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    async def query_tts(self, text, audio_callback=None, voice_type="v1"):
+        self.calls += 1
+        for i in range(4):
+            audio_callback(memoryview(bytes([i]) * 5000))
+            if self.fail and i == 1:
+                raise ConnectionError("tts down")
+
+class TestTTSCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def query(self, tts, text, voice_type="v1"):
+        chunks = []
+        asyncio.run(tts.query_tts(text, chunks.append, voice_type=voice_type))
+        return b"".join(bytes(c) for c in chunks), len(chunks)
+
+    def test_key_normalized(self):
+        self.assertEqual(cache_key(" ＯＫ，请稍等  一下。 "), cache_key("OK,请稍等 一下。"))
+        self.assertNotEqual(cache_key("好的", "v1"), cache_key("好的", "v2"))
+        self.assertNotEqual(cache_key("好的", speed_ratio=1.2), cache_key("好的"))
+
+    def test_memory_and_disk_hits(self):
+        fake = FakeTTS()
+        tts = CachedTTS(fake, TTSCache(disk_dir=self.dir.name), replay_chunk=6400)
+        audio, _ = self.query(tts, "好的，请稍等。")
+        cached, chunks = self.query(tts, "好的，请稍等。")
+        self.assertEqual(cached, audio)
+        self.assertEqual(chunks, 4)  # 20000字节按6400分块重放
+        self.assertEqual(fake.calls, 1)
+        self.query(tts, "好的，请稍等。", voice_type="v2")
+        self.assertEqual(fake.calls, 2)
+
+        # 新进程（新的内存层）从磁盘读取
+        tts = CachedTTS(fake, TTSCache(disk_dir=self.dir.name))
+        self.assertEqual(self.query(tts, "好的，请稍等。")[0], audio)
+        self.assertEqual(fake.calls, 2)
+        stats = tts.stats()
+        self.assertEqual((stats["disk_hits"], stats["misses"], stats["disk_entries"]), (1, 0, 2))
+
+    def test_failure_and_long_text_not_cached(self):
+        fake = FakeTTS(fail=True)
+        tts = CachedTTS(fake, TTSCache(disk_dir=None), max_text_length=10)
+        with self.assertRaises(ConnectionError):
+            self.query(tts, "你好")
+        self.assertEqual(tts.stats()["stores"], 0)
+
+        fake.fail = False
+        self.query(tts, "这是一句超过十个字的很长的回复")
+        self.query(tts, "这是一句超过十个字的很长的回复")
+        self.assertEqual(fake.calls, 3)
+        self.assertEqual(tts.stats()["stores"], 0)
+
+    def test_lru_limits(self):
+        cache = TTSCache(max_memory_bytes=25000, disk_dir=self.dir.name, max_disk_bytes=45000)
+        tts = CachedTTS(FakeTTS(), cache)
+        for text in ("一", "二", "三"):
+            self.query(tts, text)
+        self.assertEqual(len(cache.memory), 1)
+        self.assertLessEqual(cache.memory_bytes, 25000)
+        self.assertEqual(cache.stats()["disk_entries"], 2)
+        files = [name for _, _, names in os.walk(self.dir.name) for name in names]
+        self.assertEqual(len(files), 2)
+
+if __name__ == '__main__':
+    unittest.main()
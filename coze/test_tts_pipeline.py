@@ -0,0 +1,123 @@
+import asyncio
+import time
+import unittest
+from tts_pipeline import SentencePipeline
+from sentence_segmenter import SentenceSegmenter
+
+class FakeTTS:
+    """每句合成耗时不同，分3块回调音频；记录同时合成的句数"""
+    def __init__(self, delays=None, fail=()):
+        self.delays = delays or {}
+        self.fail = fail
+        self.active = 0
+        self.max_active = 0
+
+    async def query_tts(self, text, audio_callback):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            for i in range(3):
+                await asyncio.sleep(self.delays.get(text, 0.01) / 3)
+                if text in self.fail:
+                    raise ConnectionError("tts down")
+                audio_callback(f"{text}#{i}".encode())
+        finally:
+            self.active -= 1
+
+def llm_tokens(sentences, delay=0.0):
+    for sentence in sentences:
+        for token in (sentence[:3], sentence[3:]):
+            if delay:
+                time.sleep(delay)
+            yield token
+
+SENTENCES = ["第一句比较长。", "第二句话来了，", "第三句很短！", "第四句结束？", "剩余的文字"]
+
+class TestSentencePipeline(unittest.TestCase):
+    def run_pipeline(self, tts, sink, stream, max_parallel=2):
+        # 测试数据每句都在4个字以上，每句单独合成
+        pipeline = SentencePipeline(tts, sink, max_parallel=max_parallel, segmenter=SentenceSegmenter(min_length=4))
+        return asyncio.run(pipeline.run(stream))
+
+    def test_ordered_playback(self):
+        # 第一句合成最慢，后面的句子先合成完也要等它播完
+        tts = FakeTTS({SENTENCES[0]: 0.1})
+        played = []
+        stats = self.run_pipeline(tts, played.append, llm_tokens(SENTENCES), max_parallel=3)
+        self.assertEqual(played, [f"{s}#{i}".encode() for s in SENTENCES for i in range(3)])
+        self.assertEqual(tts.max_active, 3)
+        self.assertEqual(stats["sentences"], 5)
+        self.assertEqual(stats["audio_bytes"], sum(len(chunk) for chunk in played))
+
+    def test_async_sink_and_failure(self):
+        tts = FakeTTS(fail={SENTENCES[1]})
+        played = []
+
+        async def sink(chunk):
+            await asyncio.sleep(0)
+            played.append(chunk)
+
+        async def stream():
+            for token in llm_tokens(SENTENCES[:3]):
+                yield token
+
+        stats = self.run_pipeline(tts, sink, stream(), max_parallel=1)
+        # 合成失败的句子跳过，不影响后面的句子
+        self.assertEqual(played, [f"{s}#{i}".encode() for s in (SENTENCES[0], SENTENCES[2]) for i in range(3)])
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(tts.max_active, 1)
+
+    def test_overlaps_llm_and_tts(self):
+        # LLM每个token 20ms，每句合成100ms：串行约 0.2 + 5*0.1 秒，流水线接近 LLM耗时 + 最后一句
+        tts = FakeTTS({s: 0.1 for s in SENTENCES})
+        stats = self.run_pipeline(tts, lambda chunk: None, llm_tokens(SENTENCES, delay=0.02), max_parallel=3)
+        self.assertLess(stats["total_ms"], 500)
+        self.assertLess(stats["time_to_first_audio_ms"], 120)
+
+    def test_cancel(self):
+        tts = FakeTTS({s: 1.0 for s in SENTENCES})
+
+        async def run():
+            task = asyncio.ensure_future(SentencePipeline(tts, lambda chunk: None).run(llm_tokens(SENTENCES)))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0)
+            return tts.active
+
+        self.assertEqual(asyncio.run(run()), 0)
+
+    def test_barge_in_metrics(self):
+        # 第一句合成很慢，第二句已经合成完但还没轮到播放，LLM还在输出时被打断
+        tts = FakeTTS({"第一句比较长。": 1.0, "第二句话来了，": 0.03})
+        closed = []
+
+        async def llm():
+            try:
+                yield "第一句比较长。"
+                yield "第二句话来了，"
+                await asyncio.sleep(10)
+                yield "不会输出"
+            finally:
+                closed.append(True)
+
+        async def run():
+            pipeline = SentencePipeline(tts, lambda chunk: None, segmenter=SentenceSegmenter(min_length=4))
+            task = asyncio.ensure_future(pipeline.run(llm()))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return pipeline.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual(closed, [True])
+        self.assertTrue(stats["cancelled"])
+        self.assertTrue(stats["llm_aborted"])
+        self.assertEqual(stats["aborted_sentences"], 1)
+        self.assertEqual(stats["discarded_bytes"], sum(len(f"第二句话来了，#{i}".encode()) for i in range(3)))
+        self.assertEqual(stats["audio_bytes"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
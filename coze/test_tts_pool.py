@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from tts_pool import TTSClientPool
+
+class FakeWebsocket:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+class FakeClient:
+    """和 TTSClient 一样按需连接；fail 时抛出异常，hang 时发出一块音频后一直等待"""
+    def __init__(self):
+        self.ws = None
+        self.connects = 0
+        self.fail = False
+        self.hang = False
+
+    async def ensure_connection(self):
+        if self.ws is None or self.ws.closed:
+            self.ws = FakeWebsocket()
+            self.connects += 1
+        return self.ws
+
+    async def query_tts(self, text, audio_callback=None, voice_type=None):
+        await self.ensure_connection()
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise ConnectionError("tts down")
+        audio_callback(text.encode())
+        if self.hang:
+            await asyncio.sleep(10)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+class TestTTSClientPool(unittest.TestCase):
+    def test_checkout_and_return(self):
+        pool = TTSClientPool(size=2, client_factory=FakeClient)
+        chunks = []
+
+        async def run():
+            await asyncio.gather(*(pool.query_tts(str(i), chunks.append) for i in range(6)))
+            return pool._idle.qsize()
+
+        self.assertEqual(asyncio.run(run()), 2)
+        self.assertEqual(sorted(chunks), [str(i).encode() for i in range(6)])
+        self.assertEqual(pool.in_use, 0)
+        # 两个连接都被用到，每个只连接一次
+        self.assertEqual([c.requests for c in pool.connections], [3, 3])
+        self.assertEqual([c.client.connects for c in pool.connections], [1, 1])
+
+    def test_failure_cooldown(self):
+        pool = TTSClientPool(size=2, failure_cooldown=60, client_factory=FakeClient)
+        broken = pool.connections[0]
+        broken.client.fail = True
+
+        async def run():
+            with self.assertRaises(ConnectionError):
+                await pool.query_tts("失败", lambda chunk: None)
+            for _ in range(3):
+                await pool.query_tts("好的", lambda chunk: None)
+
+        asyncio.run(run())
+        # 冷却中的连接不再借出
+        self.assertFalse(broken.is_healthy())
+        self.assertEqual((broken.failures, broken.requests), (1, 0))
+        self.assertEqual(pool.connections[1].requests, 3)
+        self.assertEqual(pool.stats()["connections"][0]["last_error"], "tts down")
+
+    def test_cancel_discards_connection(self):
+        pool = TTSClientPool(size=1, client_factory=FakeClient)
+        client = pool.connections[0].client
+        client.hang = True
+
+        async def run():
+            task = asyncio.ensure_future(pool.query_tts("被打断", lambda chunk: None))
+            await asyncio.sleep(0.05)
+            stale = client.ws
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0)
+            self.assertTrue(stale.closed)
+            # 连接已归还，下一句重新连接，不会读到上一句剩下的响应
+            client.hang = False
+            chunks = []
+            await pool.query_tts("下一句", chunks.append)
+            return chunks
+
+        self.assertEqual(asyncio.run(run()), ["下一句".encode()])
+        self.assertEqual(client.connects, 2)
+        self.assertTrue(pool.connections[0].is_healthy())
+        self.assertEqual(pool.in_use, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from audio_handler import AudioHandler, AudioBufferPool
+from vad import VoiceActivityDetector, SPEECH_START, SPEECH_END
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+def synthetic_utterance(lead=0.5, speech=1.5, tail=1.0, seed=0):
+    """静音(底噪) + 类语音信号(基频+谐波) + 静音"""
+    rng = np.random.default_rng(seed)
+    total = int((lead + speech + tail) * SAMPLE_RATE)
+    signal = rng.normal(0, 30, total)
+    t = np.arange(int(speech * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * 180 * k * t) / k for k in range(1, 6))
+    start = int(lead * SAMPLE_RATE)
+    signal[start:start + len(t)] += 5000 * voice
+    return np.clip(signal, -32768, 32767).astype(np.int16).tobytes()
+
+def packets(pcm, size=640):
+    for offset in range(0, len(pcm), size):
+        yield pcm[offset:offset + size]
+
+class TestVad(unittest.TestCase):
+    def test_detect_start_and_end(self):
+        vad = VoiceActivityDetector(end_silence_ms=700)
+        events = []
+        for offset, packet in zip(range(0, 10 ** 9, 640), packets(synthetic_utterance())):
+            event = vad.feed(packet)
+            if event:
+                events.append((event, offset + len(packet)))
+
+        self.assertEqual([event for event, _ in events], [SPEECH_START, SPEECH_END])
+        self.assertAlmostEqual(vad.speech_start / BYTES_PER_SECOND, 0.5, delta=0.03)
+        self.assertAlmostEqual(vad.speech_end / BYTES_PER_SECOND, 2.0, delta=0.03)
+        # 说话结束后0.7秒左右就能确定，不用等到录音结束(2.5秒)
+        self.assertAlmostEqual(events[1][1] / BYTES_PER_SECOND, 2.7, delta=0.05)
+
+    def test_noise_only(self):
+        vad = VoiceActivityDetector()
+        pcm = synthetic_utterance(lead=2.0, speech=0, tail=0)
+        for packet in packets(pcm, 1000):  # 包大小不是帧长的整数倍
+            self.assertIsNone(vad.feed(packet))
+        self.assertIsNone(vad.speech_start)
+        self.assertEqual(vad.speech_range(len(pcm)), (0, len(pcm)))
+
+    def test_audio_handler_trims_silence(self):
+        pcm = synthetic_utterance(lead=1.0, speech=1.0, tail=1.0)
+        handler = AudioHandler(AudioBufferPool(capacity=len(pcm)), vad=VoiceActivityDetector(end_silence_ms=700))
+        for packet in packets(pcm):
+            handler.add_audio_data(packet)
+            if handler.speech_ended:
+                break
+        self.assertTrue(handler.speech_detected)
+        # 前后各保留0.2秒
+        self.assertAlmostEqual(handler.speech_duration, 1.4, delta=0.05)
+        self.assertLess(handler.speech_duration, handler.duration)
+
+        handler.reset_buffer()
+        self.assertFalse(handler.speech_detected)
+        self.assertEqual(len(handler.get_speech_data()), 0)
+
+if __name__ == '__main__':
+    unittest.main()
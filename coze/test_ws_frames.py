@@ -0,0 +1,44 @@
+import asyncio
+import json
+import unittest
+from ws_frames import (
+    FORMAT_BINARY, FORMAT_JSON, FRAME_AUDIO, FRAME_END, HEADER_SIZE, FrameEncoder,
+    decode_binary, decode_json_audio, encode_binary,
+)
+
+class TestWsFrames(unittest.TestCase):
+    def test_binary_roundtrip(self):
+        frame = encode_binary(FRAME_AUDIO, 65537, b'\x01\x02\x03')
+        self.assertEqual(len(frame), HEADER_SIZE + 3)
+        frame_type, flags, sequence, payload = decode_binary(frame)
+        self.assertEqual((frame_type, flags, sequence, bytes(payload)), (FRAME_AUDIO, 0, 1, b'\x01\x02\x03'))
+        with self.assertRaises(ValueError):
+            decode_binary(b'\x01')
+
+    def test_encoder_formats(self):
+        sent = []
+
+        async def send(frame):
+            sent.append(frame)
+
+        async def run(audio_format):
+            encoder = FrameEncoder(send, send, audio_format)
+            await encoder.send_audio(memoryview(b'\x00\xff' * 512))
+            await encoder.send_audio(b'\x10' * 10)
+            await encoder.send_end()
+            return encoder.stats()
+
+        stats = asyncio.run(run(FORMAT_JSON))
+        self.assertEqual(len(sent), 2)  # JSON模式没有结束消息
+        self.assertEqual(decode_json_audio(json.loads(sent[0])), b'\x00\xff' * 512)
+        self.assertGreater(stats["overhead_ratio"], 1.0)
+
+        sent.clear()
+        stats = asyncio.run(run(FORMAT_BINARY))
+        self.assertEqual([decode_binary(frame)[:3] for frame in sent],
+                         [(FRAME_AUDIO, 0, 0), (FRAME_AUDIO, 0, 1), (FRAME_END, 0, 2)])
+        self.assertEqual(bytes(decode_binary(sent[1])[3]), b'\x10' * 10)
+        self.assertEqual(stats["wire_bytes"], stats["payload_bytes"] + 2 * HEADER_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()
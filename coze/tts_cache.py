@@ -0,0 +1,229 @@
+"""
+TTS合成结果缓存
+
+"好的，请稍等。"、问候语、兜底回复这类句子经常重复，缓存合成好的PCM，命中时不再请求TTS服务。
+    键：规范化后的文本 + 音色 + 语速/音量/音调 + 编码 的sha256
+    内存层：按字节数限制的LRU
+    磁盘层：<dir>/<键的前2位>/<键>.pcm，先写临时文件再改名，按总大小淘汰最久没用的；读写都在线程中进行
+命中时把缓存的音频按 replay_chunk 大小分块，依次交给同一个 audio_callback，调用方不用区分是否命中。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from tts_doubao import request_json, voice_type as default_voice_type
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE", "1") == "1"
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", 32))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", 512))
+TTS_CACHE_MAX_TEXT = int(os.getenv("TTS_CACHE_MAX_TEXT", 40))  # 长句很少重复，不缓存
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """全角半角统一、去掉首尾空白、连续空白合并；只影响缓存键，不影响送去合成的文本"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def cache_key(text, voice_type=default_voice_type, speed_ratio=1.0, volume_ratio=1.0, pitch_ratio=1.0,
+              encoding="pcm"):
+    raw = "\x1f".join([normalize_text(text), voice_type, f"{speed_ratio:g}", f"{volume_ratio:g}",
+                       f"{pitch_ratio:g}", encoding])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, max_memory_bytes=int(TTS_CACHE_MEMORY_MB * 1024 * 1024), disk_dir=TTS_CACHE_DIR,
+                 max_disk_bytes=int(TTS_CACHE_DISK_MB * 1024 * 1024)):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_bytes = 0
+        self._disk = None  # key -> 文件大小，按最近使用排序；第一次访问磁盘时扫描目录
+        self._disk_lock = threading.Lock()  # 磁盘读写在线程池中并发执行
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bytes_served = 0  # 命中时直接返回的音频字节数，即省下的合成量
+
+    # ---------------- 内存层 ----------------
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old)
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    # ---------------- 磁盘层 ----------------
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".pcm")
+
+    def _scan_disk(self):
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".pcm"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        entries.sort()
+        self._disk = OrderedDict((key, size) for _, key, size in entries)
+        self.disk_bytes = sum(self._disk.values())
+
+    def _read_disk(self, key):
+        with self._disk_lock:
+            return self._read_disk_locked(key)
+
+    def _write_disk(self, key, data):
+        with self._disk_lock:
+            self._write_disk_locked(key, data)
+
+    def _read_disk_locked(self, key):
+        if self._disk is None:
+            self._scan_disk()
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.disk_bytes -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        return data
+
+    def _write_disk_locked(self, key, data):
+        if self._disk is None:
+            self._scan_disk()
+        if key in self._disk or len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._disk[key] = len(data)
+        self.disk_bytes += len(data)
+        while self.disk_bytes > self.max_disk_bytes:
+            evicted, size = self._disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.unlink(self._path(evicted))
+            except FileNotFoundError:
+                pass
+
+    # ---------------- 对外接口 ----------------
+    async def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            self.bytes_served += len(data)
+            return data
+        if self.disk_dir is not None:
+            try:
+                data = await asyncio.to_thread(self._read_disk, key)
+            except OSError as e:
+                logger.warning("读取TTS缓存失败: %s", e)
+                data = None
+            if data is not None:
+                self.disk_hits += 1
+                self.bytes_served += len(data)
+                self._remember(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    async def put(self, key, data):
+        data = bytes(data)
+        self.stores += 1
+        self._remember(key, data)
+        if self.disk_dir is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except OSError as e:
+                logger.warning("写入TTS缓存失败: %s", e)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "bytes_served": self.bytes_served,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_entries": len(self._disk) if self._disk is not None else None,
+            "disk_bytes": self.disk_bytes,
+        }
+
+
+class CachedTTS:
+    """
+    在 TTSClientPool/TTSClient 外面加一层缓存，query_tts 签名相同
+    没命中时边合成边把音频交给 audio_callback，同时收集起来，完整合成成功后再写入缓存
+    """
+    def __init__(self, tts, cache, max_text_length=TTS_CACHE_MAX_TEXT, replay_chunk=6400,
+                 audio_params=None):
+        self.tts = tts
+        self.cache = cache
+        self.max_text_length = max_text_length
+        self.replay_chunk = replay_chunk  # 16kHz/16bit时200ms
+        params = audio_params or request_json["audio"]
+        self.speed_ratio = params.get("speed_ratio", 1.0)
+        self.volume_ratio = params.get("volume_ratio", 1.0)
+        self.pitch_ratio = params.get("pitch_ratio", 1.0)
+
+    def key(self, text, voice_type):
+        return cache_key(text, voice_type, self.speed_ratio, self.volume_ratio, self.pitch_ratio, "pcm")
+
+    async def query_tts(self, text, audio_callback=None, voice_type=default_voice_type):
+        if len(normalize_text(text)) > self.max_text_length:
+            return await self.tts.query_tts(text, audio_callback, voice_type=voice_type)
+        key = self.key(text, voice_type)
+        data = await self.cache.get(key)
+        if data is not None:
+            logger.debug("TTS缓存命中: %s", text)
+            if audio_callback is not None:
+                view = memoryview(data)
+                for offset in range(0, len(view), self.replay_chunk):
+                    audio_callback(view[offset:offset + self.replay_chunk])
+            return
+
+        chunks = []
+
+        def collect(chunk):
+            chunks.append(chunk)
+            if audio_callback is not None:
+                audio_callback(chunk)
+
+        await self.tts.query_tts(text, collect, voice_type=voice_type)
+        if chunks:
+            await self.cache.put(key, b"".join(chunks))
+
+    def stats(self):
+        return self.cache.stats()
@@ -9,6 +9,7 @@ pip install websockets
 '''
 
 import asyncio
+import logging
 import websockets
 import uuid
 import json
@@ -16,6 +17,13 @@ import gzip
 import copy
 import ssl
 
+from protocol_codec import (
+    AUDIO_ONLY_RESPONSE, FRONTEND_RESPONSE, SERVER_ERROR_RESPONSE,
+    DEFAULT_COMPRESSION, decode_frame,
+)
+
+logger = logging.getLogger(__name__)
+
 MESSAGE_TYPES = {11: "audio-only server response", 12: "frontend server response", 15: "error message from server"}
 MESSAGE_TYPE_SPECIFIC_FLAGS = {0: "no sequence number", 1: "sequence number > 0",
                                2: "last message from server (seq < 0)", 3: "sequence number < 0"}
@@ -36,6 +44,7 @@ api_url = f"wss://{host}/api/v1/tts/ws_binary"
 # message serialization method: b0001 (JSON) (4 bits)
 # message compression: b0001 (gzip) (4bits)
 # reserved data: 0x00 (1 byte)
+# 请求帧由 protocol_codec.encode_full_client_request 生成
 default_header = bytearray(b'\x11\x10\x11\x00')
 
 request_json = {
@@ -62,10 +71,18 @@ request_json = {
     }
 }
 
+class TTSServerError(Exception):
+    """TTS服务端返回错误帧，这句没有合成完整"""
+    def __init__(self, code, message):
+        super().__init__(f"code={code}: {message}")
+        self.code = code
+
+
 class TTSClient:
-    def __init__(self):
+    def __init__(self, compression=DEFAULT_COMPRESSION):
         self.ws = None
         self.header = {"Authorization": f"Bearer; {token}"}
+        self.compression = compression  # 请求帧的压缩方式，响应按帧头自动处理
     
     async def ensure_connection(self):
         if self.ws is None or self.ws.closed:
@@ -92,11 +109,7 @@ class TTSClient:
         query_request_json["request"]["operation"] = "submit"
         query_request_json["request"]["text"] = text
         
-        payload_bytes = str.encode(json.dumps(query_request_json))
-        payload_bytes = gzip.compress(payload_bytes)
-        full_client_request = bytearray(default_header)
-        full_client_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        full_client_request.extend(payload_bytes)
+        full_client_request = self.compression.encode_full_client_request(query_request_json)
 
         try:
             ws = await self.ensure_connection()
@@ -110,72 +123,54 @@ class TTSClient:
                     break
                 
         except Exception as e:
-            print(f"TTS合成出错: {str(e)}")
+            logger.warning("TTS合成出错: %s", e)
             await self.close()  # 发生错误时关闭连接
             raise
 
+def log_frame(frame):
+    """DEBUG级别下输出帧头的完整信息"""
+    message_type = frame.message_type
+    flags = frame.flags
+    logger.debug(
+        "response: version=%d header=%d bytes type=%#x(%s) flags=%#x(%s) serialization=%s compression=%s "
+        "reserved=%#04x extensions=%r sequence=%s payload=%d bytes",
+        frame.protocol_version, frame.header_size * 4,
+        message_type, MESSAGE_TYPES.get(message_type),
+        flags, MESSAGE_TYPE_SPECIFIC_FLAGS.get(flags),
+        MESSAGE_SERIALIZATION_METHODS.get(frame.serialization),
+        MESSAGE_COMPRESSIONS.get(frame.compression),
+        frame.reserved, bytes(frame.header_extensions), frame.sequence, frame.payload_size,
+    )
+
+
 def parse_response(res, audio_callback):
-    """修改parse_response函数"""
-    print("--------------------------- response ---------------------------")
-    # print(f"response raw bytes: {res}")
-    protocol_version = res[0] >> 4
-    header_size = res[0] & 0x0f
-    message_type = res[1] >> 4
-    message_type_specific_flags = res[1] & 0x0f
-    serialization_method = res[2] >> 4
-    message_compression = res[2] & 0x0f
-    reserved = res[3]
-    header_extensions = res[4:header_size*4]
-    payload = res[header_size*4:]
-    print(f"            Protocol version: {protocol_version:#x} - version {protocol_version}")
-    print(f"                 Header size: {header_size:#x} - {header_size * 4} bytes ")
-    print(f"                Message type: {message_type:#x} - {MESSAGE_TYPES[message_type]}")
-    print(f" Message type specific flags: {message_type_specific_flags:#x} - {MESSAGE_TYPE_SPECIFIC_FLAGS[message_type_specific_flags]}")
-    print(f"Message serialization method: {serialization_method:#x} - {MESSAGE_SERIALIZATION_METHODS[serialization_method]}")
-    print(f"         Message compression: {message_compression:#x} - {MESSAGE_COMPRESSIONS[message_compression]}")
-    print(f"                    Reserved: {reserved:#04x}")
-    if header_size != 1:
-        print(f"           Header extensions: {header_extensions}")
-    if message_type == 0xb:  # audio-only server response
-        if message_type_specific_flags == 0:  # no sequence number as ACK
-            print("                Payload size: 0")
-            return False
-        else:
-            sequence_number = int.from_bytes(payload[:4], "big", signed=True)
-            payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-            payload = payload[8:]
-            print(f"             Sequence number: {sequence_number}")
-            print(f"                Payload size: {payload_size} bytes")
-        audio_callback(payload)
-        if sequence_number < 0:
-            return True
-        else:
+    """解析一帧TTS响应，音频数据交给audio_callback(memoryview)，返回是否是最后一帧；服务端报错时抛出TTSServerError"""
+    frame = decode_frame(res)
+    message_type = frame.message_type
+    if logger.isEnabledFor(logging.DEBUG):
+        log_frame(frame)
+    if message_type == AUDIO_ONLY_RESPONSE:  # audio-only server response
+        if frame.payload is None:  # no sequence number as ACK
             return False
-    elif message_type == 0xf:
-        code = int.from_bytes(payload[:4], "big", signed=False)
-        msg_size = int.from_bytes(payload[4:8], "big", signed=False)
-        error_msg = payload[8:]
-        if message_compression == 1:
-            error_msg = gzip.decompress(error_msg)
-        error_msg = str(error_msg, "utf-8")
-        print(f"          Error message code: {code}")
-        print(f"          Error message size: {msg_size} bytes")
-        print(f"               Error message: {error_msg}")
-        return True
-    elif message_type == 0xc:
-        msg_size = int.from_bytes(payload[:4], "big", signed=False)
-        payload = payload[4:]
-        if message_compression == 1:
-            payload = gzip.decompress(payload)
-        print(f"            Frontend message: {payload}")
+        audio_callback(frame.payload)
+        return frame.sequence < 0
+    elif message_type == SERVER_ERROR_RESPONSE:
+        message = str(frame.decompressed(), "utf-8")
+        logger.error("TTS服务端错误 code=%s: %s", frame.code, message)
+        raise TTSServerError(frame.code, message)
+    elif message_type == FRONTEND_RESPONSE:
+        logger.debug("Frontend message: %r", bytes(frame.decompressed()))
     else:
-        print("undefined message type!")
+        logger.warning("undefined message type: %#x", message_type)
         return True
 
 
 if __name__ == '__main__':
+    from log_utils import setup_logging
+    setup_logging()
+
     async def handle_audio(audio_data):
-        print(f"收到音频数据，大小: {len(audio_data)} 字节")
+        logger.info("收到音频数据，大小: %d 字节", len(audio_data))
     
     loop = asyncio.get_event_loop()
     loop.run_until_complete(query_tts("你好，这是一个测试", handle_audio))
@@ -0,0 +1,183 @@
+"""
+LLM输出 -> 分句 -> 语音合成 的流水线
+
+原来的做法是在读LLM流的循环里 await 每一句的合成，合成期间LLM流停住，
+一轮对话的耗时是 LLM耗时 + 所有句子合成耗时之和。这里拆成三个并行的部分：
+    读LLM流并分句：异步流（coze_client.async_chat_stream）直接迭代；同步生成器放到线程里迭代，不阻塞事件循环；
+                   分句规则见 sentence_segmenter
+    合成：每句一个任务，最多 max_parallel 句同时合成
+    播放：严格按句子顺序把音频交给sink；正在播放的句子边合成边输出，后面的句子先缓存
+一个名额从开始合成一直占用到这句播放完，所以已合成未播放的句子最多 max_parallel 句，内存有上限。
+被取消（设备打断）时关闭LLM流、取消所有合成请求，并记录浪费和省下的工作量。
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+
+from sentence_segmenter import SentenceSegmenter
+
+logger = logging.getLogger(__name__)
+
+TTS_PIPELINE_PARALLEL = int(os.getenv("TTS_PIPELINE_PARALLEL", 2))
+
+_END = object()
+
+
+async def iterate_in_thread(iterable):
+    """在线程池中迭代同步生成器，每取一个元素切换一次线程，事件循环不会被网络读阻塞"""
+    iterator = iter(iterable)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+
+def as_async_iterable(stream):
+    return stream if hasattr(stream, "__aiter__") else iterate_in_thread(stream)
+
+
+class _Sentence:
+    __slots__ = ("index", "text", "chunks", "task", "audio_bytes", "synthesized_bytes", "failed")
+
+    def __init__(self, index, text):
+        self.index = index
+        self.text = text
+        self.chunks = asyncio.Queue()  # 合成出的音频块，_END 表示这句结束
+        self.task = None
+        self.audio_bytes = 0  # 已经交给sink的字节数
+        self.synthesized_bytes = 0
+        self.failed = False
+
+    def receive(self, chunk):
+        self.synthesized_bytes += len(chunk)
+        self.chunks.put_nowait(chunk)
+
+
+class SentencePipeline:
+    """
+    tts: 有 query_tts(text, audio_callback) 的对象（TTSClientPool / TTSClient）
+    sink: 按顺序接收音频块，可以是普通函数或协程函数
+    segmenter: 分句器，默认 SentenceSegmenter()，每轮对话用一个新的
+    """
+    def __init__(self, tts, sink, max_parallel=TTS_PIPELINE_PARALLEL, segmenter=None):
+        self.tts = tts
+        self.sink = sink
+        self.max_parallel = max(1, max_parallel)
+        self.segmenter = segmenter or SentenceSegmenter()
+        self.sentences = 0
+        self.failed = 0
+        self.audio_bytes = 0
+        self.started = None
+        self.first_text_at = None
+        self.first_audio_at = None
+        self.llm_done_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.llm_aborted = False  # 取消时LLM还在输出
+        self.aborted_sentences = 0  # 取消时还没合成完（或还没开始合成）的句子
+        self.discarded_bytes = 0  # 已经合成但没有交给sink的音频
+
+    async def run(self, text_stream):
+        """处理一轮LLM输出，所有句子播放完后返回统计数据；被取消时同时取消所有合成任务"""
+        self.started = time.monotonic()
+        slots = asyncio.Semaphore(self.max_parallel)
+        order = asyncio.Queue()  # 按顺序等待播放的句子，_END 表示LLM输出结束
+        pending = []
+        player = asyncio.ensure_future(self._play(order, slots))
+        stream = as_async_iterable(text_stream)
+        try:
+            async for text in stream:
+                if self.first_text_at is None:
+                    self.first_text_at = time.monotonic()
+                logger.debug("LLM输出: %s", text)
+                for sentence in self.segmenter.feed(text):
+                    pending.append(self._submit(sentence, slots, order))
+                if player.done():
+                    break  # 播放出错，不再继续读LLM输出
+            if not player.done():
+                for sentence in self.segmenter.flush():
+                    pending.append(self._submit(sentence, slots, order))
+            self.llm_done_at = time.monotonic()
+            order.put_nowait(_END)
+            await player
+        except asyncio.CancelledError:
+            self.cancelled = True
+            self.llm_aborted = self.llm_done_at is None
+            raise
+        finally:
+            player.cancel()
+            for sentence in pending:
+                if not sentence.task.done():
+                    self.aborted_sentences += 1
+                    sentence.task.cancel()
+                self.discarded_bytes += sentence.synthesized_bytes - sentence.audio_bytes
+            if hasattr(stream, "aclose"):
+                await stream.aclose()  # 关闭LLM的HTTP流，不再接收后面的输出
+        self.finished_at = time.monotonic()
+        stats = self.stats()
+        logger.info("本轮合成 %d 句, 首段音频 %.0fms, 总耗时 %.0fms", stats["sentences"],
+                    stats["time_to_first_audio_ms"] or 0, stats["total_ms"])
+        return stats
+
+    def _submit(self, text, slots, order):
+        sentence = _Sentence(self.sentences, text)
+        self.sentences += 1
+        logger.info("合成语音: %s", text)
+        sentence.task = asyncio.ensure_future(self._synthesize(sentence, slots))
+        order.put_nowait(sentence)
+        return sentence
+
+    async def _synthesize(self, sentence, slots):
+        # 名额由播放这句的一方归还
+        await slots.acquire()
+        try:
+            await self.tts.query_tts(sentence.text, sentence.receive)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            sentence.failed = True
+            logger.warning("第%d句合成失败，跳过: %s", sentence.index + 1, e)
+        finally:
+            sentence.chunks.put_nowait(_END)
+
+    async def _play(self, order, slots):
+        while True:
+            sentence = await order.get()
+            if sentence is _END:
+                return
+            try:
+                while True:
+                    chunk = await sentence.chunks.get()
+                    if chunk is _END:
+                        break
+                    if self.first_audio_at is None:
+                        self.first_audio_at = time.monotonic()
+                    sentence.audio_bytes += len(chunk)
+                    self.audio_bytes += len(chunk)
+                    result = self.sink(chunk)
+                    if inspect.isawaitable(result):
+                        await result
+            finally:
+                slots.release()
+            if sentence.failed:
+                self.failed += 1
+
+    def stats(self):
+        def elapsed(at):
+            return (at - self.started) * 1000 if at is not None and self.started is not None else None
+        return {
+            "sentences": self.sentences,
+            "failed": self.failed,
+            "audio_bytes": self.audio_bytes,
+            "time_to_first_text_ms": elapsed(self.first_text_at),
+            "time_to_first_audio_ms": elapsed(self.first_audio_at),
+            "llm_ms": elapsed(self.llm_done_at),
+            "total_ms": elapsed(self.finished_at),
+            "cancelled": self.cancelled,
+            "llm_aborted": self.llm_aborted,
+            "aborted_sentences": self.aborted_sentences,
+            "discarded_bytes": self.discarded_bytes,
+        }
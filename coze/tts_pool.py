@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from tts_doubao import TTSClient, voice_type as default_voice_type
+
+logger = logging.getLogger(__name__)
+
+
+class PooledTTSConnection:
+    """连接池中的单个TTS连接，记录健康状态"""
+    def __init__(self, index, client: TTSClient):
+        self.index = index
+        self.client = client
+        self.requests = 0  # 累计处理的请求数
+        self.failures = 0  # 连续失败次数
+        self.last_error = None
+        self.last_used = 0.0
+        self.unhealthy_until = 0.0  # 在此时间之前不再分配该连接
+
+    @property
+    def connected(self):
+        return self.client.ws is not None and not self.client.ws.closed
+
+    def is_healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
+    def mark_success(self):
+        self.requests += 1
+        self.failures = 0
+        self.last_error = None
+        self.last_used = time.monotonic()
+        self.unhealthy_until = 0.0
+
+    def mark_failure(self, error, cooldown):
+        self.failures += 1
+        self.last_error = str(error)
+        self.last_used = time.monotonic()
+        # 连续失败越多，冷却时间越长（上限30秒）
+        self.unhealthy_until = time.monotonic() + min(cooldown * self.failures, 30.0)
+
+
+class TTSClientPool:
+    """
+    TTS websocket连接池
+
+    每次合成从池中借出一个独立的websocket连接，合成完成后归还，
+    这样不同设备的句子可以并发合成，不会在同一个连接上排队。
+    出错的连接会被关闭并进入冷却期，下次借出时自动重连。
+    """
+    def __init__(self, size=4, max_concurrency=None, acquire_timeout=10.0,
+                 failure_cooldown=1.0, client_factory=TTSClient):
+        self.size = size
+        self.max_concurrency = max_concurrency or size
+        self.acquire_timeout = acquire_timeout
+        self.failure_cooldown = failure_cooldown
+        self.connections = [PooledTTSConnection(i, client_factory()) for i in range(size)]
+        self._idle = None
+        self._semaphore = None
+        self.in_use = 0
+        self.waiting = 0
+
+    def _ensure_queues(self):
+        # asyncio对象需要在事件循环中创建
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for conn in self.connections:
+                self._idle.put_nowait(conn)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def warm_up(self, count=None):
+        """预先建立websocket连接，避免第一句话承担握手延迟"""
+        self._ensure_queues()
+        targets = self.connections[:count or self.size]
+        results = await asyncio.gather(
+            *(conn.client.ensure_connection() for conn in targets),
+            return_exceptions=True
+        )
+        for conn, result in zip(targets, results):
+            if isinstance(result, Exception):
+                conn.mark_failure(result, self.failure_cooldown)
+                logger.warning("TTS连接#%d预连接失败: %s", conn.index, result)
+        return sum(1 for conn in targets if conn.connected)
+
+    async def _checkout(self):
+        # 优先选择健康的空闲连接；全部在冷却中时选最早恢复的那个（借出后会自动重连）
+        conn = await self._idle.get()
+        if conn.is_healthy():
+            return conn
+        skipped = [conn]
+        while not self._idle.empty():
+            candidate = self._idle.get_nowait()
+            if candidate.is_healthy():
+                conn = candidate
+                break
+            skipped.append(candidate)
+        else:
+            conn = min(skipped, key=lambda c: c.unhealthy_until)
+        for other in skipped:
+            if other is not conn:
+                self._idle.put_nowait(other)
+        return conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        """借出一个连接：async with pool.acquire() as conn: ..."""
+        self._ensure_queues()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.acquire_timeout)
+            try:
+                conn = await asyncio.wait_for(self._checkout(), self.acquire_timeout)
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.in_use += 1
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            self._idle.put_nowait(conn)
+            self._semaphore.release()
+
+    async def query_tts(self, text, audio_callback=None, voice_type=default_voice_type):
+        """与TTSClient.query_tts签名一致，内部从池中借用连接"""
+        async with self.acquire() as conn:
+            try:
+                await conn.client.query_tts(text, audio_callback, voice_type=voice_type)
+            except Exception as e:
+                # TTSClient出错时已经关闭了连接，下次借出会自动重连
+                conn.mark_failure(e, self.failure_cooldown)
+                raise
+            except BaseException:
+                # 被取消（设备打断）：连接上还有这次合成没收完的响应，归还前在后台关闭，下次借出时重连
+                # TTSClient本身不处理取消，连接的清理只在这里做
+                self._discard_connection(conn)
+                raise
+            conn.mark_success()
+
+    def _discard_connection(self, conn):
+        ws, conn.client.ws = conn.client.ws, None
+        if ws is not None and not ws.closed:
+            asyncio.ensure_future(ws.close())
+
+    async def close(self):
+        for conn in self.connections:
+            await conn.client.close()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "max_concurrency": self.max_concurrency,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "connections": [
+                {
+                    "index": conn.index,
+                    "connected": conn.connected,
+                    "healthy": conn.is_healthy(),
+                    "requests": conn.requests,
+                    "failures": conn.failures,
+                    "last_error": conn.last_error,
+                } for conn in self.connections
+            ],
+        }
@@ -0,0 +1,117 @@
+"""
+服务端语音活动检测（能量 + 过零率）
+
+按20ms分帧，一次feed中的所有整帧用NumPy向量化计算能量(dBFS)和过零率，
+再用连续帧计数判断说话开始和结束：
+    连续 start_ms 有声 -> 开始说话
+    说话后连续 end_silence_ms 静音 -> 说话结束
+噪声基底从非语音帧估计，阈值取 max(energy_threshold_db, 噪声基底 + noise_margin_db)。
+"""
+import numpy as np
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+_FULL_SCALE = 32768.0 ** 2
+
+
+class VoiceActivityDetector:
+    def __init__(self, sample_rate=16000, sample_width=2, frame_ms=20,
+                 energy_threshold_db=-45.0, noise_margin_db=12.0, max_zcr=0.35,
+                 start_ms=60, end_silence_ms=700, pre_roll_ms=200, post_roll_ms=200):
+        if sample_width != 2:
+            raise ValueError("只支持16位PCM")
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * sample_width
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.max_zcr = max_zcr  # 过零率太高且能量不够大的帧当作噪声（风声、摩擦声）
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.end_frames = max(1, end_silence_ms // frame_ms)
+        bytes_per_ms = sample_rate * sample_width // 1000
+        self.pre_roll = pre_roll_ms * bytes_per_ms  # 裁剪时在语音前后多保留的字节数
+        self.post_roll = post_roll_ms * bytes_per_ms
+        self.reset()
+
+    def reset(self):
+        self._pending = bytearray()  # 不足一帧的数据
+        self.frames = 0  # 已分析的帧数
+        self.noise_floor_db = -70.0
+        self.speech_start = None  # 说话开始的字节偏移
+        self.speech_end = None  # 说话结束（最后一个有声帧结束）的字节偏移
+        self._run = 0  # 说话开始前连续有声帧数
+        self._silence = 0  # 说话开始后连续静音帧数
+        self._last_voiced_end = 0
+
+    @property
+    def in_speech(self):
+        return self.speech_start is not None and self.speech_end is None
+
+    @property
+    def ended(self):
+        return self.speech_end is not None
+
+    def classify(self, samples: np.ndarray) -> np.ndarray:
+        """samples: (帧数, 每帧采样数) 的int16数组，返回每帧是否有声"""
+        frames = samples.astype(np.float32)
+        energy = np.einsum('ij,ij->i', frames, frames) / (samples.shape[1] * _FULL_SCALE)
+        energy_db = 10.0 * np.log10(energy + 1e-12)
+        signs = np.signbit(samples)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (samples.shape[1] - 1)
+        threshold = max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+        voiced = (energy_db > threshold) & ((zcr < self.max_zcr) | (energy_db > threshold + 10.0))
+        silent = energy_db[~voiced]
+        if self.speech_start is None and len(silent):
+            # 说话前的静音帧更新噪声基底，慢速跟随
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * float(silent.mean())
+        return voiced
+
+    def feed(self, pcm):
+        """送入一段PCM数据，返回本次产生的最后一个事件（SPEECH_START/SPEECH_END）或None"""
+        if self.ended:
+            return None
+        if self._pending:
+            self._pending += pcm
+            data = self._pending
+        else:
+            data = pcm
+        count = len(data) // self.frame_bytes
+        usable = count * self.frame_bytes
+        event = None
+        if count:
+            samples = np.frombuffer(data, dtype=np.int16, count=usable // 2).reshape(count, self.frame_samples)
+            event = self._advance(self.classify(samples))
+        self._pending = bytearray(memoryview(data)[usable:]) if usable < len(data) else bytearray()
+        return event
+
+    def _advance(self, voiced):
+        event = None
+        base = self.frames
+        self.frames += len(voiced)
+        for i, is_voiced in enumerate(voiced.tolist(), base):
+            if self.speech_start is None:
+                self._run = self._run + 1 if is_voiced else 0
+                if self._run >= self.start_frames:
+                    self.speech_start = (i - self._run + 1) * self.frame_bytes
+                    self._last_voiced_end = (i + 1) * self.frame_bytes
+                    event = SPEECH_START
+            elif is_voiced:
+                self._silence = 0
+                self._last_voiced_end = (i + 1) * self.frame_bytes
+            else:
+                self._silence += 1
+                if self._silence >= self.end_frames:
+                    self.speech_end = self._last_voiced_end
+                    return SPEECH_END
+        return event
+
+    def speech_range(self, total_bytes):
+        """
+        需要送去识别的数据范围 (start, end)，包含前后保留的静音；
+        没有检测到说话时返回整段
+        """
+        if self.speech_start is None:
+            return 0, total_bytes
+        start = max(0, self.speech_start - self.pre_roll)
+        end = total_bytes if self.speech_end is None else min(total_bytes, self.speech_end + self.post_roll)
+        return start, end
@@ -0,0 +1,104 @@
+"""
+/ws 接口的音频帧格式
+
+旧固件（JSON模式）：音频按十六进制字符串放在JSON文本帧里
+    {"type": "audio", "audio": "<hex>"}      双向
+    {"type": "end_recording"}                设备 -> 服务端
+数据量是原始音频的2倍多，每个包还要做一次JSON编解码。
+
+二进制模式：音频直接放在WebSocket二进制帧里，前面加4字节头
+    frame_type(1 byte) flags(1 byte) sequence(2 bytes, 大端) payload
+    frame_type: FRAME_AUDIO 音频, FRAME_END 一句话/一段回复结束（没有payload）
+    sequence:   每个方向各自从0开始递增，按65536回绕，用于排查丢包乱序
+控制消息（错误等）仍然用JSON文本帧。
+
+协商（按连接）：设备连上后发送 {"type": "hello", "audio_format": "binary"}，
+服务端回复同样的消息表示同意，之后双向都用二进制帧；不认识hello的旧服务端会忽略这条消息，
+设备等不到回复就继续用JSON模式。服务端收到二进制帧时也会切换到二进制模式。
+"""
+import binascii
+import json
+import struct
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+FORMATS = (FORMAT_JSON, FORMAT_BINARY)
+
+FRAME_AUDIO = 0x01
+FRAME_END = 0x02
+
+FLAG_NONE = 0x00
+
+HEADER_SIZE = 4
+_HEADER = struct.Struct('>BBH')
+
+
+def hello_message(audio_format=FORMAT_BINARY):
+    return {"type": "hello", "audio_format": audio_format}
+
+
+def encode_binary(frame_type, sequence, payload=b'', flags=FLAG_NONE) -> bytes:
+    return _HEADER.pack(frame_type, flags, sequence & 0xffff) + payload
+
+
+def decode_binary(data):
+    """返回 (frame_type, flags, sequence, payload)，payload是原始数据的memoryview切片，不复制"""
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"二进制帧太短: {len(data)} bytes")
+    frame_type, flags, sequence = _HEADER.unpack_from(data)
+    return frame_type, flags, sequence, memoryview(data)[HEADER_SIZE:]
+
+
+def encode_json_audio(chunk) -> str:
+    """旧固件格式的音频消息（已经序列化好的文本）"""
+    return json.dumps({"type": "audio", "audio": chunk.hex()})
+
+
+def decode_json_audio(message) -> bytes:
+    return binascii.unhexlify(message['audio'])
+
+
+class FrameEncoder:
+    """
+    按连接协商的格式编码发给设备的消息，send_text/send_bytes 是WebSocket的发送协程
+    （FastAPI的 websocket.send_text/send_bytes，或websockets库的 ws.send）
+    """
+    def __init__(self, send_text, send_bytes, audio_format=FORMAT_JSON):
+        self.send_text = send_text
+        self.send_bytes = send_bytes
+        self.audio_format = audio_format
+        self.sequence = 0
+        self.frames = 0
+        self.payload_bytes = 0
+        self.wire_bytes = 0
+
+    @property
+    def binary(self):
+        return self.audio_format == FORMAT_BINARY
+
+    async def send_audio(self, chunk):
+        if self.binary:
+            frame = encode_binary(FRAME_AUDIO, self.sequence, chunk)
+            self.sequence = (self.sequence + 1) & 0xffff
+            await self.send_bytes(frame)
+        else:
+            frame = encode_json_audio(chunk)
+            await self.send_text(frame)
+        self.frames += 1
+        self.payload_bytes += len(chunk)
+        self.wire_bytes += len(frame)
+
+    async def send_end(self):
+        """一段回复发送完毕；JSON模式没有对应的消息，旧固件靠超时判断"""
+        if self.binary:
+            await self.send_bytes(encode_binary(FRAME_END, self.sequence))
+            self.sequence = (self.sequence + 1) & 0xffff
+
+    def stats(self):
+        return {
+            "audio_format": self.audio_format,
+            "frames": self.frames,
+            "payload_bytes": self.payload_bytes,
+            "wire_bytes": self.wire_bytes,
+            "overhead_ratio": self.wire_bytes / self.payload_bytes - 1 if self.payload_bytes else 0.0,
+        }